@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, ClienteProfile, PrestadorProfile, pegar_dados_endereco
+from .models import User, ClienteProfile, PrestadorProfile, CepGeocode
+from .tasks import salvar_perfil
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -28,6 +29,10 @@ class ClienteProfileAdmin(admin.ModelAdmin):
     search_fields = ('user__email', 'cep', 'cidade')
     readonly_fields = ('cidade', 'bairro', 'estado', 'latitude', 'longitude', 'created_at', 'updated_at')
 
+    def save_model(self, request, obj, form, change):
+        # Endereço novo ou sem coordenadas: geocodificado pela fila, não na requisição do admin
+        salvar_perfil(obj)
+
 @admin.register(PrestadorProfile)
 class PrestadorProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'telefone_publico', 'cidade', 'bairro', 'nota_media_cache', 'latitude')
@@ -38,21 +43,23 @@ class PrestadorProfileAdmin(admin.ModelAdmin):
         'latitude', 'longitude',
         'nota_media_cache',
         'total_avaliacoes_cache',
+        'soma_notas_cache',
+        'estrelas_1', 'estrelas_2', 'estrelas_3', 'estrelas_4', 'estrelas_5',
+        'pontuacao_ranking',
         'acessos_perfil',
         'total_servicos_cache',
+        'servicos_nao_realizados_cache',
         'created_at',
         'updated_at',
     )
     
     def save_model(self, request, obj, form, change):
-        
-        if obj.cep and (not obj.latitude or not obj.cidade):
-            dados = pegar_dados_endereco(obj.cep, obj.rua, obj.numero_casa)
-            if dados:
-                obj.latitude = dados['latitude']
-                obj.longitude = dados['longitude']
-                obj.cidade = dados['cidade']
-                obj.bairro = dados['bairro']
-                obj.estado = dados['estado']
-        
-        super().save_model(request, obj, form, change)
+        # Endereço novo ou sem coordenadas: geocodificado pela fila, não na requisição do admin
+        salvar_perfil(obj)
+
+
+@admin.register(CepGeocode)
+class CepGeocodeAdmin(admin.ModelAdmin):
+    list_display = ('cep', 'cidade', 'estado', 'latitude', 'longitude', 'fonte', 'consultado_em')
+    list_filter = ('fonte',)
+    search_fields = ('cep', 'cidade')
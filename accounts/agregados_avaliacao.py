@@ -0,0 +1,126 @@
+import threading
+import traceback
+import weakref
+from collections import Counter, defaultdict
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .estado_compartilhado import cache
+from .models import PrestadorProfile
+from .reconciliacao import reconciliar_avaliacoes
+
+# Os signals de avaliação (accounts/signals.py) não gravam nada na hora: só anotam a
+# diferença de estrelas de cada prestador nas pendências da transação atual, que são
+# gravadas uma vez no on_commit. Uma importação ou exclusão em lote vira um UPDATE por
+# prestador afetado, e uma transação desfeita não mexe nos agregados. Fora de transação
+# (autocommit) a gravação é na hora. Mudanças feitas dentro de um savepoint desfeito, com
+# a transação externa confirmada, entram na gravação: a reconciliação corrige.
+#
+# Erros na gravação são impressos e contados no cache compartilhado (erros_agregados(),
+# visto pelo comando reconciliar_avaliacoes em outro processo). O prestador cujo delta
+# falhou é recontado na hora; se nem isso der, fica para a reconciliação periódica.
+
+CHAVE_ERROS = 'avaliacoes:agregados:erros'
+
+
+class Pendencias:
+    """Diferenças de estrelas por prestador e prestadores a recontar, de uma transação."""
+
+    def __init__(self, using):
+        self.using = using
+        self.estrelas = defaultdict(Counter)
+        self.recontar = set()
+        self.gravadas = False
+
+    def anotar(self, prestador_id, nota_removida=None, nota_adicionada=None, recontar=False):
+        if recontar:
+            self.recontar.add(prestador_id)
+            return
+        if nota_removida is not None:
+            self.estrelas[prestador_id][nota_removida] -= 1
+        if nota_adicionada is not None:
+            self.estrelas[prestador_id][nota_adicionada] += 1
+
+    def __call__(self):
+        # Callback do on_commit: sai do registro e grava
+        self.gravadas = True
+        registro = _registro_da_thread()
+        if registro.get(self.using, lambda: None)() is self:
+            del registro[self.using]
+        gravar_pendencias(self)
+
+
+# Pendências da transação em andamento, por thread e por banco. O registro guarda só
+# uma referência fraca: quem mantém as pendências vivas é a fila do on_commit. Se a
+# transação (ou o savepoint em que elas foram registradas) for desfeita, o Django
+# descarta o callback, a referência morre e a próxima mudança começa pendências novas.
+_local = threading.local()
+
+
+def _registro_da_thread():
+    if not hasattr(_local, 'registro'):
+        _local.registro = {}
+    return _local.registro
+
+
+def _pendencias_da_transacao(using):
+    registro = _registro_da_thread()
+    pendencias = registro.get(using, lambda: None)()
+    if pendencias is None or pendencias.gravadas:
+        pendencias = Pendencias(using)
+        registro[using] = weakref.ref(pendencias)
+        # Um on_commit só por transação, não um por avaliação
+        transaction.on_commit(pendencias, using=using)
+    return pendencias
+
+
+def registrar(prestador_id, nota_removida=None, nota_adicionada=None, recontar=False, using=DEFAULT_DB_ALIAS):
+    """Anota a mudança de uma avaliação do prestador para gravar no commit."""
+    if not transaction.get_connection(using).in_atomic_block:
+        # Autocommit: a mudança já foi gravada, grava os agregados na hora
+        pendencias = Pendencias(using)
+        pendencias.anotar(prestador_id, nota_removida, nota_adicionada, recontar)
+        gravar_pendencias(pendencias)
+        return
+
+    _pendencias_da_transacao(using).anotar(prestador_id, nota_removida, nota_adicionada, recontar)
+
+
+def gravar_pendencias(pendencias):
+    if pendencias.recontar:
+        # A recontagem já enxerga tudo o que foi commitado, deltas inclusive
+        try:
+            reconciliar_avaliacoes(corrigir=True, prestador_ids=sorted(pendencias.recontar))
+        except Exception as e:
+            _registrar_erro(sorted(pendencias.recontar), e)
+
+    for prestador_id, estrelas in pendencias.estrelas.items():
+        if prestador_id in pendencias.recontar or not any(estrelas.values()):
+            continue
+        try:
+            PrestadorProfile.aplicar_deltas_avaliacoes(prestador_id, estrelas)
+        except Exception as e:
+            _registrar_erro([prestador_id], e)
+            try:
+                reconciliar_avaliacoes(corrigir=True, prestador_ids=[prestador_id])
+            except Exception as e:
+                print(f"Recontagem do prestador {prestador_id} também falhou: {e}")
+
+
+def _registrar_erro(prestador_ids, erro):
+    print(f"Erro ao atualizar agregados de avaliação (prestadores {prestador_ids}): {erro}")
+    traceback.print_exc()
+    try:
+        if not cache.add(CHAVE_ERROS, 1, timeout=None):
+            cache.incr(CHAVE_ERROS)
+    except Exception:
+        pass
+
+
+def erros_agregados():
+    """Quantas gravações de agregados falharam desde o último zerar_erros_agregados()."""
+    return cache.get(CHAVE_ERROS, 0)
+
+
+def zerar_erros_agregados():
+    cache.delete(CHAVE_ERROS)
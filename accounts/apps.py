@@ -7,3 +7,10 @@ class AccountsConfig(AppConfig):
 
     def ready(self):
         import accounts.signals
+        from django.core import checks
+        from django.db.models.signals import post_migrate
+        from .busca import garantir_indices_busca
+        from .estado_compartilhado import verificar_cache_compartilhado
+
+        post_migrate.connect(garantir_indices_busca, sender=self)
+        checks.register(verificar_cache_compartilhado)
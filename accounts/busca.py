@@ -0,0 +1,148 @@
+import unicodedata
+
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, router
+from django.db.models.expressions import RawSQL
+
+# Busca textual por nome (prestador e serviço).
+#
+# O texto pesquisável fica numa coluna normalizada (`nome_busca`: minúsculo e sem
+# acento), então "cabelereiro" encontra "Cabelereiro(a)" sem função no WHERE.
+# - PostgreSQL: índice GIN com pg_trgm na coluna, que atende LIKE '%termo%'.
+# - SQLite: tabela virtual FTS5 com tokenizer trigram, mantida por triggers.
+
+# (app_label, modelo, campo) com índice de busca
+INDICES_BUSCA = (
+    ('accounts', 'User', 'nome_busca'),
+    ('servicos', 'Servico', 'nome_busca'),
+)
+
+# Trigram precisa de pelo menos 3 caracteres; termos menores usam LIKE direto
+TAMANHO_MINIMO_TRIGRAM = 3
+
+_fts_prontos = set()
+
+
+def normalizar_busca(texto):
+    if not texto:
+        return ''
+    sem_acento = ''.join(
+        c for c in unicodedata.normalize('NFKD', str(texto)) if not unicodedata.combining(c)
+    )
+    return ' '.join(sem_acento.lower().split())
+
+
+def filtrar_por_texto(model, termo, campo='nome_busca'):
+    """
+    Retorna os pks de `model` cujo `campo` contém o termo (normalizado),
+    para usar como subquery: queryset.filter(user__in=filtrar_por_texto(User, nome)).
+    """
+    termo = normalizar_busca(termo)
+    using = router.db_for_read(model)
+    connection = connections[using]
+    tabela = model._meta.db_table
+
+    if (
+        connection.vendor == 'sqlite'
+        and len(termo) >= TAMANHO_MINIMO_TRIGRAM
+        and _fts_disponivel(connection, tabela, campo)
+    ):
+        tabela_fts = _nome_fts(tabela, campo)
+        frase = '"%s"' % termo.replace('"', '""')
+        ids = RawSQL(f'SELECT rowid FROM {tabela_fts} WHERE {tabela_fts} MATCH %s', [frase])
+        return model._base_manager.using(using).filter(pk__in=ids).values('pk')
+
+    return model._base_manager.using(using).filter(**{f'{campo}__contains': termo}).values('pk')
+
+
+def _nome_fts(tabela, campo):
+    return f'{tabela}_{campo}_fts'
+
+
+def _fts_disponivel(connection, tabela, campo):
+    chave = (connection.alias, str(connection.settings_dict['NAME']), tabela, campo)
+    if chave in _fts_prontos:
+        return True
+
+    tabela_fts = _nome_fts(tabela, campo)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE name IN (%s, %s, %s, %s)",
+            [tabela_fts, f'{tabela_fts}_ai', f'{tabela_fts}_ad', f'{tabela_fts}_au'],
+        )
+        pronto = cursor.fetchone()[0] == 4
+
+    if pronto:
+        _fts_prontos.add(chave)
+    return pronto
+
+
+def criar_indice_busca(connection, tabela, campo):
+    """
+    Cria (se ainda não existir) o índice de busca de `tabela.campo`. É idempotente:
+    roda na migration e de novo no post_migrate, porque no SQLite o Django recria a
+    tabela ao alterar colunas e os triggers do FTS se perdem junto.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS idx_{tabela}_{campo}_trgm '
+                f'ON {tabela} USING gin ({campo} gin_trgm_ops)'
+            )
+
+        elif connection.vendor == 'sqlite':
+            tabela_fts = _nome_fts(tabela, campo)
+            try:
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {tabela_fts} USING fts5("
+                    f"{campo}, content='{tabela}', content_rowid='id', tokenize='trigram')"
+                )
+            except OperationalError:
+                # SQLite sem FTS5/trigram: a busca continua funcionando via LIKE
+                return
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {tabela_fts}_ai AFTER INSERT ON {tabela} BEGIN '
+                f'INSERT INTO {tabela_fts}(rowid, {campo}) VALUES (new.id, new.{campo}); END'
+            )
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {tabela_fts}_ad AFTER DELETE ON {tabela} BEGIN '
+                f"INSERT INTO {tabela_fts}({tabela_fts}, rowid, {campo}) VALUES ('delete', old.id, old.{campo}); END"
+            )
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {tabela_fts}_au AFTER UPDATE OF {campo} ON {tabela} BEGIN '
+                f"INSERT INTO {tabela_fts}({tabela_fts}, rowid, {campo}) VALUES ('delete', old.id, old.{campo}); "
+                f'INSERT INTO {tabela_fts}(rowid, {campo}) VALUES (new.id, new.{campo}); END'
+            )
+            # Reindexa a partir da tabela de conteúdo (cobre linhas alteradas sem trigger)
+            cursor.execute(f"INSERT INTO {tabela_fts}({tabela_fts}) VALUES ('rebuild')")
+
+
+def remover_indice_busca(connection, tabela, campo):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'DROP INDEX IF EXISTS idx_{tabela}_{campo}_trgm')
+
+        elif connection.vendor == 'sqlite':
+            tabela_fts = _nome_fts(tabela, campo)
+            for sufixo in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {tabela_fts}_{sufixo}')
+            cursor.execute(f'DROP TABLE IF EXISTS {tabela_fts}')
+
+    _fts_prontos.clear()
+
+
+def garantir_indices_busca(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Handler de post_migrate: recria índices/triggers de busca que estiverem faltando."""
+    connection = connections[using]
+    tabelas = set(connection.introspection.table_names())
+
+    for app_label, nome_modelo, campo in INDICES_BUSCA:
+        tabela = apps.get_model(app_label, nome_modelo)._meta.db_table
+        if tabela not in tabelas:
+            continue
+
+        with connection.cursor() as cursor:
+            colunas = {c.name for c in connection.introspection.get_table_description(cursor, tabela)}
+        if campo in colunas:
+            criar_indice_busca(connection, tabela, campo)
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .busca import normalizar_busca
+from .estado_compartilhado import cache
+from .geohash import centro_geohash, codificar_geohash
+
+# Cache de respostas da busca pública de prestadores (PrestadorListView).
+#
+# A chave é formada pelos parâmetros canônicos da busca e pela célula geohash do
+# cliente, então usuários próximos compartilham a mesma entrada. A invalidação é por
+# versão: qualquer escrita relevante incrementa a versão e as chaves antigas deixam
+# de ser lidas (expiram sozinhas pelo timeout).
+#
+# As respostas ficam no cache padrão de cada processo; a versão fica no cache
+# compartilhado (estado_compartilhado), para que a invalidação feita pelos workers
+# da fila ou por outro processo do gunicorn chegue a todos.
+
+CHAVE_VERSAO = 'prestadores:busca:versao'
+
+# Parâmetros que mudam o resultado; qualquer outro é ignorado na chave
+PARAMETROS_BUSCA = (
+    'servico', 'categoria', 'possui_material_proprio', 'disponibilidade', 'atende_fim_de_semana',
+    'melhor_avaliado', 'nota_minima', 'nome', 'nome_servico', 'ordenar_por_distancia', 'raio_km',
+    'page', 'cursor', 'paginacao',
+)
+PARAMETROS_TEXTO = ('nome', 'nome_servico')
+
+
+def cache_busca_timeout():
+    return getattr(settings, 'PRESTADORES_CACHE_TIMEOUT', 300)
+
+
+def cache_busca_ativo():
+    return cache_busca_timeout() > 0
+
+
+def quantizar_coordenadas(lat, lon):
+    """Leva as coordenadas para o centro da célula geohash (precisão configurável)."""
+    precisao = getattr(settings, 'PRESTADORES_CACHE_PRECISAO_GEOHASH', 6)
+    return centro_geohash(codificar_geohash(lat, lon, precisao))
+
+
+def _versao_inicial():
+    # Se a versão for despejada do cache, recomeça de um valor novo: voltar para 1
+    # reaproveitaria respostas antigas ainda guardadas nos processos
+    return int(time.time() * 1000)
+
+
+def versao_busca():
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        inicial = _versao_inicial()
+        cache.add(CHAVE_VERSAO, inicial, timeout=None)
+        versao = cache.get(CHAVE_VERSAO, inicial)
+    return versao
+
+
+def invalidar_busca_prestadores():
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        # Versão ainda não existia (ou foi despejada do cache)
+        cache.add(CHAVE_VERSAO, _versao_inicial(), timeout=None)
+
+
+def chave_busca(query_params, coordenadas, variante):
+    parametros = {}
+    for nome in PARAMETROS_BUSCA:
+        valor = query_params.get(nome)
+        if valor in (None, ''):
+            continue
+        valor = normalizar_busca(valor) if nome in PARAMETROS_TEXTO else valor.strip().lower()
+        parametros[nome] = valor
+
+    if coordenadas:
+        parametros['coordenadas'] = [round(coordenadas[0], 6), round(coordenadas[1], 6)]
+    parametros['variante'] = variante
+
+    canonico = json.dumps(parametros, sort_keys=True, separators=(',', ':'))
+    resumo = hashlib.md5(canonico.encode('utf-8')).hexdigest()
+    return f'prestadores:busca:v{versao_busca()}:{resumo}'
+
+
+def dados_cacheaveis(dados):
+    # Tira o vínculo com o serializer (ReturnList/ReturnDict) antes de guardar
+    if isinstance(dados, dict):
+        return {chave: list(valor) if isinstance(valor, list) else valor for chave, valor in dados.items()}
+    return list(dados)
+
+
+def ajustar_links(dados, query_params):
+    """Os links next/previous guardados trazem a lat/lon de quem gerou a entrada: troca pelas do cliente atual."""
+    if not isinstance(dados, dict):
+        return dados
+
+    dados = dict(dados)
+    for link in ('next', 'previous'):
+        url = dados.get(link)
+        if not url:
+            continue
+        for nome in ('latitude', 'longitude'):
+            if nome in query_params:
+                url = replace_query_param(url, nome, query_params[nome])
+            else:
+                url = remove_query_param(url, nome)
+        dados[link] = url
+    return dados
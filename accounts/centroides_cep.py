@@ -0,0 +1,107 @@
+import os
+import threading
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+
+# Geocodificador local por setor de CEP (5 primeiros dígitos).
+#
+# O arquivo é um .npy com um registro por setor, ordenado pelo prefixo: a busca é um
+# searchsorted sobre o arquivo mapeado em memória (np.load com mmap_mode), sem rede e
+# sem carregar tudo na RAM. A precisão é de bairro/setor, suficiente para a busca por
+# distância e para quando os provedores estão fora do ar.
+#
+# O arquivo é gerado por `manage.py gerar_centroides_cep` (a partir do cache de CEPs
+# já geocodificados ou de um CSV com cep,latitude,longitude,cidade,estado).
+
+DTYPE = np.dtype([
+    ('prefixo', '<u4'),
+    ('latitude', '<f4'),
+    ('longitude', '<f4'),
+    ('cidade', 'S48'),
+    ('estado', 'S2'),
+])
+
+_dados = None
+_carregado_de = None
+_lock = threading.Lock()
+
+
+def caminho_arquivo():
+    return str(getattr(settings, 'CENTROIDES_CEP_ARQUIVO', ''))
+
+
+def _carregar():
+    """Abre o arquivo só na primeira consulta (e de novo se o caminho ou o arquivo mudar)."""
+    global _dados, _carregado_de
+    caminho = caminho_arquivo()
+    try:
+        versao = (caminho, os.path.getmtime(caminho))
+    except OSError:
+        return None
+
+    if _carregado_de != versao:
+        with _lock:
+            if _carregado_de != versao:
+                _dados = np.load(caminho, mmap_mode='r')
+                _carregado_de = versao
+    return _dados
+
+
+def buscar_centroide(cep):
+    """Dados no formato de pegar_dados_endereco com o centro do setor do CEP, ou None."""
+    cep_limpo = ''.join(filter(str.isdigit, str(cep or '')))
+    dados = _carregar()
+    if dados is None or len(cep_limpo) < 5 or not len(dados):
+        return None
+
+    prefixo = int(cep_limpo[:5])
+    posicao = int(np.searchsorted(dados['prefixo'], prefixo))
+    if posicao >= len(dados) or dados['prefixo'][posicao] != prefixo:
+        return None
+
+    registro = dados[posicao]
+    return {
+        'latitude': Decimal(f"{float(registro['latitude']):.8f}"),
+        'longitude': Decimal(f"{float(registro['longitude']):.8f}"),
+        'cidade': registro['cidade'].decode('utf-8', 'ignore'),
+        'bairro': '',
+        'estado': registro['estado'].decode('ascii', 'ignore'),
+    }
+
+
+def montar_centroides(linhas):
+    """
+    Agrupa (cep, latitude, longitude, cidade, estado) por setor: coordenada média e a
+    cidade/UF mais frequente. Retorna o array ordenado pronto para np.save.
+    """
+    setores = defaultdict(lambda: {'lat': 0.0, 'lon': 0.0, 'total': 0, 'cidades': Counter()})
+    for cep, latitude, longitude, cidade, estado in linhas:
+        cep_limpo = ''.join(filter(str.isdigit, str(cep or '')))
+        if len(cep_limpo) != 8 or latitude is None or longitude is None:
+            continue
+        setor = setores[int(cep_limpo[:5])]
+        setor['lat'] += float(latitude)
+        setor['lon'] += float(longitude)
+        setor['total'] += 1
+        setor['cidades'][(cidade or '', estado or '')] += 1
+
+    resultado = np.zeros(len(setores), dtype=DTYPE)
+    for i, prefixo in enumerate(sorted(setores)):
+        setor = setores[prefixo]
+        cidade, estado = setor['cidades'].most_common(1)[0][0]
+        resultado[i] = (
+            prefixo,
+            setor['lat'] / setor['total'],
+            setor['lon'] / setor['total'],
+            _truncar_utf8(cidade, DTYPE['cidade'].itemsize),
+            estado.encode('ascii', 'ignore')[:2],
+        )
+    return resultado
+
+
+def _truncar_utf8(texto, tamanho):
+    # Corta sem deixar um caractere multibyte pela metade
+    return texto.encode('utf-8')[:tamanho].decode('utf-8', 'ignore').encode('utf-8')
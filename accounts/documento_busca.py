@@ -0,0 +1,87 @@
+# Montagem do documento de busca (PrestadorBusca): uma linha achatada por prestador
+# ativo, com tudo que a listagem pública filtra e ordena, para que a busca seja uma
+# consulta indexada em uma única tabela, sem joins nem DISTINCT.
+#
+# As funções recebem as classes dos modelos: accounts.models importa este módulo.
+
+CAMPOS_DOCUMENTO = [
+    'user_id', 'nome',
+    'servico_id', 'servico_nome', 'categoria_id', 'categoria_nome',
+    'disponibilidade', 'possui_material_proprio', 'atende_fim_de_semana',
+    'nota_media', 'total_avaliacoes', 'pontuacao_ranking',
+    'latitude', 'longitude', 'geohash', 'cidade',
+    'thumbnail', 'atualizado_em',
+]
+
+
+def _primeiras_imagens(PortfolioItem, prestador_ids):
+    imagens = {}
+    itens = PortfolioItem._base_manager.filter(
+        prestador_id__in=prestador_ids, is_deleted=False,
+    ).exclude(imagem='').exclude(imagem__isnull=True).order_by('prestador_id', 'created_at', 'id')
+
+    for prestador_id, imagem in itens.values_list('prestador_id', 'imagem'):
+        imagens.setdefault(prestador_id, imagem)
+    return imagens
+
+
+def sincronizar_documentos(PrestadorProfile, PortfolioItem, PrestadorBusca, prestador_ids=None, lote=500):
+    """
+    Recria os documentos dos prestadores informados (ou de todos, se None).
+    Prestadores removidos ou com usuário removido perdem o documento.
+    """
+    perfis = PrestadorProfile._base_manager.select_related('user', 'servico', 'servico__categoria')
+    if prestador_ids is not None:
+        prestador_ids = list(set(prestador_ids))
+        perfis = perfis.filter(pk__in=prestador_ids)
+
+    ativos = perfis.filter(is_deleted=False, user__is_deleted=False).order_by('pk')
+
+    pendentes = []
+
+    def gravar(pendentes):
+        imagens = _primeiras_imagens(PortfolioItem, [perfil.pk for perfil in pendentes])
+        documentos = [
+            PrestadorBusca(
+                prestador_id=perfil.pk,
+                user_id=perfil.user_id,
+                nome=perfil.user.nome_completo,
+                servico_id=perfil.servico_id,
+                servico_nome=perfil.servico.nome if perfil.servico else '',
+                categoria_id=perfil.servico.categoria_id if perfil.servico else None,
+                categoria_nome=perfil.servico.categoria.nome if perfil.servico else '',
+                disponibilidade=perfil.disponibilidade,
+                possui_material_proprio=perfil.possui_material_proprio,
+                atende_fim_de_semana=perfil.atende_fim_de_semana,
+                nota_media=perfil.nota_media_cache,
+                total_avaliacoes=perfil.total_avaliacoes_cache,
+                pontuacao_ranking=perfil.pontuacao_ranking,
+                latitude=perfil.latitude,
+                longitude=perfil.longitude,
+                geohash=perfil.geohash,
+                cidade=perfil.cidade,
+                thumbnail=imagens.get(perfil.pk, ''),
+            )
+            for perfil in pendentes
+        ]
+        PrestadorBusca._base_manager.bulk_create(
+            documentos,
+            update_conflicts=True,
+            unique_fields=['prestador'],
+            update_fields=CAMPOS_DOCUMENTO,
+        )
+
+    for perfil in ativos.iterator(chunk_size=lote):
+        pendentes.append(perfil)
+        if len(pendentes) >= lote:
+            gravar(pendentes)
+            pendentes = []
+
+    if pendentes:
+        gravar(pendentes)
+
+    # Remove documentos de quem não está mais ativo
+    obsoletos = PrestadorBusca._base_manager.all()
+    if prestador_ids is not None:
+        obsoletos = obsoletos.filter(prestador_id__in=prestador_ids)
+    obsoletos.exclude(prestador_id__in=ativos.values('pk')).delete()
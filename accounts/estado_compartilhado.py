@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+
+# Cache para o estado que precisa valer entre processos (workers do gunicorn, run_workers
+# e comandos): as vagas do limitador de geocodificação, o disjuntor e as métricas dos
+# provedores. Por padrão é uma tabela do banco (DatabaseCache, criada com
+# `manage.py createcachetable`); pode apontar para Redis via CACHE_COMPARTILHADO_*.
+
+ALIAS = 'compartilhado'
+
+# Backends em que cada processo tem a própria cópia: não servem para este estado
+BACKENDS_LOCAIS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+cache = ConnectionProxy(caches, ALIAS)
+
+
+def verificar_cache_compartilhado(app_configs=None, **kwargs):
+    backend = settings.CACHES.get(ALIAS, {}).get('BACKEND')
+    if backend is None:
+        return [checks.Error(f"CACHES['{ALIAS}'] não está configurado.", id='accounts.E001')]
+    if backend in BACKENDS_LOCAIS:
+        return [checks.Error(
+            f"CACHES['{ALIAS}'] usa {backend}, que não é compartilhado entre processos: "
+            'o limite de requisições, o disjuntor e as métricas da geocodificação ficariam por processo.',
+            hint='Use DatabaseCache (padrão) ou Redis.',
+            id='accounts.E001',
+        )]
+    return []
@@ -0,0 +1,101 @@
+import hashlib
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Backends de geocodificação usados por pegar_dados_endereco (depois do cache de CEP).
+#
+# settings.GEOCODER_BACKEND escolhe a classe e settings.GEOCODER_OPCOES os argumentos
+# do construtor. Um backend implementa consultar(cep_limpo, rua, numero) e retorna
+# (dados, fonte), como consultar_cep: fonte 'invalido' para CEP inexistente e None
+# quando a consulta falhou (nada vai para o cache de CEP). Backends com cacheavel = False
+# não gravam no cache de CEP.
+
+PADRAO = 'accounts.geocodificadores.ProvedoresExternos'
+
+_instancia = None
+_configuracao = None
+_lock = threading.Lock()
+
+
+class Geocodificador:
+    # Os resultados podem ir para o cache de CEP (CepGeocode)
+    cacheavel = True
+
+    def __init__(self, **opcoes):
+        self.opcoes = opcoes
+
+    def consultar(self, cep_limpo, rua, numero):
+        raise NotImplementedError
+
+
+class ProvedoresExternos(Geocodificador):
+    """BrasilAPI, ViaCEP e Nominatim (accounts.models.consultar_cep)."""
+
+    def consultar(self, cep_limpo, rua, numero):
+        from . import models
+        return models.consultar_cep(cep_limpo, rua, numero)
+
+
+class GeocodificadorLocal(Geocodificador):
+    """
+    Stub determinístico e sem rede, para testes, benchmarks e testes de carga.
+
+    As coordenadas saem dos dígitos do CEP: os 5 primeiros (setor) definem o ponto
+    base e os 3 últimos um deslocamento de até ~1 km, então CEPs do mesmo setor ficam
+    próximos. Opções: latencia (segundos por consulta) e taxa_falhas (0 a 1, a mesma
+    fração de CEPs sempre falha, escolhida pelo hash do CEP). Os resultados não vão
+    para o cache de CEP: seriam servidos depois de voltar aos provedores.
+    """
+    cacheavel = False
+
+    # UF pela região postal (primeiro dígito)
+    ESTADOS = ['SP', 'SP', 'RJ', 'MG', 'BA', 'PE', 'CE', 'DF', 'PR', 'RS']
+
+    def __init__(self, latencia=0, taxa_falhas=0, **opcoes):
+        super().__init__(**opcoes)
+        self.latencia = float(latencia)
+        self.taxa_falhas = float(taxa_falhas)
+
+    def consultar(self, cep_limpo, rua, numero):
+        if self.latencia:
+            time.sleep(self.latencia)
+        if self.falha(cep_limpo):
+            return None, None
+        return self.coordenadas(cep_limpo), 'local'
+
+    def falha(self, cep_limpo):
+        if not self.taxa_falhas:
+            return False
+        sorteio = int(hashlib.md5(cep_limpo.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+        return sorteio < self.taxa_falhas
+
+    def coordenadas(self, cep_limpo):
+        deslocamento = int(cep_limpo[5:]) * 0.00001
+        latitude = -30 + int(cep_limpo[:3]) / 999 * 25 + deslocamento
+        longitude = -65 + int(cep_limpo[3:5]) / 99 * 25 + deslocamento
+        return {
+            'latitude': Decimal(f'{latitude:.8f}'),
+            'longitude': Decimal(f'{longitude:.8f}'),
+            'cidade': f'Cidade {cep_limpo[:3]}',
+            'bairro': f'Setor {cep_limpo[3:5]}',
+            'estado': self.ESTADOS[int(cep_limpo[0])],
+        }
+
+
+def obter_geocodificador():
+    """Instância do backend configurado (recriada se as settings mudarem)."""
+    global _instancia, _configuracao
+    caminho = getattr(settings, 'GEOCODER_BACKEND', PADRAO)
+    opcoes = getattr(settings, 'GEOCODER_OPCOES', {})
+    configuracao = (caminho, sorted(opcoes.items()))
+
+    if _configuracao != configuracao:
+        with _lock:
+            if _configuracao != configuracao:
+                _instancia = import_string(caminho)(**opcoes)
+                _configuracao = configuracao
+    return _instancia
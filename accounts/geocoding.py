@@ -0,0 +1,309 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.db import close_old_connections
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .estado_compartilhado import cache
+
+# Cliente HTTP compartilhado dos serviços de geocodificação (BrasilAPI, ViaCEP, Nominatim).
+#
+# Cada provedor tem uma requests.Session reaproveitada (keep-alive: sem novo handshake
+# TCP+TLS a cada consulta), timeout próprio e novas tentativas limitadas com backoff
+# exponencial + jitter. Latência e erros de cada provedor são contados no cache
+# compartilhado entre os processos (accounts/estado_compartilhado.py).
+#
+# Provedores com limite de uso (o Nominatim aceita no máximo 1 requisição por segundo
+# por aplicação) passam por aguardar_vaga, que divide o tempo em janelas e reserva
+# cada janela com add() no cache compartilhado: o limite vale para todos os processos
+# juntos, web, workers e backfill.
+#
+# Cada provedor tem também um disjuntor (circuit breaker), com o estado no mesmo cache:
+# depois de GEOCODIFICACAO_CIRCUITO_FALHAS erros seguidos o provedor fica de fora por
+# GEOCODIFICACAO_CIRCUITO_ESPERA segundos (as consultas falham na hora, sem esperar
+# timeout). Passada a espera, uma requisição de teste por vez é liberada (meio aberto):
+# se der certo o circuito fecha, se falhar abre de novo.
+
+USER_AGENT = 'ServicoJa_App_Final/1.0'
+
+PROVEDORES = {
+    # timeout = (conexão, leitura) em segundos
+    'brasilapi': {'url': 'https://brasilapi.com.br', 'timeout': (3.05, 5)},
+    'viacep': {'url': 'https://viacep.com.br', 'timeout': (3.05, 5)},
+    'nominatim': {'url': 'https://nominatim.openstreetmap.org', 'timeout': (3.05, 10), 'limitado': True},
+}
+
+METRICAS = ('chamadas', 'erros', 'latencia_total_ms')
+# Respostas que valem nova tentativa
+STATUS_NOVA_TENTATIVA = (429, 500, 502, 503, 504)
+# Novas tentativas do Nominatim, cada uma numa vaga nova do limitador
+NOMINATIM_NOVAS_TENTATIVAS = 2
+CHAVE_METRICA = 'geocodificacao:{provedor}:{metrica}'
+CHAVE_VAGA = 'geocodificacao:vaga:{provedor}:{janela}'
+CHAVE_CIRCUITO = 'geocodificacao:circuito:{provedor}:{campo}'
+
+
+class LimiteExcedido(Exception):
+    """Não havia vaga no limitador dentro da espera máxima."""
+
+
+class CircuitoAberto(Exception):
+    """O provedor falhou várias vezes seguidas e está em espera."""
+
+
+# Sessions são por thread (os workers da fila rodam em threads); o pool de conexões
+# de cada uma fica aberto entre as consultas
+_local = threading.local()
+
+# Pool para consultar provedores em paralelo (consultar_cep)
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _nova_session(limitado=False):
+    if limitado:
+        # Provedor com limite de uso: só refaz conexões que nem chegaram a enviar a
+        # requisição. Nova tentativa depois de resposta ou timeout de leitura é do
+        # chamador, que pega outra vaga no limitador (buscar_nominatim)
+        retry = Retry(
+            total=2, connect=2, read=0, status=0, other=0,
+            backoff_factor=0.5, backoff_jitter=0.3,
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False,
+        )
+    else:
+        retry = Retry(
+            total=2,
+            connect=2,
+            read=1,
+            status=2,
+            backoff_factor=0.5,
+            backoff_jitter=0.3,
+            status_forcelist=STATUS_NOVA_TENTATIVA,
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=4)
+
+    session = requests.Session()
+    session.headers['User-Agent'] = USER_AGENT
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session(provedor):
+    sessions = getattr(_local, 'sessions', None)
+    if sessions is None:
+        sessions = _local.sessions = {}
+    if provedor not in sessions:
+        sessions[provedor] = _nova_session(PROVEDORES[provedor].get('limitado', False))
+    return sessions[provedor]
+
+
+def get(provedor, caminho, **kwargs):
+    """GET no provedor com a session dele. Erros de rede e respostas 5xx contam como erro."""
+    config = PROVEDORES[provedor]
+    kwargs.setdefault('timeout', config['timeout'])
+    liberar_circuito(provedor)
+
+    inicio = time.perf_counter()
+    erro = True
+    try:
+        response = get_session(provedor).get(config['url'] + caminho, **kwargs)
+        erro = response.status_code >= 500
+        return response
+    finally:
+        registrar_metrica(provedor, (time.perf_counter() - inicio) * 1000, erro)
+        registrar_resultado_circuito(provedor, erro)
+
+
+def em_paralelo(funcao, *args):
+    """Roda a consulta no pool de threads da geocodificação e retorna o Future."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='geocodificacao')
+    return _executor.submit(_com_conexoes_fechadas, funcao, *args)
+
+
+def _com_conexoes_fechadas(funcao, *args):
+    # As threads do pool usam o banco (cache compartilhado, cache de CEP) fora do ciclo
+    # de requisição do Django: as conexões vencidas ou quebradas são fechadas aqui
+    close_old_connections()
+    try:
+        return funcao(*args)
+    finally:
+        close_old_connections()
+
+
+def aguardar_vaga(provedor, espera_maxima=None):
+    """
+    Bloqueia até a próxima vaga livre do provedor (taxa em requisições por segundo).
+    Cada janela de 1/taxa segundos tem uma vaga só, e a requisição sai no início da
+    janela reservada, então duas requisições nunca ficam a menos de 1/taxa segundos.
+    """
+    if not PROVEDORES[provedor].get('limitado'):
+        return
+
+    taxa = getattr(settings, 'GEOCODIFICACAO_TAXA', {}).get(provedor, 1)
+    if espera_maxima is None:
+        espera_maxima = getattr(settings, 'GEOCODIFICACAO_ESPERA_MAXIMA', 30)
+    intervalo = 1 / taxa
+    agora = time.time()
+    prazo = agora + espera_maxima
+
+    # Começa na próxima janela: a atual pode já ter sido usada no início dela
+    janela = int(agora / intervalo) + 1
+    while janela * intervalo <= prazo:
+        chave = CHAVE_VAGA.format(provedor=provedor, janela=janela)
+        if cache.add(chave, 1, timeout=int(espera_maxima + intervalo) + 60):
+            time.sleep(max(0, janela * intervalo - time.time()))
+            return
+        janela += 1
+
+    raise LimiteExcedido(f'Sem vaga para {provedor} em {espera_maxima}s')
+
+
+def buscar_nominatim(query):
+    """(latitude, longitude) do primeiro resultado da busca no Nominatim, ou None."""
+    for tentativa in range(NOMINATIM_NOVAS_TENTATIVAS + 1):
+        ultima = tentativa == NOMINATIM_NOVAS_TENTATIVAS
+        # Com o circuito aberto não adianta esperar vaga no limitador
+        if circuito_aberto('nominatim'):
+            raise CircuitoAberto('nominatim em espera')
+        aguardar_vaga('nominatim')
+        try:
+            response = get('nominatim', '/search', params={
+                'q': query, 'format': 'jsonv2', 'limit': 1, 'countrycodes': 'br',
+            })
+        except (requests.ConnectionError, requests.Timeout):
+            if ultima:
+                raise
+            continue
+        if response.status_code not in STATUS_NOVA_TENTATIVA or ultima:
+            break
+
+    response.raise_for_status()
+    resultados = response.json()
+    if not resultados:
+        return None
+    return float(resultados[0]['lat']), float(resultados[0]['lon'])
+
+
+def _config_circuito():
+    return (
+        getattr(settings, 'GEOCODIFICACAO_CIRCUITO_FALHAS', 5),
+        getattr(settings, 'GEOCODIFICACAO_CIRCUITO_ESPERA', 60),
+    )
+
+
+def _chave_circuito(provedor, campo):
+    return CHAVE_CIRCUITO.format(provedor=provedor, campo=campo)
+
+
+def circuito_aberto(provedor):
+    """True enquanto o provedor está dentro da espera (sem reservar a requisição de teste)."""
+    aberto_ate = cache.get(_chave_circuito(provedor, 'aberto_ate'))
+    return aberto_ate is not None and time.time() < aberto_ate
+
+
+def liberar_circuito(provedor):
+    """Levanta CircuitoAberto se a requisição não pode sair agora."""
+    aberto_ate = cache.get(_chave_circuito(provedor, 'aberto_ate'))
+    if aberto_ate is None:
+        return
+    if time.time() < aberto_ate:
+        raise CircuitoAberto(f'{provedor} em espera por mais {aberto_ate - time.time():.0f}s')
+
+    # Meio aberto: só uma requisição de teste por vez (entre todos os processos)
+    _, espera = _config_circuito()
+    if not cache.add(_chave_circuito(provedor, 'teste'), 1, timeout=espera):
+        raise CircuitoAberto(f'{provedor} em teste')
+
+
+def registrar_resultado_circuito(provedor, erro):
+    chaves = [_chave_circuito(provedor, campo) for campo in ('falhas', 'aberto_ate', 'teste')]
+    if not erro:
+        cache.delete_many(chaves)
+        return
+
+    limite, espera = _config_circuito()
+    falhas = _somar(chaves[0], 1)
+    # Falhou a requisição de teste ou chegou ao limite: abre (de novo) o circuito
+    if falhas >= limite or cache.get(chaves[1]) is not None:
+        cache.set(chaves[1], time.time() + espera, timeout=None)
+        cache.delete(chaves[2])
+
+
+def estado_circuito(provedor):
+    """'fechado', 'aberto' ou 'meio_aberto', com as falhas seguidas e quanto falta da espera."""
+    valores = cache.get_many([_chave_circuito(provedor, campo) for campo in ('falhas', 'aberto_ate')])
+    falhas = valores.get(_chave_circuito(provedor, 'falhas'), 0)
+    aberto_ate = valores.get(_chave_circuito(provedor, 'aberto_ate'))
+
+    if aberto_ate is None:
+        estado, restante = 'fechado', None
+    elif time.time() < aberto_ate:
+        estado, restante = 'aberto', round(aberto_ate - time.time(), 1)
+    else:
+        estado, restante = 'meio_aberto', 0
+    return {'estado': estado, 'falhas_seguidas': falhas, 'espera_restante_s': restante}
+
+
+def fechar_circuito(provedor):
+    cache.delete_many([_chave_circuito(provedor, campo) for campo in ('falhas', 'aberto_ate', 'teste')])
+
+
+def registrar_metrica(provedor, latencia_ms, erro=False):
+    _incrementar(provedor, 'chamadas')
+    _incrementar(provedor, 'latencia_total_ms', int(latencia_ms))
+    if erro:
+        _incrementar(provedor, 'erros')
+
+
+def _incrementar(provedor, metrica, valor=1):
+    _somar(CHAVE_METRICA.format(provedor=provedor, metrica=metrica), valor)
+
+
+def _somar(chave, valor):
+    # add() cria a chave só se não existir. incr() é atômico no Redis; no DatabaseCache é
+    # ler e gravar, então incrementos simultâneos podem se perder (ok para métricas e
+    # para a contagem de falhas do disjuntor)
+    if cache.add(chave, valor, timeout=None):
+        return valor
+    try:
+        return cache.incr(chave, valor)
+    except ValueError:
+        cache.set(chave, valor, timeout=None)
+        return valor
+
+
+def metricas_provedores():
+    """Chamadas, erros e latência média (ms) de cada provedor desde o último reset."""
+    resultado = {}
+    for provedor in PROVEDORES:
+        valores = cache.get_many([CHAVE_METRICA.format(provedor=provedor, metrica=m) for m in METRICAS])
+        chamadas, erros, latencia = (
+            valores.get(CHAVE_METRICA.format(provedor=provedor, metrica=m), 0) for m in METRICAS
+        )
+        resultado[provedor] = {
+            'chamadas': chamadas,
+            'erros': erros,
+            'latencia_media_ms': round(latencia / chamadas, 1) if chamadas else None,
+            'circuito': estado_circuito(provedor),
+        }
+    return resultado
+
+
+def zerar_metricas():
+    cache.delete_many([
+        CHAVE_METRICA.format(provedor=provedor, metrica=m) for provedor in PROVEDORES for m in METRICAS
+    ])
@@ -0,0 +1,104 @@
+import math
+
+# Geohash: divide o mapa em células retangulares identificadas por uma string.
+# Pontos próximos compartilham a mesma célula, então a busca por proximidade
+# vira um "geohash IN (células vizinhas)" servido por índice.
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# Precisão 5 = células de ~4,9 km x 4,9 km (no equador)
+GEOHASH_PRECISAO = 5
+
+# Acima disso a lista do IN fica grande demais e o retângulo de lat/lon resolve melhor
+MAX_CELULAS = 100
+
+
+def codificar_geohash(lat, lon, precisao=GEOHASH_PRECISAO):
+    if lat is None or lon is None:
+        return ''
+
+    lat = float(lat)
+    lon = float(lon)
+    lat_intervalo = [-90.0, 90.0]
+    lon_intervalo = [-180.0, 180.0]
+
+    geohash = []
+    bits = 0
+    valor = 0
+    usar_lon = True
+
+    while len(geohash) < precisao:
+        intervalo, coordenada = (lon_intervalo, lon) if usar_lon else (lat_intervalo, lat)
+        meio = (intervalo[0] + intervalo[1]) / 2
+
+        valor <<= 1
+        if coordenada >= meio:
+            valor |= 1
+            intervalo[0] = meio
+        else:
+            intervalo[1] = meio
+
+        usar_lon = not usar_lon
+        bits += 1
+        if bits == 5:
+            geohash.append(BASE32[valor])
+            bits = 0
+            valor = 0
+
+    return ''.join(geohash)
+
+
+def tamanho_celula(precisao=GEOHASH_PRECISAO):
+    """Retorna (altura, largura) da célula em graus de latitude e longitude."""
+    total_bits = 5 * precisao
+    bits_lon = math.ceil(total_bits / 2)
+    bits_lat = total_bits // 2
+    return 180.0 / (2 ** bits_lat), 360.0 / (2 ** bits_lon)
+
+
+def celulas_na_area(lat_min, lat_max, lon_min, lon_max, precisao=GEOHASH_PRECISAO, limite=MAX_CELULAS):
+    """
+    Lista as células que cobrem o retângulo informado.
+    Retorna None se forem mais de `limite` células.
+    """
+    altura, largura = tamanho_celula(precisao)
+
+    # Índice da célula (linha/coluna da grade) de cada canto do retângulo
+    linha_min = math.floor((lat_min + 90.0) / altura)
+    linha_max = math.floor((lat_max + 90.0) / altura)
+    coluna_min = math.floor((lon_min + 180.0) / largura)
+    coluna_max = math.floor((lon_max + 180.0) / largura)
+
+    if (linha_max - linha_min + 1) * (coluna_max - coluna_min + 1) > limite:
+        return None
+
+    celulas = set()
+    for linha in range(linha_min, linha_max + 1):
+        # Centro da célula, para não cair na borda entre duas
+        lat = min((linha + 0.5) * altura - 90.0, 90.0)
+        for coluna in range(coluna_min, coluna_max + 1):
+            lon = min((coluna + 0.5) * largura - 180.0, 180.0)
+            celulas.add(codificar_geohash(lat, lon, precisao))
+
+    return sorted(celulas)
+
+
+def centro_geohash(geohash):
+    """Retorna (lat, lon) do centro da célula."""
+    lat_intervalo = [-90.0, 90.0]
+    lon_intervalo = [-180.0, 180.0]
+    usar_lon = True
+
+    for caractere in geohash:
+        valor = BASE32.index(caractere)
+        for deslocamento in range(4, -1, -1):
+            bit = (valor >> deslocamento) & 1
+            intervalo = lon_intervalo if usar_lon else lat_intervalo
+            meio = (intervalo[0] + intervalo[1]) / 2
+            if bit:
+                intervalo[0] = meio
+            else:
+                intervalo[1] = meio
+            usar_lon = not usar_lon
+
+    return (lat_intervalo[0] + lat_intervalo[1]) / 2, (lon_intervalo[0] + lon_intervalo[1]) / 2
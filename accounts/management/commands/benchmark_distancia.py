@@ -0,0 +1,57 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.views import calcular_distancia, calcular_distancias_lote, indices_mais_proximos
+
+
+class Command(BaseCommand):
+    help = 'Compara o ranking por distância linha a linha (math + sort) com a versão vetorizada (NumPy + argpartition).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--linhas', type=int, default=100_000, help='Quantidade de prestadores simulados.')
+        parser.add_argument('--top', type=int, default=20, help='Quantos mais próximos selecionar.')
+        parser.add_argument('--repeticoes', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        linhas = options['linhas']
+        top = options['top']
+        repeticoes = options['repeticoes']
+        rng = random.Random(options['seed'])
+
+        # Pontos espalhados pelo território brasileiro
+        latitudes = [rng.uniform(-33.7, 5.2) for _ in range(linhas)]
+        longitudes = [rng.uniform(-73.9, -34.8) for _ in range(linhas)]
+        origem = (-23.5503, -46.6339)
+
+        def por_linha():
+            distancias = [
+                (calcular_distancia(origem[0], origem[1], lat, lon), i)
+                for i, (lat, lon) in enumerate(zip(latitudes, longitudes))
+            ]
+            distancias.sort()
+            return [i for _, i in distancias[:top]]
+
+        def vetorizado():
+            distancias = calcular_distancias_lote(origem[0], origem[1], latitudes, longitudes)
+            return indices_mais_proximos(distancias, top).tolist()
+
+        resultados = {}
+        for nome, funcao in (('por linha', por_linha), ('vetorizado', vetorizado)):
+            tempos = []
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                resultados[nome] = funcao()
+                tempos.append(time.perf_counter() - inicio)
+            melhor = min(tempos)
+            resultados[f'{nome}_tempo'] = melhor
+            self.stdout.write(f'{nome:>10}: {melhor * 1000:9.2f} ms (melhor de {repeticoes})')
+
+        # Empates no arredondamento podem trocar a ordem; compara o conjunto
+        if set(resultados['por linha']) != set(resultados['vetorizado']):
+            self.stdout.write(self.style.WARNING('Os dois métodos retornaram prestadores diferentes.'))
+
+        ganho = resultados['por linha_tempo'] / resultados['vetorizado_tempo']
+        self.stdout.write(self.style.SUCCESS(f'{linhas} linhas, top {top}: {ganho:.1f}x mais rápido'))
@@ -0,0 +1,178 @@
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+
+from accounts.cache_busca import invalidar_busca_prestadores
+from accounts.geohash import codificar_geohash
+from accounts.models import (
+    GEOCODE_CONCLUIDO, GEOCODE_FALHOU,
+    CepGeocode, ClienteProfile, PrestadorBusca, PrestadorProfile, pegar_dados_endereco,
+)
+
+MODELOS = {
+    'cliente': ClienteProfile,
+    'prestador': PrestadorProfile,
+}
+
+
+def limpar_cep(cep):
+    return ''.join(filter(str.isdigit, str(cep or '')))
+
+
+def resolver_cep(cep, rua, numero):
+    # Roda nas threads do pool: cada uma tem a própria conexão com o banco
+    try:
+        return cep, pegar_dados_endereco(cep, rua, numero)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Geocodifica em lote os perfis sem coordenadas ou sem cidade. Agrupa por CEP, usa o '
+        'cache de CEP, consulta os provedores em paralelo e salva o progresso para retomar.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modelo', choices=['cliente', 'prestador', 'todos'], default='todos')
+        parser.add_argument('--lote', type=int, default=500, help='Perfis por lote.')
+        parser.add_argument('--concorrencia', type=int, default=4, help='Consultas de CEP simultâneas (1 roda sem threads).')
+        parser.add_argument('--checkpoint', default='.geocode_backfill.json', help='Arquivo de progresso.')
+        parser.add_argument('--reiniciar', action='store_true', help='Ignora o progresso salvo e começa do zero.')
+
+    def handle(self, *args, **options):
+        self.caminho_checkpoint = options['checkpoint']
+        self.checkpoint = {} if options['reiniciar'] else self.ler_checkpoint()
+        self.lote = options['lote']
+        self.concorrencia = max(1, options['concorrencia'])
+        # CEPs já resolvidos nesta execução (inclusive falhas, que não vão para o cache de CEP)
+        self.resolvidos = {}
+
+        nomes = list(MODELOS) if options['modelo'] == 'todos' else [options['modelo']]
+        for nome in nomes:
+            self.processar_modelo(nome, MODELOS[nome])
+
+        self.stdout.write(self.style.SUCCESS('Backfill concluído.'))
+
+    def processar_modelo(self, nome, Modelo):
+        pendentes = Modelo.objects.filter(
+            Q(latitude__isnull=True) | Q(longitude__isnull=True) | Q(cidade='')
+        ).exclude(cep='').order_by('pk')
+
+        ultimo_pk = self.checkpoint.get(nome, 0)
+        if ultimo_pk:
+            self.stdout.write(f'{nome}: retomando depois do pk {ultimo_pk}')
+
+        totais = {'perfis': 0, 'ceps': 0, 'cache': 0, 'ok': 0, 'falhas': 0, 'alterados': 0}
+        inicio = time.perf_counter()
+
+        while True:
+            # Keyset por pk: cada lote continua de onde o anterior parou
+            perfis = list(pendentes.filter(pk__gt=ultimo_pk)[:self.lote])
+            if not perfis:
+                break
+
+            estatisticas = self.processar_lote(nome, Modelo, perfis)
+            for chave, valor in estatisticas.items():
+                totais[chave] += valor
+
+            ultimo_pk = perfis[-1].pk
+            self.checkpoint[nome] = ultimo_pk
+            self.salvar_checkpoint()
+
+            decorrido = time.perf_counter() - inicio
+            self.stdout.write(
+                f"{nome}: {totais['perfis']} perfis, {totais['ceps']} CEPs ({totais['cache']} do cache), "
+                f"{totais['ok']} geocodificados, {totais['falhas']} falhas, "
+                f"{totais['alterados']} alterados durante a consulta - "
+                f"{totais['perfis'] / decorrido:.1f} perfis/s"
+            )
+
+        if not totais['perfis']:
+            self.stdout.write(f'{nome}: nenhum perfil pendente.')
+
+        # Terminou: a próxima execução começa do início, senão perfis de pk menor que
+        # voltaram a ficar pendentes (ou falharam de novo) seriam pulados
+        self.checkpoint.pop(nome, None)
+        self.salvar_checkpoint()
+
+    def processar_lote(self, nome, Modelo, perfis):
+        # Um CEP por consulta, mesmo que vários perfis compartilhem o endereço
+        por_cep = {}
+        for perfil in perfis:
+            cep = limpar_cep(perfil.cep)
+            if len(cep) == 8:
+                por_cep.setdefault(cep, perfil)
+
+        novos = [cep for cep in por_cep if cep not in self.resolvidos]
+        em_cache = CepGeocode.buscar_varios(novos)
+        resultados = self.resolvidos
+        resultados.update({cep: entrada.como_dados() for cep, entrada in em_cache.items()})
+
+        faltando = [(cep, por_cep[cep].rua, por_cep[cep].numero_casa) for cep in novos if cep not in em_cache]
+        if faltando and self.concorrencia > 1:
+            with ThreadPoolExecutor(max_workers=self.concorrencia) as executor:
+                for cep, dados in executor.map(lambda args: resolver_cep(*args), faltando):
+                    resultados[cep] = dados
+        else:
+            for cep, rua, numero in faltando:
+                resultados[cep] = pegar_dados_endereco(cep, rua, numero)
+
+        ok = alterados = 0
+        gravados = []
+        agora = timezone.now()
+        for perfil in perfis:
+            dados = resultados.get(limpar_cep(perfil.cep))
+            valores = {'geocode_status': GEOCODE_FALHOU, 'updated_at': agora}
+            if dados and dados['latitude'] is not None:
+                valores.update({campo: dados[campo] for campo in ('latitude', 'longitude', 'cidade', 'bairro', 'estado')})
+                valores['geohash'] = codificar_geohash(dados['latitude'], dados['longitude'])
+                valores['geocode_status'] = GEOCODE_CONCLUIDO
+
+            # Só grava se o endereço não mudou enquanto o lote era consultado; o perfil
+            # editado já foi para a fila de geocodificação com o endereço novo
+            if not Modelo.objects.filter(
+                pk=perfil.pk, cep=perfil.cep, rua=perfil.rua, numero_casa=perfil.numero_casa,
+            ).update(**valores):
+                alterados += 1
+                continue
+            gravados.append(perfil.pk)
+            if valores['geocode_status'] == GEOCODE_CONCLUIDO:
+                ok += 1
+
+        if nome == 'prestador' and gravados:
+            # update() não dispara signals: atualiza a busca aqui
+            PrestadorBusca.sincronizar(gravados)
+            invalidar_busca_prestadores()
+
+        return {
+            'perfis': len(perfis),
+            'ceps': len(novos),
+            'cache': len(em_cache),
+            'ok': ok,
+            'falhas': len(gravados) - ok,
+            'alterados': alterados,
+        }
+
+    def ler_checkpoint(self):
+        if not os.path.exists(self.caminho_checkpoint):
+            return {}
+        with open(self.caminho_checkpoint) as arquivo:
+            return json.load(arquivo)
+
+    def salvar_checkpoint(self):
+        if not self.checkpoint:
+            if os.path.exists(self.caminho_checkpoint):
+                os.remove(self.caminho_checkpoint)
+            return
+        # Grava num temporário e troca: uma interrupção no meio não corrompe o arquivo
+        temporario = f'{self.caminho_checkpoint}.tmp'
+        with open(temporario, 'w') as arquivo:
+            json.dump(self.checkpoint, arquivo)
+        os.replace(temporario, self.caminho_checkpoint)
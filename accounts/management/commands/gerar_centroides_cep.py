@@ -0,0 +1,48 @@
+import csv
+import os
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.centroides_cep import caminho_arquivo, montar_centroides
+from accounts.models import CepGeocode
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera o arquivo de centroides por setor de CEP (5 dígitos) usado como geocodificador local. '
+        'Fonte: o cache de CEPs geocodificados ou um CSV com cep,latitude,longitude,cidade,estado.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--csv', help='CSV de origem (com cabeçalho). Sem ele usa a tabela CepGeocode.')
+        parser.add_argument('--saida', help='Arquivo .npy de saída (padrão: settings.CENTROIDES_CEP_ARQUIVO).')
+
+    def handle(self, *args, **options):
+        saida = options['saida'] or caminho_arquivo()
+        if not saida:
+            raise CommandError('Informe --saida ou configure CENTROIDES_CEP_ARQUIVO.')
+
+        if options['csv']:
+            with open(options['csv'], newline='', encoding='utf-8') as arquivo:
+                linhas = [
+                    (linha['cep'], linha['latitude'] or None, linha['longitude'] or None, linha['cidade'], linha['estado'])
+                    for linha in csv.DictReader(arquivo)
+                ]
+        else:
+            linhas = CepGeocode.objects.exclude(fonte='invalido').values_list(
+                'cep', 'latitude', 'longitude', 'cidade', 'estado',
+            ).iterator()
+
+        centroides = montar_centroides(linhas)
+        if not len(centroides):
+            raise CommandError('Nenhum CEP com coordenadas na origem.')
+
+        os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+        # Grava num temporário e troca, para quem está com o arquivo aberto não ler pela metade
+        temporario = f'{saida}.tmp.npy'
+        np.save(temporario, centroides)
+        os.replace(temporario, saida)
+
+        tamanho_kb = os.path.getsize(saida) / 1024
+        self.stdout.write(self.style.SUCCESS(f'{len(centroides)} setores gravados em {saida} ({tamanho_kb:.0f} KB).'))
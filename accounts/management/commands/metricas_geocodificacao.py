@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from accounts.geocoding import PROVEDORES, fechar_circuito, metricas_provedores, zerar_metricas
+
+
+class Command(BaseCommand):
+    help = 'Mostra chamadas, erros, latência média e o estado do disjuntor de cada provedor de geocodificação.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--zerar', action='store_true', help='Zera os contadores depois de mostrar.')
+        parser.add_argument('--fechar', action='store_true', help='Fecha os circuitos abertos (provedor voltou).')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'provedor':<12} {'chamadas':>9} {'erros':>7} {'média ms':>10}  circuito")
+        for provedor, metricas in metricas_provedores().items():
+            media = metricas['latencia_media_ms'] if metricas['latencia_media_ms'] is not None else '-'
+            circuito = metricas['circuito']
+            estado = circuito['estado']
+            if circuito['espera_restante_s']:
+                estado += f" ({circuito['espera_restante_s']:.0f}s)"
+            self.stdout.write(f"{provedor:<12} {metricas['chamadas']:>9} {metricas['erros']:>7} {media:>10}  {estado}")
+
+        if options['zerar']:
+            zerar_metricas()
+            self.stdout.write(self.style.SUCCESS('Contadores zerados.'))
+
+        if options['fechar']:
+            for provedor in PROVEDORES:
+                fechar_circuito(provedor)
+            self.stdout.write(self.style.SUCCESS('Circuitos fechados.'))
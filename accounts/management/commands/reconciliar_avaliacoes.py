@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from accounts.agregados_avaliacao import erros_agregados, zerar_erros_agregados
+from accounts.reconciliacao import reconciliar_avaliacoes
+from accounts.tasks import agendar_reconciliacao
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconta soma, total, média e estrelas das avaliações de cada prestador e mostra as divergências '
+        'com os valores mantidos pelos signals.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--corrigir', action='store_true', help='Grava os valores recontados.')
+        parser.add_argument('--agendar', action='store_true', help='Só agenda a reconciliação periódica na fila.')
+
+    def handle(self, *args, **options):
+        if options['agendar']:
+            tarefa = agendar_reconciliacao()
+            self.stdout.write('Reconciliação agendada.' if tarefa else 'Reconciliação já estava agendada.')
+            return
+
+        erros = erros_agregados()
+        if erros:
+            self.stdout.write(self.style.WARNING(f'{erros} erro(s) ao gravar os agregados desde a última correção.'))
+
+        divergencias = reconciliar_avaliacoes(corrigir=options['corrigir'])
+        if options['corrigir']:
+            zerar_erros_agregados()
+        for prestador_id, gravado, recontado in divergencias:
+            for campo in gravado:
+                self.stdout.write(f'prestador {prestador_id}: {campo} {gravado[campo]} -> {recontado[campo]}')
+
+        if not divergencias:
+            self.stdout.write(self.style.SUCCESS('Nenhuma divergência.'))
+        elif options['corrigir']:
+            self.stdout.write(self.style.SUCCESS(f'{len(divergencias)} prestador(es) corrigido(s).'))
+        else:
+            self.stdout.write(self.style.WARNING(f'{len(divergencias)} divergência(s). Use --corrigir para gravar.'))
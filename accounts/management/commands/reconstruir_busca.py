@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from accounts.models import PrestadorBusca
+
+
+class Command(BaseCommand):
+    help = 'Recria o documento de busca (PrestadorBusca) de todos os prestadores ativos.'
+
+    def handle(self, *args, **options):
+        PrestadorBusca.sincronizar()
+        self.stdout.write(self.style.SUCCESS(f'{PrestadorBusca.objects.count()} documentos de busca atualizados.'))
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:58
+
+from django.db import migrations, models
+
+from accounts.geohash import codificar_geohash
+
+
+def preencher_geohash(apps, schema_editor):
+    for nome_modelo in ('ClienteProfile', 'PrestadorProfile'):
+        Modelo = apps.get_model('accounts', nome_modelo)
+        perfis = Modelo._base_manager.filter(latitude__isnull=False, longitude__isnull=False)
+
+        for perfil in perfis.only('pk', 'latitude', 'longitude').iterator():
+            geohash = codificar_geohash(perfil.latitude, perfil.longitude)
+            Modelo._base_manager.filter(pk=perfil.pk).update(geohash=geohash)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0014_alter_user_options_alter_user_managers_and_more'),
+        ('servicos', '0002_prestadorservicos_deleted_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='clienteprofile',
+            name='geohash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='prestadorprofile',
+            name='geohash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=12),
+        ),
+        migrations.AddIndex(
+            model_name='clienteprofile',
+            index=models.Index(fields=['geohash'], name='idx_cliente_geohash'),
+        ),
+        migrations.AddIndex(
+            model_name='prestadorprofile',
+            index=models.Index(fields=['geohash'], name='idx_prestador_geohash'),
+        ),
+        migrations.RunPython(preencher_geohash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:03
+
+from django.db import migrations, models
+
+from accounts.busca import criar_indice_busca, normalizar_busca, remover_indice_busca
+
+
+def preencher_nome_busca(apps, schema_editor):
+    User = apps.get_model('accounts', 'User')
+    for obj in User._base_manager.only('pk', 'nome_completo').iterator():
+        User._base_manager.filter(pk=obj.pk).update(nome_busca=normalizar_busca(obj.nome_completo))
+
+
+def criar_indice(apps, schema_editor):
+    criar_indice_busca(schema_editor.connection, 'accounts_user', 'nome_busca')
+
+
+def remover_indice(apps, schema_editor):
+    remover_indice_busca(schema_editor.connection, 'accounts_user', 'nome_busca')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0015_clienteprofile_geohash_prestadorprofile_geohash_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='nome_busca',
+            field=models.CharField(blank=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(preencher_nome_busca, migrations.RunPython.noop),
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def popular_documentos(apps, schema_editor):
+    # Cópia da montagem de accounts/documento_busca.py como ela era nesta migration:
+    # a tabela acabou de ser criada, então basta inserir os documentos dos ativos
+    PrestadorProfile = apps.get_model('accounts', 'PrestadorProfile')
+    PortfolioItem = apps.get_model('portfolio', 'PortfolioItem')
+    PrestadorBusca = apps.get_model('accounts', 'PrestadorBusca')
+
+    ativos = PrestadorProfile.objects.select_related('user', 'servico', 'servico__categoria').filter(
+        is_deleted=False, user__is_deleted=False,
+    ).order_by('pk')
+
+    def gravar(perfis):
+        imagens = {}
+        itens = PortfolioItem.objects.filter(
+            prestador_id__in=[perfil.pk for perfil in perfis], is_deleted=False,
+        ).exclude(imagem='').exclude(imagem__isnull=True).order_by('prestador_id', 'created_at', 'id')
+        for prestador_id, imagem in itens.values_list('prestador_id', 'imagem'):
+            imagens.setdefault(prestador_id, imagem)
+
+        PrestadorBusca.objects.bulk_create([
+            PrestadorBusca(
+                prestador_id=perfil.pk,
+                user_id=perfil.user_id,
+                nome=perfil.user.nome_completo,
+                servico_id=perfil.servico_id,
+                servico_nome=perfil.servico.nome if perfil.servico else '',
+                categoria_id=perfil.servico.categoria_id if perfil.servico else None,
+                categoria_nome=perfil.servico.categoria.nome if perfil.servico else '',
+                disponibilidade=perfil.disponibilidade,
+                possui_material_proprio=perfil.possui_material_proprio,
+                atende_fim_de_semana=perfil.atende_fim_de_semana,
+                nota_media=perfil.nota_media_cache,
+                total_avaliacoes=perfil.total_avaliacoes_cache,
+                latitude=perfil.latitude,
+                longitude=perfil.longitude,
+                geohash=perfil.geohash,
+                cidade=perfil.cidade,
+                thumbnail=imagens.get(perfil.pk, ''),
+            )
+            for perfil in perfis
+        ])
+
+    pendentes = []
+    for perfil in ativos.iterator(chunk_size=500):
+        pendentes.append(perfil)
+        if len(pendentes) >= 500:
+            gravar(pendentes)
+            pendentes = []
+    if pendentes:
+        gravar(pendentes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0016_user_nome_busca'),
+        ('portfolio', '0003_portfolioitem_deleted_at_portfolioitem_is_deleted_and_more'),
+        ('servicos', '0003_servico_nome_busca'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrestadorBusca',
+            fields=[
+                ('prestador', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='documento_busca', serialize=False, to='accounts.prestadorprofile')),
+                ('user_id', models.BigIntegerField()),
+                ('nome', models.CharField(max_length=255)),
+                ('servico_id', models.BigIntegerField(blank=True, null=True)),
+                ('servico_nome', models.CharField(blank=True, max_length=100)),
+                ('categoria_id', models.BigIntegerField(blank=True, null=True)),
+                ('categoria_nome', models.CharField(blank=True, max_length=100)),
+                ('disponibilidade', models.BooleanField(default=False)),
+                ('possui_material_proprio', models.BooleanField(default=False)),
+                ('atende_fim_de_semana', models.BooleanField(default=False)),
+                ('nota_media', models.DecimalField(decimal_places=2, default=5, max_digits=3)),
+                ('total_avaliacoes', models.PositiveIntegerField(default=0)),
+                ('latitude', models.DecimalField(blank=True, decimal_places=8, max_digits=10, null=True)),
+                ('longitude', models.DecimalField(blank=True, decimal_places=8, max_digits=11, null=True)),
+                ('geohash', models.CharField(blank=True, default='', max_length=12)),
+                ('cidade', models.CharField(blank=True, max_length=100)),
+                ('thumbnail', models.CharField(blank=True, help_text='Primeira imagem do portfólio', max_length=255)),
+                ('atualizado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['servico_id', '-nota_media'], name='idx_busca_servico_nota'), models.Index(fields=['categoria_id', '-nota_media'], name='idx_busca_categoria_nota'), models.Index(fields=['latitude', 'longitude'], name='idx_busca_geo'), models.Index(fields=['geohash'], name='idx_busca_geohash')],
+            },
+        ),
+        migrations.RunPython(popular_documentos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0017_prestadorbusca'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('servicos', '0003_servico_nome_busca'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='clienteprofile',
+            name='idx_cliente_deleted',
+        ),
+        migrations.RemoveIndex(
+            model_name='clienteprofile',
+            name='idx_cliente_geohash',
+        ),
+        migrations.RemoveIndex(
+            model_name='prestadorprofile',
+            name='idx_prestador_deleted',
+        ),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='idx_user_deleted',
+        ),
+        migrations.AddIndex(
+            model_name='clienteprofile',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['geohash'], name='idx_cliente_ativo_geohash'),
+        ),
+        migrations.AddIndex(
+            model_name='prestadorprofile',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['servico', '-nota_media_cache'], name='idx_prestador_ativo_servico'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['tipo_usuario'], name='idx_user_ativo_tipo'),
+        ),
+    ]
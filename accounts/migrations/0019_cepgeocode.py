@@ -0,0 +1,30 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0018_remove_clienteprofile_idx_cliente_deleted_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CepGeocode',
+            fields=[
+                ('cep', models.CharField(max_length=8, primary_key=True, serialize=False)),
+                ('cidade', models.CharField(blank=True, max_length=100)),
+                ('bairro', models.CharField(blank=True, max_length=100)),
+                ('estado', models.CharField(blank=True, max_length=2)),
+                ('latitude', models.DecimalField(blank=True, decimal_places=8, max_digits=10, null=True)),
+                ('longitude', models.DecimalField(blank=True, decimal_places=8, max_digits=11, null=True)),
+                ('fonte', models.CharField(choices=[('brasilapi', 'BrasilAPI'), ('nominatim', 'ViaCEP + Nominatim'), ('invalido', 'CEP inválido')], max_length=10)),
+                ('consultado_em', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Geocodificação de CEP',
+                'verbose_name_plural': 'Geocodificações de CEP',
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:12
+
+import accounts.models
+from django.db import migrations, models
+
+
+def marcar_sem_coordenadas(apps, schema_editor):
+    # Perfis antigos sem coordenadas ficam como falha (o backfill pode tentar de novo)
+    for nome_modelo in ('ClienteProfile', 'PrestadorProfile'):
+        Modelo = apps.get_model('accounts', nome_modelo)
+        Modelo._base_manager.filter(latitude__isnull=True).update(geocode_status='falhou')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0019_cepgeocode'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', accounts.models.ActiveUserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='clienteprofile',
+            name='geocode_status',
+            field=models.CharField(choices=[('pendente', 'Pendente'), ('concluido', 'Concluído'), ('falhou', 'Falhou')], default='concluido', editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='prestadorprofile',
+            name='geocode_status',
+            field=models.CharField(choices=[('pendente', 'Pendente'), ('concluido', 'Concluído'), ('falhou', 'Falhou')], default='concluido', editable=False, max_length=10),
+        ),
+        migrations.RunPython(marcar_sem_coordenadas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0020_alter_user_managers_clienteprofile_geocode_status_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cepgeocode',
+            name='fonte',
+            field=models.CharField(choices=[('brasilapi', 'BrasilAPI'), ('nominatim', 'ViaCEP + Nominatim'), ('invalido', 'CEP inválido'), ('local', 'Geocodificador local (stub)')], max_length=10),
+        ),
+    ]
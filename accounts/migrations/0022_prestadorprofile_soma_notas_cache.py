@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:44
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def preencher_soma_notas(apps, schema_editor):
+    # Recontagem inicial: daqui em diante os signals aplicam só a diferença
+    Avaliacao = apps.get_model('avaliacoes', 'Avaliacao')
+    PrestadorProfile = apps.get_model('accounts', 'PrestadorProfile')
+    linhas = Avaliacao.objects.values('solicitacao_contato__prestador_id').annotate(
+        soma=Sum('nota'), total=Count('pk'),
+    ).order_by()
+    for linha in linhas:
+        media = (Decimal(linha['soma']) / linha['total']).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        PrestadorProfile._base_manager.filter(user_id=linha['solicitacao_contato__prestador_id']).update(
+            soma_notas_cache=linha['soma'],
+            total_avaliacoes_cache=linha['total'],
+            total_servicos_cache=linha['total'],
+            nota_media_cache=media,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0021_alter_cepgeocode_fonte'),
+        ('avaliacoes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prestadorprofile',
+            name='soma_notas_cache',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(preencher_soma_notas, migrations.RunPython.noop),
+    ]
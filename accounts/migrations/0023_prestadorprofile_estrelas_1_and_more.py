@@ -0,0 +1,52 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:46
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def preencher_estrelas(apps, schema_editor):
+    Avaliacao = apps.get_model('avaliacoes', 'Avaliacao')
+    PrestadorProfile = apps.get_model('accounts', 'PrestadorProfile')
+    linhas = Avaliacao.objects.values('solicitacao_contato__prestador_id', 'nota').annotate(
+        quantidade=Count('pk'),
+    ).order_by()
+    for linha in linhas:
+        PrestadorProfile._base_manager.filter(user_id=linha['solicitacao_contato__prestador_id']).update(
+            **{f"estrelas_{linha['nota']}": linha['quantidade']}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0022_prestadorprofile_soma_notas_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prestadorprofile',
+            name='estrelas_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='prestadorprofile',
+            name='estrelas_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='prestadorprofile',
+            name='estrelas_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='prestadorprofile',
+            name='estrelas_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='prestadorprofile',
+            name='estrelas_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(preencher_estrelas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:48
+
+from decimal import ROUND_HALF_UP, Decimal
+
+import accounts.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+def preencher_pontuacao(apps, schema_editor):
+    # Mesma conta de calcular_pontuacao_ranking, a partir da soma e do total já gravados
+    PrestadorProfile = apps.get_model('accounts', 'PrestadorProfile')
+    PrestadorBusca = apps.get_model('accounts', 'PrestadorBusca')
+    nota_priori = Decimal(str(getattr(settings, 'RANKING_NOTA_PRIORI', 3.5)))
+    peso = max(1, int(getattr(settings, 'RANKING_PESO_PRIORI', 10)))
+
+    agregados = PrestadorProfile._base_manager.values_list('pk', 'soma_notas_cache', 'total_avaliacoes_cache')
+    for pk, soma, total in list(agregados):
+        pontuacao = ((nota_priori * peso + soma) / (peso + total)).quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
+        PrestadorProfile._base_manager.filter(pk=pk).update(pontuacao_ranking=pontuacao)
+        PrestadorBusca._base_manager.filter(prestador_id=pk).update(pontuacao_ranking=pontuacao)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0023_prestadorprofile_estrelas_1_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='prestadorbusca',
+            name='idx_busca_servico_nota',
+        ),
+        migrations.RemoveIndex(
+            model_name='prestadorbusca',
+            name='idx_busca_categoria_nota',
+        ),
+        migrations.AddField(
+            model_name='prestadorbusca',
+            name='pontuacao_ranking',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=7),
+        ),
+        migrations.AddField(
+            model_name='prestadorprofile',
+            name='pontuacao_ranking',
+            field=models.DecimalField(decimal_places=4, default=accounts.models.pontuacao_ranking_inicial, editable=False, max_digits=7),
+        ),
+        migrations.AddIndex(
+            model_name='prestadorbusca',
+            index=models.Index(fields=['servico_id', '-pontuacao_ranking', 'prestador'], name='idx_busca_servico_ranking'),
+        ),
+        migrations.AddIndex(
+            model_name='prestadorbusca',
+            index=models.Index(fields=['categoria_id', '-pontuacao_ranking', 'prestador'], name='idx_busca_categoria_ranking'),
+        ),
+        migrations.AddIndex(
+            model_name='prestadorbusca',
+            index=models.Index(fields=['-pontuacao_ranking', 'prestador'], name='idx_busca_ranking'),
+        ),
+        migrations.RunPython(preencher_pontuacao, migrations.RunPython.noop),
+    ]
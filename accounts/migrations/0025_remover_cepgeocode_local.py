@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:01
+
+from django.db import migrations, models
+
+
+def remover_entradas_do_stub(apps, schema_editor):
+    # Coordenadas falsas do geocodificador local que ficaram no cache de CEP
+    CepGeocode = apps.get_model('accounts', 'CepGeocode')
+    CepGeocode.objects.filter(fonte='local').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0024_remove_prestadorbusca_idx_busca_servico_nota_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(remover_entradas_do_stub, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='cepgeocode',
+            name='fonte',
+            field=models.CharField(choices=[('brasilapi', 'BrasilAPI'), ('nominatim', 'ViaCEP + Nominatim'), ('invalido', 'CEP inválido')], max_length=10),
+        ),
+    ]
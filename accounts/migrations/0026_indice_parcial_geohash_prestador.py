@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0025_remover_cepgeocode_local'),
+        ('servicos', '0004_remove_prestadorservicos_idx_servicos_deleted_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='prestadorprofile',
+            name='idx_prestador_geohash',
+        ),
+        migrations.RemoveIndex(
+            model_name='prestadorprofile',
+            name='idx_prestador_ativo_servico',
+        ),
+        migrations.AddIndex(
+            model_name='prestadorprofile',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['geohash'], name='idx_prestador_ativo_geohash'),
+        ),
+    ]
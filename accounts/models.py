@@ -1,14 +1,22 @@
-import requests
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Cast, Greatest, Round
+from django.db.models.lookups import GreaterThan
+from django.dispatch import Signal
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.core.validators import MinValueValidator, RegexValidator
-from datetime import date
+from datetime import date, timedelta
+from django.conf import settings
 from django.forms import ValidationError
 from django.core.exceptions import ValidationError as ModelValidationError
-from geopy.geocoders import Nominatim
-from time import sleep
-from decimal import Decimal
+from decimal import ROUND_HALF_UP, Decimal
 from django.utils import timezone
+from . import geocoding
+from .centroides_cep import buscar_centroide
+from .geocodificadores import obter_geocodificador
+from .geohash import codificar_geohash
+from .busca import normalizar_busca
+from .documento_busca import sincronizar_documentos
 
 
 def _sanitize_telefone(phone):
@@ -17,6 +25,17 @@ def _sanitize_telefone(phone):
     return ''.join(filter(str.isdigit, str(phone)))
 
 
+# Situação da geocodificação do endereço dos perfis
+GEOCODE_PENDENTE = 'pendente'
+GEOCODE_CONCLUIDO = 'concluido'
+GEOCODE_FALHOU = 'falhou'
+GEOCODE_STATUS_ESCOLHA = [
+    (GEOCODE_PENDENTE, 'Pendente'),
+    (GEOCODE_CONCLUIDO, 'Concluído'),
+    (GEOCODE_FALHOU, 'Falhou'),
+]
+
+
 class ActiveManager(models.Manager):
     """
     Manager que retorna apenas registros não deletados.
@@ -26,6 +45,14 @@ class ActiveManager(models.Manager):
         return super().get_queryset().filter(is_deleted=False)
 
 
+class ActiveUserManager(UserManager):
+    """
+    ActiveManager para o User: mantém create_user/create_superuser do UserManager.
+    """
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
+
 def pegar_dados_endereco(cep: str | int, rua: str, numero: str | int) -> dict:    
     cep_str = str(cep)
     cep_limpo = ''.join(filter(str.isdigit, cep_str))
@@ -33,82 +60,246 @@ def pegar_dados_endereco(cep: str | int, rua: str, numero: str | int) -> dict:
     if len(cep_limpo) != 8:
         return None
 
-    def to_decimal(val):
-        if val is None: return None
-        return Decimal(f"{float(val):.8f}")
+    # Vários usuários compartilham o mesmo CEP: consulta o cache antes de qualquer chamada externa
+    em_cache = CepGeocode.buscar(cep_limpo)
+    if em_cache is not None:
+        return em_cache.como_dados()
+
+    # Centroide do setor do CEP (arquivo local): primeira opção ou só quando os provedores falham
+    modo_centroide = getattr(settings, 'CENTROIDES_CEP_MODO', 'fallback')
+    if modo_centroide == 'primeiro':
+        centroide = buscar_centroide(cep_limpo)
+        if centroide:
+            return centroide
+
+    # settings.GEOCODER_BACKEND: provedores externos (padrão) ou o stub local sem rede
+    geocodificador = obter_geocodificador()
+    dados, fonte = geocodificador.consultar(cep_limpo, rua, numero)
+    if geocodificador.cacheavel:
+        CepGeocode.registrar(cep_limpo, dados, fonte)
+
+    if modo_centroide == 'fallback' and fonte != 'invalido' and (not dados or dados['latitude'] is None):
+        centroide = buscar_centroide(cep_limpo)
+        if centroide:
+            print("Provedores sem coordenadas: usando o centroide do setor do CEP.")
+            # Mantém cidade/bairro dos provedores quando vieram
+            if dados:
+                centroide.update({campo: dados[campo] for campo in ('cidade', 'bairro', 'estado') if dados[campo]})
+            return centroide
+    return dados
 
-    dados = {
-        'latitude': None, 
-        'longitude': None,
-        'cidade': '', 
-        'bairro': '', 
-        'estado': ''
-    }
+
+def _to_decimal(val):
+    if val is None: return None
+    return Decimal(f"{float(val):.8f}")
+
+
+def _consultar_brasilapi(cep_limpo: str) -> dict | None:
+    """Endereço (com coordenadas, quando a BrasilAPI tiver) ou None."""
     try:
         print("Tentando BrasilAPI...")
-        response = requests.get(f'https://brasilapi.com.br/api/cep/v2/{cep_limpo}', timeout=5)
-        
-        if response.status_code == 200:
-            data = response.json()
-            
-            dados['cidade'] = data.get('city', '')
-            dados['bairro'] = data.get('neighborhood', '')
-            dados['estado'] = data.get('state', '')
-            
-            loc = data.get('location', {})
-            coords = loc.get('coordinates', {})
-            
-            if isinstance(coords, dict):
-                dados['latitude'] = to_decimal(coords.get('latitude'))
-                dados['longitude'] = to_decimal(coords.get('longitude'))
-            elif isinstance(coords, (list, tuple)) and len(coords) >= 2:
-                dados['longitude'] = to_decimal(coords[0])
-                dados['latitude'] = to_decimal(coords[1])
-            
-            if dados['latitude'] is not None and dados['longitude'] is not None:
-                print(f"BrasilAPI deu certo: {dados['cidade']} - {dados['bairro']}")
-                return dados
-            else:
-                 print("BrasilAPI retornou endereço sem coordenadas.")
-            
+        response = geocoding.get('brasilapi', f'/api/cep/v2/{cep_limpo}')
+        if response.status_code != 200:
+            return None
+
+        data = response.json()
+        dados = {
+            'latitude': None,
+            'longitude': None,
+            'cidade': data.get('city', ''),
+            'bairro': data.get('neighborhood', ''),
+            'estado': data.get('state', ''),
+        }
+
+        loc = data.get('location', {})
+        coords = loc.get('coordinates', {})
+
+        if isinstance(coords, dict):
+            dados['latitude'] = _to_decimal(coords.get('latitude'))
+            dados['longitude'] = _to_decimal(coords.get('longitude'))
+        elif isinstance(coords, (list, tuple)) and len(coords) >= 2:
+            dados['longitude'] = _to_decimal(coords[0])
+            dados['latitude'] = _to_decimal(coords[1])
+
+        if dados['latitude'] is not None and dados['longitude'] is not None:
+            print(f"BrasilAPI deu certo: {dados['cidade']} - {dados['bairro']}")
+        else:
+            print("BrasilAPI retornou endereço sem coordenadas.")
+        return dados
+
     except Exception as e:
         print(f"BrasilAPI falhou: {e}")
+        return None
 
-    print("Iniciando Fallback (ViaCEP + Nominatim)...")
+
+def _consultar_viacep(cep_limpo: str) -> dict | str | None:
+    """Endereço sem coordenadas (o ViaCEP não tem), 'invalido' se o CEP não existe, ou None."""
     try:
-        viacep = requests.get(f'https://viacep.com.br/ws/{cep_limpo}/json/', timeout=5).json()
-        if not "erro" in viacep:
-            dados['cidade'] = viacep.get('localidade', '')
-            dados['bairro'] = viacep.get('bairro', '')
-            dados['estado'] = viacep.get('uf', '')
-            nome_rua = rua if rua else viacep.get('logradouro', '')
-
-            geolocator = Nominatim(user_agent="ServicoJa_App_Final/1.0", timeout=10)
-            
-            queries = [
-                f"{nome_rua}, {numero}, {dados['cidade']} - {dados['estado']}, Brasil",
-                f"{nome_rua}, {dados['cidade']} - {dados['estado']}, Brasil",
-                f"{dados['cidade']} - {dados['estado']}, Brasil"
-            ]
+        viacep = geocoding.get('viacep', f'/ws/{cep_limpo}/json/').json()
+    except Exception as e:
+        print(f"ViaCEP falhou: {e}")
+        return None
+
+    if "erro" in viacep:
+        return 'invalido'
+    return {
+        'latitude': None,
+        'longitude': None,
+        'cidade': viacep.get('localidade', ''),
+        'bairro': viacep.get('bairro', ''),
+        'estado': viacep.get('uf', ''),
+        'logradouro': viacep.get('logradouro', ''),
+    }
+
+
+def _geocodificar_nominatim(dados: dict, rua: str, numero: str | int) -> dict:
+    nome_rua = rua if rua else dados.get('logradouro', '')
+    queries = [
+        f"{nome_rua}, {numero}, {dados['cidade']} - {dados['estado']}, Brasil",
+        f"{nome_rua}, {dados['cidade']} - {dados['estado']}, Brasil",
+        f"{dados['cidade']} - {dados['estado']}, Brasil"
+    ]
+
+    for i, query in enumerate(queries):
+        try:
+            # O limite de 1 requisição por segundo do Nominatim fica em geocoding.aguardar_vaga
+            print(f"Tentativa Nominatim {i+1}: {query}")
+            loc = geocoding.buscar_nominatim(query)
+            if loc:
+                dados['latitude'] = _to_decimal(loc[0])
+                dados['longitude'] = _to_decimal(loc[1])
+                print(f"Nominatim deu certo: {dados['latitude']}, {dados['longitude']}")
+                break
+        except (geocoding.LimiteExcedido, geocoding.CircuitoAberto) as e:
+            # Fica sem coordenadas (não vai para o cache de CEP) e é tentado de novo depois
+            print(f"Nominatim indisponível: {e}")
+            break
+        except Exception as e:
+            print(f"Erro Nominatim {i+1}: {e}")
+    return dados
+
+
+def consultar_cep(cep_limpo: str, rua: str, numero: str | int) -> tuple:
+    """
+    Consulta os serviços externos. Retorna (dados, fonte); a fonte é 'invalido'
+    quando o ViaCEP responde que o CEP não existe e None quando a consulta falhou.
 
-            for i, query in enumerate(queries):
-                try:
-                    if i > 0: sleep(1)
-                    print(f"Tentativa Nominatim {i+1}: {query}")
-                    loc = geolocator.geocode(query)
-                    if loc:
-                        dados['latitude'] = to_decimal(loc.latitude)
-                        dados['longitude'] = to_decimal(loc.longitude)
-                        print(f"Nominatim deu certo: {dados['latitude']}, {dados['longitude']}")
-                        break
-                except Exception as e:
-                    print(f"Erro Nominatim {i+1}: {e}")
-                
-            return dados
-    except Exception:
-        pass
-
-    return None
+    Com GEOCODIFICACAO_PARALELA (padrão), BrasilAPI e ViaCEP são consultados ao mesmo
+    tempo: se a BrasilAPI trouxer coordenadas a resposta do ViaCEP é ignorada; se não,
+    o endereço do ViaCEP já está pronto e o Nominatim começa sem esperar mais um timeout.
+    """
+    if getattr(settings, 'GEOCODIFICACAO_PARALELA', True):
+        futuro_viacep = geocoding.em_paralelo(_consultar_viacep, cep_limpo)
+        brasilapi = _consultar_brasilapi(cep_limpo)
+        if brasilapi and brasilapi['latitude'] is not None and brasilapi['longitude'] is not None:
+            futuro_viacep.cancel()
+            return brasilapi, 'brasilapi'
+        viacep = futuro_viacep.result()
+    else:
+        brasilapi = _consultar_brasilapi(cep_limpo)
+        if brasilapi and brasilapi['latitude'] is not None and brasilapi['longitude'] is not None:
+            return brasilapi, 'brasilapi'
+        viacep = _consultar_viacep(cep_limpo)
+
+    print("Iniciando Fallback (ViaCEP + Nominatim)...")
+    if viacep == 'invalido':
+        return None, 'invalido'
+
+    endereco = viacep or brasilapi
+    if not endereco:
+        return None, None
+
+    dados = _geocodificar_nominatim(endereco, rua, numero)
+    dados.pop('logradouro', None)
+    return dados, 'nominatim'
+
+
+class CepGeocode(models.Model):
+    """
+    Cache persistente da geocodificação por CEP. Guarda também os CEPs inexistentes
+    (fonte 'invalido'), com validade menor, para não repetir a consulta externa.
+    """
+    FONTE_ESCOLHA = [
+        ('brasilapi', 'BrasilAPI'),
+        ('nominatim', 'ViaCEP + Nominatim'),
+        ('invalido', 'CEP inválido'),
+    ]
+
+    cep = models.CharField(max_length=8, primary_key=True)
+    cidade = models.CharField(max_length=100, blank=True)
+    bairro = models.CharField(max_length=100, blank=True)
+    estado = models.CharField(max_length=2, blank=True)
+    latitude = models.DecimalField(max_digits=10, decimal_places=8, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=11, decimal_places=8, null=True, blank=True)
+    fonte = models.CharField(max_length=10, choices=FONTE_ESCOLHA)
+    consultado_em = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Geocodificação de CEP'
+        verbose_name_plural = 'Geocodificações de CEP'
+
+    @classmethod
+    def buscar(cls, cep):
+        """Entrada do cache ainda dentro da validade, ou None."""
+        try:
+            entrada = cls.objects.get(pk=cep)
+        except cls.DoesNotExist:
+            return None
+        return entrada if not entrada.expirado() else None
+
+    @classmethod
+    def buscar_varios(cls, ceps):
+        """{cep: entrada} das entradas ainda dentro da validade (uma consulta só)."""
+        return {
+            entrada.cep: entrada
+            for entrada in cls.objects.filter(pk__in=list(ceps))
+            if not entrada.expirado()
+        }
+
+    @classmethod
+    def registrar(cls, cep, dados, fonte):
+        # Falha de rede não é cacheada; endereço sem coordenadas também não (tenta de novo depois)
+        if fonte is None:
+            return None
+        if fonte != 'invalido' and (not dados or dados['latitude'] is None or dados['longitude'] is None):
+            return None
+
+        dados = dados or {}
+        entrada, _ = cls.objects.update_or_create(
+            cep=cep,
+            defaults={
+                'cidade': dados.get('cidade') or '',
+                'bairro': dados.get('bairro') or '',
+                'estado': dados.get('estado') or '',
+                'latitude': dados.get('latitude'),
+                'longitude': dados.get('longitude'),
+                'fonte': fonte,
+                'consultado_em': timezone.now(),
+            },
+        )
+        return entrada
+
+    def expirado(self):
+        if self.fonte == 'invalido':
+            ttl = getattr(settings, 'CEP_GEOCODE_TTL_INVALIDO', timedelta(days=1))
+        else:
+            ttl = getattr(settings, 'CEP_GEOCODE_TTL', timedelta(days=90))
+        return self.consultado_em < timezone.now() - ttl
+
+    def como_dados(self):
+        """Mesmo formato de pegar_dados_endereco (None para CEP inválido)."""
+        if self.fonte == 'invalido':
+            return None
+        return {
+            'latitude': self.latitude,
+            'longitude': self.longitude,
+            'cidade': self.cidade,
+            'bairro': self.bairro,
+            'estado': self.estado,
+        }
+
+    def __str__(self):
+        return f"{self.cep} ({self.get_fonte_display()})"
 
 
 class User(AbstractUser):
@@ -128,6 +319,7 @@ class User(AbstractUser):
     first_name = None
     last_name = None
     nome_completo = models.CharField(max_length=255, verbose_name="Nome Completo")
+    nome_busca = models.CharField(max_length=255, blank=True, default='', editable=False)
     tipo_usuario = models.CharField(max_length=10, choices=TIPO_USUARIO_ESCOLHA, null=True, blank=True)
     email = models.EmailField(unique=True)
     dt_nascimento = models.DateField(null=True)
@@ -139,12 +331,13 @@ class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'nome_completo']
 
-    objects = ActiveManager()
+    objects = ActiveUserManager()
     all_objects = models.Manager()
 
     class Meta:
         indexes = [
-            models.Index(fields=['is_deleted'], name='idx_user_deleted'),
+            # Parciais: o ActiveManager sempre filtra is_deleted=False, então só as linhas ativas entram no índice
+            models.Index(fields=['tipo_usuario'], condition=Q(is_deleted=False), name='idx_user_ativo_tipo'),
         ]
 
     @property
@@ -172,6 +365,12 @@ class User(AbstractUser):
     
     def save(self, *args, **kwargs):
         self.clean()
+        self.nome_busca = normalizar_busca(self.nome_completo)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'nome_completo' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'nome_busca'}
+
         return super().save(*args, **kwargs)
     
     def get_full_name(self):
@@ -181,7 +380,72 @@ class User(AbstractUser):
         return self.nome_completo.split(' ')[0] if self.nome_completo else self.email
 
 
-class ClienteProfile(models.Model):
+CAMPOS_ENDERECO = ('cep', 'rua', 'numero_casa')
+CAMPOS_GEOCODIFICADOS = ('latitude', 'longitude', 'cidade', 'bairro', 'estado', 'geohash', 'geocode_status')
+
+
+class EnderecoGeocodificadoMixin:
+    """
+    Guarda o endereço como veio do banco (from_db) para o save() decidir se precisa
+    geocodificar sem buscar o registro antigo de novo.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._guardar_endereco()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._guardar_endereco()
+
+    def _guardar_endereco(self):
+        # Campos adiados (.only/.defer) não entram: o save() consulta o banco nesse caso
+        self._endereco_original = {campo: self.__dict__[campo] for campo in CAMPOS_ENDERECO if campo in self.__dict__}
+
+    def _precisa_geocodificar(self, update_fields):
+        if update_fields is not None and not set(update_fields) & set(CAMPOS_ENDERECO):
+            # Save parcial sem campo de endereço (contadores, soft delete...)
+            return False
+        if self._state.adding:
+            return True
+
+        original = getattr(self, '_endereco_original', {})
+        if len(original) < len(CAMPOS_ENDERECO):
+            # Instância montada fora do from_db ou com endereço adiado
+            try:
+                original = type(self).all_objects.only(*CAMPOS_ENDERECO).get(pk=self.pk)._endereco_original
+            except type(self).DoesNotExist:
+                return True
+
+        if any(original[campo] != getattr(self, campo) for campo in CAMPOS_ENDERECO):
+            return True
+        return not self.latitude or not self.cidade
+
+    def _aplicar_geocodificacao(self, geocodificar, kwargs):
+        run_geocode = self._precisa_geocodificar(kwargs.get('update_fields'))
+
+        if run_geocode and self.cep and not geocodificar:
+            self.geocode_status = GEOCODE_PENDENTE
+        elif run_geocode and self.cep:
+            dados = pegar_dados_endereco(self.cep, self.rua, self.numero_casa)
+            if dados:
+                self.latitude = dados['latitude']
+                self.longitude = dados['longitude']
+                self.cidade = dados['cidade']
+                self.bairro = dados['bairro']
+                self.estado = dados['estado']
+            self.geocode_status = GEOCODE_CONCLUIDO if self.latitude is not None else GEOCODE_FALHOU
+
+        self.geohash = codificar_geohash(self.latitude, self.longitude)
+
+        update_fields = kwargs.get('update_fields')
+        if run_geocode and update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, *CAMPOS_GEOCODIFICADOS}
+
+
+class ClienteProfile(EnderecoGeocodificadoMixin, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='perfil_cliente')
     telefone_contato = models.CharField(max_length=11, null=True)
     cep = models.CharField(max_length=9)
@@ -193,6 +457,8 @@ class ClienteProfile(models.Model):
     estado = models.CharField(max_length=2, blank=True)
     latitude = models.DecimalField(max_digits=10, decimal_places=8, null=True, blank=True)
     longitude = models.DecimalField(max_digits=11, decimal_places=8, null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False)
+    geocode_status = models.CharField(max_length=10, choices=GEOCODE_STATUS_ESCOLHA, default=GEOCODE_CONCLUIDO, editable=False)
     
     favoritos = models.ManyToManyField('PrestadorProfile', related_name='favoritado_por', blank=True)
     foto_perfil = models.ImageField(upload_to='perfil_clientes/', null=True, blank=True)
@@ -207,42 +473,53 @@ class ClienteProfile(models.Model):
 
     class Meta:
         indexes = [
-            models.Index(fields=['is_deleted'], name='idx_cliente_deleted'),
+            models.Index(fields=['geohash'], condition=Q(is_deleted=False), name='idx_cliente_ativo_geohash'),
         ]
 
-    def save(self, *args, **kwargs):
-        run_geocode = False
-        if self.pk:
-            try:
-                antigo = ClienteProfile.objects.get(pk=self.pk)
-                if antigo.cep != self.cep or antigo.rua != self.rua or antigo.numero_casa != self.numero_casa:
-                    run_geocode = True
-                if not self.latitude or not self.cidade:
-                    run_geocode = True
-            except ClienteProfile.DoesNotExist:
-                run_geocode = True
-        else:
-            run_geocode = True
+    def save(self, *args, geocodificar=True, **kwargs):
+        # geocodificar=False: não chama os serviços externos aqui, só marca o perfil
+        # como pendente (o cadastro agenda a geocodificação em segundo plano)
+        self._aplicar_geocodificacao(geocodificar, kwargs)
 
-        if run_geocode and self.cep:
-            dados = pegar_dados_endereco(self.cep, self.rua, self.numero_casa)
-            if dados:
-                self.latitude = dados['latitude']
-                self.longitude = dados['longitude']
-                self.cidade = dados['cidade']
-                self.bairro = dados['bairro']
-                self.estado = dados['estado']
-            
         if self.telefone_contato:
             self.telefone_contato = _sanitize_telefone(self.telefone_contato)
 
         super().save(*args, **kwargs)
+        self._guardar_endereco()
     
     def __str__(self):
         return f"{self.user.email} (Cliente)"
 
 
-class PrestadorProfile(models.Model):
+def calcular_pontuacao_ranking(soma, total):
+    """
+    Média bayesiana para o ranking de "melhor avaliado": a nota média puxada para
+    RANKING_NOTA_PRIORI com peso de RANKING_PESO_PRIORI avaliações. Quem tem poucas
+    avaliações fica perto da média geral, em vez de empatar com 5 estrelas.
+    """
+    nota_priori, peso = _priori_ranking()
+    pontuacao = (Decimal(str(nota_priori)) * peso + soma) / (peso + total)
+    return pontuacao.quantize(Decimal('0.0001'), rounding=ROUND_HALF_UP)
+
+
+def _priori_ranking():
+    return (
+        getattr(settings, 'RANKING_NOTA_PRIORI', 3.5),
+        max(1, int(getattr(settings, 'RANKING_PESO_PRIORI', 10))),
+    )
+
+
+def pontuacao_ranking_inicial():
+    return calcular_pontuacao_ranking(0, 0)
+
+
+# Enviado por PrestadorProfile.incrementar_contadores/definir_contadores, que gravam com
+# UPDATE direto (sem post_save). Argumentos: prestadores (queryset dos perfis
+# atualizados), prestador_ids (None quando o filtro não foi por pk) e campos.
+contadores_atualizados = Signal()
+
+
+class PrestadorProfile(EnderecoGeocodificadoMixin, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='perfil_prestador')
     biografia = models.TextField(blank=True)
     telefone_publico = models.CharField(max_length=11, null=True)
@@ -255,12 +532,23 @@ class PrestadorProfile(models.Model):
     estado = models.CharField(max_length=2, blank=True)
     latitude = models.DecimalField(max_digits=10, decimal_places=8, null=True, blank=True)
     longitude = models.DecimalField(max_digits=11, decimal_places=8, null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, default='', editable=False)
+    geocode_status = models.CharField(max_length=10, choices=GEOCODE_STATUS_ESCOLHA, default=GEOCODE_CONCLUIDO, editable=False)
     disponibilidade = models.BooleanField(default=False, help_text='Disponibilidade de horário 24 horas?')
     possui_material_proprio = models.BooleanField(default=False)
     atende_fim_de_semana = models.BooleanField(default=False)
     foto_perfil = models.ImageField(upload_to='perfil_prestadores/', null=True, blank=True)
     nota_media_cache = models.DecimalField(max_digits=3, decimal_places=2, default=5)
     total_avaliacoes_cache = models.PositiveIntegerField(default=0)
+    soma_notas_cache = models.PositiveIntegerField(default=0)
+    # Quantidade de avaliações com cada nota (distribuição do perfil público)
+    estrelas_1 = models.PositiveIntegerField(default=0)
+    estrelas_2 = models.PositiveIntegerField(default=0)
+    estrelas_3 = models.PositiveIntegerField(default=0)
+    estrelas_4 = models.PositiveIntegerField(default=0)
+    estrelas_5 = models.PositiveIntegerField(default=0)
+    # Média bayesiana (calcular_pontuacao_ranking), usada no ?melhor_avaliado=true
+    pontuacao_ranking = models.DecimalField(max_digits=7, decimal_places=4, default=pontuacao_ranking_inicial, editable=False)
     acessos_perfil = models.PositiveIntegerField(default=0)
     total_servicos_cache = models.PositiveIntegerField(default=0)
     servicos_nao_realizados_cache = models.PositiveIntegerField(default=0)
@@ -279,44 +567,203 @@ class PrestadorProfile(models.Model):
         indexes = [
             models.Index(fields=['cep'], name='idx_cep'),
             models.Index(fields=['latitude', 'longitude'], name='idx_geo'),
-            models.Index(fields=['is_deleted'], name='idx_prestador_deleted'),
+            models.Index(fields=['geohash'], condition=Q(is_deleted=False), name='idx_prestador_ativo_geohash'),
         ]
     
-    def save(self, *args, **kwargs):
-        run_geocode = False
-        if self.pk:
-            try:
-                antigo = PrestadorProfile.objects.get(pk=self.pk)
-                
-                if antigo.cep != self.cep or antigo.rua != self.rua or antigo.numero_casa != self.numero_casa:
-                    run_geocode = True
-                
-                if not self.latitude or not self.cidade:
-                    run_geocode = True
-
-            except PrestadorProfile.DoesNotExist:
-                run_geocode = True
-        else:
-            run_geocode = True
+    def save(self, *args, geocodificar=True, **kwargs):
+        # geocodificar=False: não chama os serviços externos aqui, só marca o perfil
+        # como pendente (o cadastro agenda a geocodificação em segundo plano)
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Contadores só mudam por UPDATE (incrementar_contadores, deltas das avaliações):
+            # um save() completo gravaria de volta os valores lidos no início da requisição
+            adiados = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                campo.name for campo in self._meta.concrete_fields
+                if not campo.primary_key and campo.name not in self.CONTADORES and campo.attname not in adiados
+            ]
+        self._aplicar_geocodificacao(geocodificar, kwargs)
 
-        if run_geocode and self.cep:
-            dados = pegar_dados_endereco(self.cep, self.rua, self.numero_casa)
-            if dados:
-                self.latitude = dados['latitude']
-                self.longitude = dados['longitude']
-                self.cidade = dados['cidade']
-                self.bairro = dados['bairro']
-                self.estado = dados['estado']
-            
         if self.telefone_publico:
             self.telefone_publico = _sanitize_telefone(self.telefone_publico)
 
+        # Save parcial valida só os campos gravados (evita a checagem de unicidade do user)
+        update_fields = kwargs.get('update_fields')
+        exclude = None
+        if update_fields is not None:
+            exclude = [f.name for f in self._meta.fields if f.name not in update_fields]
+
         try:
-            self.full_clean()
+            self.full_clean(exclude=exclude)
         except ModelValidationError:
             raise
         
         super().save(*args, **kwargs)
+        self._guardar_endereco()
+
+    # Contadores: um UPDATE só, sem save() (nem geocodificação, full_clean ou post_save).
+    # Os incrementos usam F() e são somados no banco, sem corrida entre requisições.
+    CONTADORES = (
+        'nota_media_cache', 'total_avaliacoes_cache', 'soma_notas_cache', 'acessos_perfil',
+        'total_servicos_cache', 'servicos_nao_realizados_cache',
+        'estrelas_1', 'estrelas_2', 'estrelas_3', 'estrelas_4', 'estrelas_5', 'pontuacao_ranking',
+    )
+    NOTAS = range(1, 6)
+    # Média de quem ainda não foi avaliado
+    NOTA_PADRAO = Decimal('5.00')
+
+    @classmethod
+    def incrementar_contadores(cls, prestador, **incrementos):
+        """
+        prestador é o pk ou um filtro, ex.:
+        PrestadorProfile.incrementar_contadores(pk, acessos_perfil=1)
+        PrestadorProfile.incrementar_contadores({'user_id': user.pk}, acessos_perfil=1)
+        """
+        return cls._atualizar_contadores(prestador, {
+            campo: F(campo) + valor for campo, valor in incrementos.items()
+        })
+
+    @classmethod
+    def definir_contadores(cls, prestador, **valores):
+        """Grava valores já calculados (ex.: recontagem das avaliações)."""
+        return cls._atualizar_contadores(prestador, valores)
+
+    @classmethod
+    def aplicar_deltas_avaliacoes(cls, prestador_id, estrelas):
+        """
+        Aplica a diferença de quantidade por nota ({nota: +n/-n}) de avaliações criadas,
+        removidas ou alteradas. Soma, total, estrelas e média mudam no mesmo UPDATE,
+        sem recontar.
+        """
+        def somar(campo, delta):
+            return Greatest(F(campo) + delta, 0, output_field=models.PositiveIntegerField())
+
+        estrelas = {nota: delta for nota, delta in estrelas.items() if delta}
+        delta_total = sum(estrelas.values())
+        soma = somar('soma_notas_cache', sum(nota * delta for nota, delta in estrelas.items()))
+        total = somar('total_avaliacoes_cache', delta_total)
+        media = Round(Cast(Cast(soma, models.FloatField()) / total, models.DecimalField(max_digits=12, decimal_places=4)), 2)
+        nota_priori, peso = _priori_ranking()
+        pontuacao = Round(Cast(
+            (Value(float(nota_priori) * peso) + Cast(soma, models.FloatField())) / (total + peso),
+            models.DecimalField(max_digits=12, decimal_places=6),
+        ), 4)
+
+        valores = {
+            'soma_notas_cache': soma,
+            'total_avaliacoes_cache': total,
+            'total_servicos_cache': somar('total_servicos_cache', delta_total),
+            'nota_media_cache': Case(
+                When(GreaterThan(total, 0), then=media),
+                default=Value(cls.NOTA_PADRAO),
+                output_field=models.DecimalField(max_digits=3, decimal_places=2),
+            ),
+            'pontuacao_ranking': Cast(pontuacao, models.DecimalField(max_digits=7, decimal_places=4)),
+        }
+        for nota, delta in estrelas.items():
+            valores[f'estrelas_{nota}'] = somar(f'estrelas_{nota}', delta)
+        return cls._atualizar_contadores(prestador_id, valores)
+
+    @classmethod
+    def definir_avaliacoes(cls, prestador_id, estrelas):
+        """Grava a recontagem (reconciliação): estrelas = {nota: quantidade}."""
+        soma = sum(nota * quantidade for nota, quantidade in estrelas.items())
+        total = sum(estrelas.values())
+        return cls.definir_contadores(
+            prestador_id,
+            soma_notas_cache=soma,
+            total_avaliacoes_cache=total,
+            total_servicos_cache=total,
+            nota_media_cache=cls.calcular_media(soma, total),
+            pontuacao_ranking=calcular_pontuacao_ranking(soma, total),
+            **{f'estrelas_{nota}': estrelas.get(nota, 0) for nota in cls.NOTAS},
+        )
+
+    def distribuicao_estrelas(self):
+        """Distribuição das notas direto das colunas do perfil, sem consulta."""
+        total = self.total_avaliacoes_cache
+        distribuicao = {}
+        for nota in self.NOTAS:
+            quantidade = getattr(self, f'estrelas_{nota}')
+            distribuicao[f'estrelas_{nota}'] = {
+                'quantidade': quantidade,
+                'porcentagem': round((quantidade / total * 100), 2) if total > 0 else 0,
+            }
+        return distribuicao
+
+    @classmethod
+    def calcular_media(cls, soma, total):
+        if not total:
+            return cls.NOTA_PADRAO
+        return (Decimal(soma) / total).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+    @classmethod
+    def _atualizar_contadores(cls, prestador, valores):
+        invalidos = set(valores) - set(cls.CONTADORES)
+        if invalidos:
+            raise ValueError(f"Não são contadores: {', '.join(sorted(invalidos))}")
+        if prestador is None:
+            raise ValueError("Informe o pk ou um filtro do prestador.")
+        if not valores:
+            return 0
+
+        # all_objects: o contador de um perfil excluído continua sendo mantido
+        filtro = prestador if isinstance(prestador, dict) else {'pk': prestador}
+        prestadores = cls.all_objects.filter(**filtro)
+        atualizados = prestadores.update(**valores)
+        if atualizados:
+            contadores_atualizados.send(
+                sender=cls,
+                prestadores=prestadores,
+                prestador_ids=None if isinstance(prestador, dict) else [prestador],
+                campos=set(valores),
+            )
+        return atualizados
     
     def __str__(self):
         return f"{self.user.get_full_name()} ({self.user.email})"
+
+
+class PrestadorBusca(models.Model):
+    """
+    Documento de busca da listagem pública: uma linha por prestador ativo, com nome,
+    serviço/categoria, filtros, nota, localização e a primeira foto do portfólio.
+    Mantido pelos signals de accounts/signals.py (não editar diretamente).
+    """
+    prestador = models.OneToOneField(PrestadorProfile, on_delete=models.CASCADE, primary_key=True, related_name='documento_busca')
+    user_id = models.BigIntegerField()
+    nome = models.CharField(max_length=255)
+    servico_id = models.BigIntegerField(null=True, blank=True)
+    servico_nome = models.CharField(max_length=100, blank=True)
+    categoria_id = models.BigIntegerField(null=True, blank=True)
+    categoria_nome = models.CharField(max_length=100, blank=True)
+    disponibilidade = models.BooleanField(default=False)
+    possui_material_proprio = models.BooleanField(default=False)
+    atende_fim_de_semana = models.BooleanField(default=False)
+    nota_media = models.DecimalField(max_digits=3, decimal_places=2, default=5)
+    total_avaliacoes = models.PositiveIntegerField(default=0)
+    pontuacao_ranking = models.DecimalField(max_digits=7, decimal_places=4, default=0)
+    latitude = models.DecimalField(max_digits=10, decimal_places=8, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=11, decimal_places=8, null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, default='')
+    cidade = models.CharField(max_length=100, blank=True)
+    thumbnail = models.CharField(max_length=255, blank=True, help_text='Primeira imagem do portfólio')
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # ?melhor_avaliado=true (com ou sem serviço/categoria): LIMIT na ordem do índice
+            models.Index(fields=['servico_id', '-pontuacao_ranking', 'prestador'], name='idx_busca_servico_ranking'),
+            models.Index(fields=['categoria_id', '-pontuacao_ranking', 'prestador'], name='idx_busca_categoria_ranking'),
+            models.Index(fields=['-pontuacao_ranking', 'prestador'], name='idx_busca_ranking'),
+            models.Index(fields=['latitude', 'longitude'], name='idx_busca_geo'),
+            models.Index(fields=['geohash'], name='idx_busca_geohash'),
+        ]
+
+    @classmethod
+    def sincronizar(cls, prestador_ids=None):
+        """Atualiza os documentos dos prestadores informados (todos, se None)."""
+        from portfolio.models import PortfolioItem
+        sincronizar_documentos(PrestadorProfile, PortfolioItem, cls, prestador_ids)
+
+    def __str__(self):
+        return f"Busca: {self.nome}"
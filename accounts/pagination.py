@@ -0,0 +1,155 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db.models import F, OrderBy, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginação por cursor (keyset) sobre a ordenação do queryset + pk.
+
+    Em vez de COUNT + OFFSET, cada página filtra "depois do último item visto"
+    (WHERE (chave, id) > (ultima_chave, ultimo_id)), então a página 1000 custa
+    o mesmo que a primeira. O cursor é opaco para o cliente: basta seguir o `next`.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Cursor inválido.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*[self._order_by(campo, desc, nulls_last) for campo, desc, nulls_last in self.ordering])
+
+        valores = self.decode_cursor(request)
+        if valores is not None:
+            queryset = queryset.filter(self._filtro_apos(valores))
+
+        # Um item a mais só para saber se existe próxima página
+        resultados = list(queryset[:self.page_size + 1])
+        self.has_next = len(resultados) > self.page_size
+        self.page = resultados[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+
+        ultimo = self.page[-1]
+        valores = [self._valor_cursor(getattr(ultimo, campo)) for campo, _, _ in self.ordering]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(valores))
+
+    def get_ordering(self, queryset):
+        """Lista de (campo, decrescente, nulls_last), sempre terminando na pk."""
+        ordenacao = list(queryset.query.order_by) or list(queryset.model._meta.ordering)
+
+        campos = []
+        for item in ordenacao:
+            if isinstance(item, str):
+                campos.append((item.lstrip('-'), item.startswith('-'), False))
+            elif isinstance(item, OrderBy) and isinstance(item.expression, F):
+                campos.append((item.expression.name, item.descending, bool(item.nulls_last)))
+            else:
+                raise ValueError(f'Ordenação não suportada pela paginação por cursor: {item!r}')
+
+        nome_pk = queryset.model._meta.pk.name
+        campos = [('pk' if campo in ('id', nome_pk) else campo, desc, nulls_last) for campo, desc, nulls_last in campos]
+        if not campos or campos[-1][0] != 'pk':
+            # Desempate pela pk no mesmo sentido da chave principal
+            desc = campos[0][1] if campos else False
+            campos.append(('pk', desc, False))
+        return campos
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+
+        try:
+            valores = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(valores, list) or len(valores) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return valores
+
+    def encode_cursor(self, valores):
+        return base64.urlsafe_b64encode(json.dumps(valores).encode('utf-8')).decode('ascii')
+
+    def _valor_cursor(self, valor):
+        if isinstance(valor, (datetime, date)):
+            return valor.isoformat()
+        if isinstance(valor, Decimal):
+            return str(valor)
+        return valor
+
+    def _order_by(self, campo, desc, nulls_last):
+        expressao = F(campo)
+        if nulls_last:
+            return expressao.desc(nulls_last=True) if desc else expressao.asc(nulls_last=True)
+        return expressao.desc() if desc else expressao.asc()
+
+    def _filtro_apos(self, valores):
+        # (c1 > v1) OU (c1 = v1 E c2 > v2) OU ... respeitando o sentido de cada campo
+        filtro = Q(pk__in=[])
+        iguais = Q()
+
+        for (campo, desc, nulls_last), valor in zip(self.ordering, valores):
+            if valor is None:
+                # Nulos ficam no fim: depois de um nulo só vêm outros nulos (desempate no próximo campo)
+                iguais &= Q(**{f'{campo}__isnull': True})
+                continue
+
+            depois = Q(**{f'{campo}__lt' if desc else f'{campo}__gt': valor})
+            if nulls_last:
+                depois |= Q(**{f'{campo}__isnull': True})
+
+            filtro |= iguais & depois
+            iguais &= Q(**{campo: valor})
+
+        return filtro
+
+
+class PaginacaoCursorMixin:
+    """
+    Permite escolher a paginação por cursor com ?paginacao=cursor.
+    Sem o parâmetro a view continua com a paginação padrão (PageNumberPagination).
+    """
+    cursor_pagination_class = KeysetPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('paginacao') == 'cursor' or self.cursor_pagination_class.cursor_query_param in params:
+                self._paginator = self.cursor_pagination_class()
+            elif self.pagination_class is None:
+                self._paginator = None
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
@@ -0,0 +1,93 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count
+
+from avaliacoes.models import Avaliacao
+
+from .models import PrestadorProfile, calcular_pontuacao_ranking
+
+# Soma, total, média, estrelas e pontuação de ranking das avaliações de cada prestador
+# são mantidos por diferença nos signals (accounts/signals.py), sem recontar. Aqui eles
+# são recontados do zero para achar e corrigir divergências: avaliações alteradas com update()/SQL direto, signals
+# que falharam, restaurações de backup etc.
+
+
+CAMPOS = (
+    'soma_notas_cache', 'total_avaliacoes_cache', 'total_servicos_cache', 'nota_media_cache',
+    'estrelas_1', 'estrelas_2', 'estrelas_3', 'estrelas_4', 'estrelas_5', 'pontuacao_ranking',
+)
+
+
+TOLERANCIA_PONTUACAO = Decimal('0.0001')
+
+
+def contar_avaliacoes(prestador_user_ids=None):
+    """{user_id do prestador: {nota: quantidade}} calculado direto das avaliações."""
+    avaliacoes = Avaliacao.objects.all()
+    if prestador_user_ids is not None:
+        avaliacoes = avaliacoes.filter(solicitacao_contato__prestador_id__in=prestador_user_ids)
+    linhas = avaliacoes.values('solicitacao_contato__prestador_id', 'nota').annotate(quantidade=Count('pk')).order_by()
+
+    contagem = {}
+    for linha in linhas:
+        contagem.setdefault(linha['solicitacao_contato__prestador_id'], {})[linha['nota']] = linha['quantidade']
+    return contagem
+
+
+def _agregados(estrelas):
+    # Valores recontados na ordem de CAMPOS
+    soma = sum(nota * quantidade for nota, quantidade in estrelas.items())
+    total = sum(estrelas.values())
+    return (soma, total, total, PrestadorProfile.calcular_media(soma, total),
+            *(estrelas.get(nota, 0) for nota in PrestadorProfile.NOTAS),
+            calcular_pontuacao_ranking(soma, total))
+
+
+def _campos_divergentes(gravado, recontado):
+    # A pontuação calculada no banco pode diferir no último dígito (arredondamento)
+    return [
+        i for i, (a, b) in enumerate(zip(gravado, recontado))
+        if (abs(a - b) > TOLERANCIA_PONTUACAO if CAMPOS[i] == 'pontuacao_ranking' else a != b)
+    ]
+
+
+def _corrigir(pk, user_id):
+    # Reconta de novo com o perfil travado: um delta gravado depois da contagem geral entra
+    # na recontagem, e um que chegue durante a correção espera a trava e soma por cima
+    with transaction.atomic():
+        gravado = PrestadorProfile.all_objects.select_for_update().filter(pk=pk).values_list(*CAMPOS).first()
+        if gravado is None:
+            return
+        estrelas = contar_avaliacoes([user_id]).get(user_id, {})
+        if _campos_divergentes(gravado, _agregados(estrelas)):
+            PrestadorProfile.definir_avaliacoes(pk, estrelas)
+
+
+def reconciliar_avaliacoes(corrigir=False, prestador_ids=None):
+    """
+    Compara os agregados gravados com a recontagem. Retorna [(prestador_id, gravado,
+    recontado)], cada lado um dict com os campos que divergem; com corrigir=True grava
+    a recontagem.
+    """
+    perfis = PrestadorProfile.all_objects.order_by('pk').values_list('pk', 'user_id', *CAMPOS)
+    if prestador_ids is not None:
+        perfis = perfis.filter(pk__in=prestador_ids)
+        contagem = contar_avaliacoes(list(perfis.values_list('user_id', flat=True)))
+    else:
+        contagem = contar_avaliacoes()
+
+    divergencias = []
+    for pk, user_id, *gravado in perfis.iterator():
+        estrelas = contagem.get(user_id, {})
+        recontado = _agregados(estrelas)
+        diferentes = _campos_divergentes(gravado, recontado)
+        if diferentes:
+            divergencias.append((
+                pk,
+                {CAMPOS[i]: gravado[i] for i in diferentes},
+                {CAMPOS[i]: recontado[i] for i in diferentes},
+            ))
+            if corrigir:
+                _corrigir(pk, user_id)
+    return divergencias
@@ -2,10 +2,10 @@ from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth import get_user_model
 from django.db import transaction
-from django.db.models import Count
 from drf_spectacular.utils import extend_schema_field
 from drf_spectacular.types import OpenApiTypes
 from .models import ClienteProfile, PrestadorProfile
+from .tasks import salvar_perfil
 from .validators import validar_cpf, validar_telefone, validar_cep, validar_data_nascimento
 from servicos.models import Servico, CategoriaServico
 from servicos.serializers import ServicoSerializer
@@ -83,7 +83,8 @@ class ClienteRegistrationSerializer(serializers.ModelSerializer):
         )
         
         profile = ClienteProfile(user=user, **profile_data)
-        profile.save() 
+        # Geocodificação vai para a fila de tarefas, fora da requisição
+        salvar_perfil(profile)
 
         return user
 
@@ -193,7 +194,7 @@ class PrestadorRegistrationSerializer(serializers.ModelSerializer):
         profile = PrestadorProfile(user=user, **profile_data)
         if servico_data:
             profile.servico = servico_data
-        profile.save()
+        salvar_perfil(profile)
             
         return user
 
@@ -276,27 +277,9 @@ class PrestadorPublicoSerializer(serializers.ModelSerializer):
 
     @extend_schema_field(OpenApiTypes.OBJECT)
     def get_estatisticas(self, obj):
-        queryset = Avaliacao.objects.filter(solicitacao_contato__prestador=obj.user)
-        
-        counts = queryset.values('nota').annotate(count=Count('nota')).order_by('nota')
-        
-        # Inicializa contadores
-        distribuicao = {i: 0 for i in range(1, 6)}
-        total = obj.total_avaliacoes_cache # Usando cache para performance
-        
-        for item in counts:
-            distribuicao[item['nota']] = item['count']
-            
-        # Calcula porcentagens
-        stats_distribuicao = {}
-        for nota, count in distribuicao.items():
-            stats_distribuicao[f"estrelas_{nota}"] = {
-                "quantidade": count,
-                "porcentagem": round((count / total * 100), 2) if total > 0 else 0
-            }
-            
+        # Contadores estrelas_1..5 do perfil (mantidos pelos signals de avaliação)
         return {
-            "distribuicao": stats_distribuicao
+            "distribuicao": obj.distribuicao_estrelas()
         }
 
     @extend_schema_field(AvaliacaoSimplesSerializer(many=True))
@@ -356,6 +339,12 @@ class PrestadorProfileEditSerializer(serializers.ModelSerializer):
         model = PrestadorProfile
         fields = ['foto_perfil', 'biografia']
 
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        salvar_perfil(instance)
+        return instance
+
 class ClienteProfileEditSerializer(serializers.ModelSerializer):
     foto_perfil = serializers.ImageField(required=False)
     telefone_contato = serializers.CharField(validators=[validar_telefone], required=True)
@@ -366,6 +355,12 @@ class ClienteProfileEditSerializer(serializers.ModelSerializer):
         fields = ['foto_perfil', 'telefone_contato', 'cep', 'rua', 'numero_casa', 'complemento', 'cidade', 'bairro', 'estado']
         read_only_fields = ['latitude', 'longitude']
 
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        salvar_perfil(instance)
+        return instance
+
 class ClienteProfileSerializer(serializers.ModelSerializer):
     foto_perfil = serializers.ImageField(required=False)
     data_registro = serializers.DateTimeField(source='created_at', format="%d/%m/%Y", read_only=True)
@@ -374,10 +369,11 @@ class ClienteProfileSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ClienteProfile
-        fields = ['telefone_contato', 'cep', 'rua', 'numero_casa', 'complemento', 'cidade', 'bairro', 'estado', 'latitude', 'longitude', 'foto_perfil', 'data_registro']
+        fields = ['telefone_contato', 'cep', 'rua', 'numero_casa', 'complemento', 'cidade', 'bairro', 'estado', 'latitude', 'longitude', 'geocode_status', 'foto_perfil', 'data_registro']
         read_only_fields = [
             'latitude', 
-            'longitude'
+            'longitude',
+            'geocode_status',
         ]
 
 class PrestadorProfileSerializer(serializers.ModelSerializer):
@@ -396,13 +392,14 @@ class PrestadorProfileSerializer(serializers.ModelSerializer):
         model = PrestadorProfile
         fields = [
             'biografia', 'telefone_publico', 'cep', 'rua', 'numero_casa', 'complemento', 
-            'cidade', 'bairro', 'estado', 'latitude', 'longitude', 
+            'cidade', 'bairro', 'estado', 'latitude', 'longitude', 'geocode_status',
             'disponibilidade', 'possui_material_proprio', 'atende_fim_de_semana', 
             'foto_perfil', 'servico', 'categoria', 'categoria_id', 'data_registro'
         ]
         read_only_fields = [
             'latitude',
             'longitude',
+            'geocode_status',
         ]
 
     def validate(self, data):
@@ -455,7 +452,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
                 profile = instance.perfil_cliente
                 for attr, value in profile_data.items():
                     setattr(profile, attr, value)
-                profile.save()
+                salvar_perfil(profile)
         
         elif instance.tipo_usuario == 'prestador':
             profile_data = validated_data.get('perfil_prestador')
@@ -463,7 +460,7 @@ class UserProfileSerializer(serializers.ModelSerializer):
                 profile = instance.perfil_prestador
                 for attr, value in profile_data.items():
                     setattr(profile, attr, value)
-                profile.save()
+                salvar_perfil(profile)
 
         return instance
 
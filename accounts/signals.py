@@ -1,46 +1,57 @@
 from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from django.db import models
 from django.utils import timezone
 from avaliacoes.models import Avaliacao
 from contratacoes.models import SolicitacaoContato
-from .models import PrestadorProfile, User
+from .models import PrestadorProfile, PrestadorBusca, User, contadores_atualizados
+from . import agregados_avaliacao
+from .cache_busca import invalidar_busca_prestadores
 from portfolio.models import PortfolioItem
-from servicos.models import PrestadorServicos
+from servicos.models import CategoriaServico, PrestadorServicos, Servico
 
 
 # ============================================================================
 # SIGNAL 1: Atualizar cache de avaliação
 # ============================================================================
 
-#Isso aqui é para atualizar notas e não ficar preso ao cache.
-@receiver([post_save, post_delete], sender=Avaliacao)
-def atualizar_cache_avaliacao(sender, instance, **kwargs):
-    try:
-        prestador_user = instance.solicitacao_contato.prestador
-        profile = PrestadorProfile.objects.get(user=prestador_user)
-        
-        todas_avaliacoes = Avaliacao.objects.filter(
-            solicitacao_contato__prestador=prestador_user
-        )
-    
-        total = todas_avaliacoes.count()
-        media = todas_avaliacoes.aggregate(avg=models.Avg('nota'))['avg']
-        
-        if media is None:
-            media = 5.0
-            
-        profile.total_avaliacoes_cache = total
-        profile.total_servicos_cache = total  
-        profile.nota_media_cache = round(media, 2)
-        
-        profile.save(update_fields=['total_avaliacoes_cache', 'total_servicos_cache', 'nota_media_cache'])
-        
-        #print(f"Média atualizada para {prestador_user}: {media}")
+# Soma, total e média das avaliações do prestador são atualizados pela diferença de
+# cada avaliação (O(1)), em vez de recontar todas a cada save/delete. As diferenças são
+# acumuladas por transação e gravadas no commit (accounts/agregados_avaliacao.py); a
+# reconciliação (accounts/reconciliacao.py) reconta periodicamente e corrige divergências.
+
+def _prestador_da_solicitacao(solicitacao_id):
+    return PrestadorProfile.all_objects.filter(
+        user__contatos_recebidos__pk=solicitacao_id
+    ).values_list('pk', flat=True).first()
+
 
-    except Exception as e:
-        #print(f"Erro ao atualizar média: {e}")
-        pass
+def _registrar_avaliacao(solicitacao_id, using, **mudanca):
+    # O prestador é buscado agora: no commit a solicitação pode já ter sido excluída
+    prestador_id = _prestador_da_solicitacao(solicitacao_id)
+    if prestador_id is not None:
+        agregados_avaliacao.registrar(prestador_id, using=using, **mudanca)
+
+
+@receiver(post_save, sender=Avaliacao)
+def atualizar_cache_avaliacao(sender, instance, created, using, **kwargs):
+    if created:
+        _registrar_avaliacao(instance.solicitacao_contato_id, using, nota_adicionada=instance.nota)
+        return
+
+    solicitacao_antiga, nota_antiga = getattr(instance, '_original', (None, None))
+    if solicitacao_antiga is None or nota_antiga is None:
+        # Instância que não veio do banco: sem a nota antiga, reconta este prestador
+        _registrar_avaliacao(instance.solicitacao_contato_id, using, recontar=True)
+    elif solicitacao_antiga != instance.solicitacao_contato_id:
+        _registrar_avaliacao(solicitacao_antiga, using, nota_removida=nota_antiga)
+        _registrar_avaliacao(instance.solicitacao_contato_id, using, nota_adicionada=instance.nota)
+    elif nota_antiga != instance.nota:
+        _registrar_avaliacao(instance.solicitacao_contato_id, using, nota_removida=nota_antiga, nota_adicionada=instance.nota)
+
+
+@receiver(post_delete, sender=Avaliacao)
+def remover_avaliacao_do_cache(sender, instance, using, **kwargs):
+    _registrar_avaliacao(instance.solicitacao_contato_id, using, nota_removida=instance.nota)
 
 
 # ============================================================================
@@ -122,3 +133,78 @@ def soft_delete_user_related_data(sender, instance, **kwargs):
         )
     
     print(f"✅ User {instance.email} soft-deleted. Todos os dados relacionados marcados como deletados.")
+
+
+# ============================================================================
+# SIGNAL 3: Documento de busca (PrestadorBusca)
+# ============================================================================
+
+@receiver([post_save, post_delete], sender=PrestadorProfile)
+def sincronizar_busca_prestador(sender, instance, **kwargs):
+    PrestadorBusca.sincronizar([instance.pk])
+
+
+@receiver(post_save, sender=User)
+def sincronizar_busca_usuario(sender, instance, **kwargs):
+    # Nome e soft delete do usuário aparecem no documento do prestador
+    if instance.tipo_usuario != 'prestador':
+        return
+    ids = PrestadorProfile.all_objects.filter(user=instance).values_list('pk', flat=True)
+    PrestadorBusca.sincronizar(list(ids))
+
+
+@receiver(post_save, sender=Servico)
+def sincronizar_busca_servico(sender, instance, **kwargs):
+    ids = PrestadorProfile.all_objects.filter(servico=instance).values_list('pk', flat=True)
+    PrestadorBusca.sincronizar(list(ids))
+
+
+@receiver(post_delete, sender=Servico)
+def sincronizar_busca_servico_removido(sender, instance, **kwargs):
+    # O SET_NULL do prestador é feito via UPDATE, sem signal: usa o documento para achar os afetados
+    ids = PrestadorBusca.objects.filter(servico_id=instance.pk).values_list('pk', flat=True)
+    PrestadorBusca.sincronizar(list(ids))
+
+
+@receiver(post_save, sender=CategoriaServico)
+def sincronizar_busca_categoria(sender, instance, **kwargs):
+    ids = PrestadorBusca.objects.filter(categoria_id=instance.pk).values_list('pk', flat=True)
+    PrestadorBusca.sincronizar(list(ids))
+
+
+@receiver([post_save, post_delete], sender=PortfolioItem)
+def sincronizar_busca_portfolio(sender, instance, **kwargs):
+    PrestadorBusca.sincronizar([instance.prestador_id])
+
+
+# Contadores que aparecem no documento e na listagem
+CONTADORES_BUSCA = {'nota_media_cache', 'total_avaliacoes_cache', 'pontuacao_ranking'}
+
+
+@receiver(contadores_atualizados, sender=PrestadorProfile)
+def sincronizar_busca_contadores(sender, prestadores, prestador_ids, campos, **kwargs):
+    # Os contadores são gravados com UPDATE direto: não há post_save do perfil
+    if campos & CONTADORES_BUSCA:
+        if prestador_ids is None:
+            prestador_ids = list(prestadores.values_list('pk', flat=True))
+        PrestadorBusca.sincronizar(prestador_ids)
+        invalidar_busca_prestadores()
+
+
+# ============================================================================
+# SIGNAL 4: Invalidação do cache da busca de prestadores
+# ============================================================================
+
+@receiver([post_save, post_delete], sender=PrestadorProfile)
+@receiver([post_save, post_delete], sender=Avaliacao)
+@receiver([post_save, post_delete], sender=PortfolioItem)
+@receiver([post_save, post_delete], sender=Servico)
+@receiver([post_save, post_delete], sender=CategoriaServico)
+def invalidar_cache_busca(sender, **kwargs):
+    invalidar_busca_prestadores()
+
+
+@receiver(post_save, sender=User)
+def invalidar_cache_busca_usuario(sender, instance, **kwargs):
+    if instance.tipo_usuario == 'prestador':
+        invalidar_busca_prestadores()
@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.utils import timezone
+
+from tarefas.fila import tarefa
+from tarefas.models import Tarefa
+
+from .cache_busca import invalidar_busca_prestadores
+from .geohash import codificar_geohash
+from .reconciliacao import reconciliar_avaliacoes
+from .models import (
+    GEOCODE_CONCLUIDO, GEOCODE_FALHOU, GEOCODE_PENDENTE,
+    ClienteProfile, PrestadorBusca, PrestadorProfile, pegar_dados_endereco,
+)
+
+# Geocodificação fora da requisição (cadastro e edição de perfil).
+#
+# A API salva o perfil como 'pendente' e enfileira geocodificar_perfil na mesma
+# transação (tarefas.fila). Os serviços externos (BrasilAPI, ViaCEP, Nominatim) podem
+# levar vários segundos e não seguram mais a transação nem o worker do gunicorn.
+
+MODELOS_PERFIL = {
+    'cliente': ClienteProfile,
+    'prestador': PrestadorProfile,
+}
+
+
+def salvar_perfil(perfil):
+    """
+    Salva o perfil sem chamar os serviços de geocodificação na requisição; se o
+    endereço precisa ser geocodificado, a tarefa vai para a fila.
+    """
+    perfil.save(geocodificar=False)
+    if perfil.geocode_status == GEOCODE_PENDENTE:
+        agendar_geocodificacao(perfil)
+
+
+def agendar_geocodificacao(perfil):
+    """Enfileira a geocodificação do perfil (visível para os workers após o commit)."""
+    tipo = 'prestador' if isinstance(perfil, PrestadorProfile) else 'cliente'
+    return geocodificar_perfil.enfileirar(tipo, perfil.pk)
+
+
+@tarefa(max_tentativas=3)
+def geocodificar_perfil(tipo, pk):
+    Modelo = MODELOS_PERFIL[tipo]
+    perfil = Modelo.objects.filter(pk=pk).only('cep', 'rua', 'numero_casa', 'geocode_status').first()
+    if perfil is None or perfil.geocode_status != GEOCODE_PENDENTE:
+        return
+
+    dados = pegar_dados_endereco(perfil.cep, perfil.rua, perfil.numero_casa)
+
+    valores = {'geocode_status': GEOCODE_FALHOU, 'updated_at': timezone.now()}
+    if dados:
+        valores.update(dados)
+        valores['geohash'] = codificar_geohash(dados['latitude'], dados['longitude'])
+        if dados['latitude'] is not None:
+            valores['geocode_status'] = GEOCODE_CONCLUIDO
+
+    # Só grava se o endereço não mudou enquanto a consulta rodava
+    atualizados = Modelo.objects.filter(
+        pk=pk, cep=perfil.cep, rua=perfil.rua, numero_casa=perfil.numero_casa,
+    ).update(**valores)
+
+    if atualizados and tipo == 'prestador':
+        # update() não dispara signals: sincroniza o documento de busca aqui
+        PrestadorBusca.sincronizar([pk])
+        invalidar_busca_prestadores()
+
+
+@tarefa(max_tentativas=1)
+def reconciliar_avaliacoes_periodicamente():
+    """Reconta os agregados de avaliação, corrige divergências e agenda a próxima rodada."""
+    try:
+        divergencias = reconciliar_avaliacoes(corrigir=True)
+        if divergencias:
+            print(f"Reconciliação de avaliações: {len(divergencias)} prestador(es) corrigido(s).")
+    finally:
+        agendar_reconciliacao(atraso=settings.AVALIACOES_RECONCILIACAO_INTERVALO)
+
+
+def agendar_reconciliacao(atraso=None):
+    """Enfileira a reconciliação, a não ser que já haja uma pendente."""
+    pendente = Tarefa.objects.filter(
+        nome=reconciliar_avaliacoes_periodicamente.nome_tarefa, status=Tarefa.PENDENTE,
+    ).exists()
+    if pendente:
+        return None
+    return reconciliar_avaliacoes_periodicamente.enfileirar(atraso=atraso)
@@ -1,13 +1,88 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import Mock, patch
+import numpy as np
+import requests
+from unittest import skipUnless
+from django.contrib import admin
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
 from django.utils import timezone
-from accounts.models import User, ClienteProfile, PrestadorProfile
+from datetime import timedelta
+from accounts.models import (
+    User, ClienteProfile, PrestadorProfile, PrestadorBusca, CepGeocode, consultar_cep, pegar_dados_endereco
+)
 from servicos.models import CategoriaServico, Servico, PrestadorServicos
 from portfolio.models import PortfolioItem
 from contratacoes.models import SolicitacaoContato
 from avaliacoes.models import Avaliacao
+from accounts.views import (
+    calcular_bounding_box, calcular_distancia, calcular_distancias_lote, indices_mais_proximos
+)
+from accounts.geohash import celulas_na_area, codificar_geohash
+from accounts.pagination import KeysetPagination
+from accounts.busca import normalizar_busca
+from accounts.cache_busca import invalidar_busca_prestadores
+from accounts.centroides_cep import buscar_centroide
+from accounts.reconciliacao import reconciliar_avaliacoes
+from accounts.serializers import PrestadorPublicoSerializer
+from accounts.tasks import geocodificar_perfil, reconciliar_avaliacoes_periodicamente, salvar_perfil
+from accounts import agregados_avaliacao, estado_compartilhado, geocodificadores, geocoding, reconciliacao
+from tarefas.fila import processar_fila
+from tarefas.models import Tarefa
 
 
-class SoftDeleteCascataTest(TestCase):
+class SemGeocodificacaoTestCase(TestCase):
+    """
+    Base dos testes que criam perfis sem testar a geocodificação: nenhuma chamada aos
+    provedores (com as novas tentativas, cada CEP sem rede custaria vários segundos)
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        geocodificacao = patch('accounts.models.pegar_dados_endereco', return_value=None)
+        geocodificacao.start()
+        cls.addClassCleanup(geocodificacao.stop)
+        super().setUpClass()
+
+
+class PrestadorTestCase(SemGeocodificacaoTestCase):
+    """
+    Base dos testes com prestadores: categoria e serviço, um cliente e atalhos para criar
+    prestadores e avaliações
+    """
+
+    def setUp(self):
+        self.categoria = CategoriaServico.objects.create(nome='Reformas')
+        self.servico = Servico.objects.create(nome='Pintor', categoria=self.categoria)
+        self.cliente = User.objects.create(username='c@test.com', email='c@test.com', nome_completo='Cliente', tipo_usuario='cliente')
+
+    def _criar_prestador(self, email='p@test.com', nome='Prestador', **campos):
+        user = User.objects.create(username=email, email=email, nome_completo=nome, tipo_usuario='prestador')
+        campos = {
+            'telefone_publico': '11999990000', 'cep': '01001000', 'rua': 'Praça da Sé', 'numero_casa': '1',
+            'servico': self.servico, **campos,
+        }
+        return PrestadorProfile.objects.create(user=user, **campos)
+
+    def _avaliar(self, perfil, nota, **campos):
+        solicitacao = SolicitacaoContato.objects.create(cliente=self.cliente, prestador=perfil.user, servico=self.servico)
+        # Os agregados do prestador são gravados no commit
+        with self.captureOnCommitCallbacks(execute=True):
+            return Avaliacao.objects.create(solicitacao_contato=solicitacao, nota=nota, **campos)
+
+
+class SoftDeleteCascataTest(SemGeocodificacaoTestCase):
     """
     Testes para verificar soft delete e cascata de exclusão
     """
@@ -195,3 +270,1082 @@ class SoftDeleteCascataTest(TestCase):
         self.assertIsNotNone(prestador.deleted_at)
         self.assertGreaterEqual(prestador.deleted_at, before)
         self.assertLessEqual(prestador.deleted_at, after)
+
+
+class PrestadorListViewTest(PrestadorTestCase):
+    """
+    Testes da busca pública de prestadores (distância, raio e paginação)
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        # Praça da Sé (SP) como referência do cliente
+        self.origem = (Decimal('-23.55028000'), Decimal('-46.63389000'))
+        self.perto = self._criar_prestador(
+            'perto@test.com', latitude=Decimal('-23.56000000'), longitude=Decimal('-46.64000000'), cidade='Cidade',
+        )
+        self.longe = self._criar_prestador(
+            'longe@test.com', latitude=Decimal('-22.90680000'), longitude=Decimal('-43.17290000'), cidade='Cidade',
+        )
+
+    def _listar(self, **params):
+        params.setdefault('latitude', str(self.origem[0]))
+        params.setdefault('longitude', str(self.origem[1]))
+        response = self.client.get(reverse('lista-prestadores'), params)
+        self.assertEqual(response.status_code, 200)
+        self.resultados = response.data['results']
+        return [item['id'] for item in self.resultados]
+
+    def test_bounding_box_contem_o_raio(self):
+        lat_min, lat_max, lon_min, lon_max = calcular_bounding_box(-23.55, -46.63, 10)
+        self.assertLess(lat_min, -23.55)
+        self.assertGreater(lat_max, -23.55)
+        # Pontos a 10 km para norte e leste ficam dentro do retângulo
+        self.assertLessEqual(lat_max - (-23.55), 0.1)
+        self.assertGreater(lon_max - (-46.63), lat_max - (-23.55))
+
+    def test_raio_exclui_prestadores_distantes(self):
+        self.assertEqual(self._listar(raio_km='10'), [self.perto.pk])
+
+    def test_sem_raio_retorna_todos(self):
+        self.assertCountEqual(self._listar(), [self.perto.pk, self.longe.pk])
+
+    @override_settings(PRESTADORES_CACHE_TIMEOUT=0)
+    def test_ordenar_por_distancia_no_banco(self):
+        self.assertEqual(self._listar(ordenar_por_distancia='true'), [self.perto.pk, self.longe.pk])
+
+        esperado = calcular_distancia(self.origem[0], self.origem[1], Decimal('-22.90680000'), Decimal('-43.17290000'))
+        self.assertAlmostEqual(self.resultados[1]['distancia'], esperado, places=1)
+
+    def test_geohash_preenchido_no_save(self):
+        self.perto.refresh_from_db()
+        self.perto.save()
+        self.assertEqual(self.perto.geohash, codificar_geohash(self.perto.latitude, self.perto.longitude))
+        self.assertEqual(len(self.perto.geohash), 5)
+
+    def test_celulas_cobrem_o_raio(self):
+        lat_min, lat_max, lon_min, lon_max = calcular_bounding_box(-23.55, -46.63, 5)
+        celulas = celulas_na_area(lat_min, lat_max, lon_min, lon_max)
+        self.assertIn(codificar_geohash(-23.55, -46.63), celulas)
+        self.assertIn(codificar_geohash(lat_max, lon_max), celulas)
+        self.assertIn(codificar_geohash(lat_min, lon_min), celulas)
+        self.assertIsNone(celulas_na_area(-30, 0, -60, -30))
+
+    def test_paginacao_por_cursor(self):
+        with patch.object(KeysetPagination, 'page_size', 1):
+            params = {'ordenar_por_distancia': 'true', 'paginacao': 'cursor'}
+            self.assertEqual(self._listar(**params), [self.perto.pk])
+
+            response = self.client.get(reverse('lista-prestadores'), params | {
+                'latitude': str(self.origem[0]), 'longitude': str(self.origem[1]),
+            })
+            self.assertNotIn('count', response.data)
+
+            segunda = self.client.get(response.data['next'])
+            self.assertEqual([item['id'] for item in segunda.data['results']], [self.longe.pk])
+            self.assertIsNone(segunda.data['next'])
+
+    def test_cursor_invalido(self):
+        response = self.client.get(reverse('lista-prestadores'), {'cursor': 'invalido'})
+        self.assertEqual(response.status_code, 404)
+
+
+    def test_resposta_em_cache_ate_uma_escrita(self):
+        self.assertCountEqual(self._listar(), [self.perto.pk, self.longe.pk])
+
+        # Escrita sem signals (não invalida): a busca segue vindo do cache
+        PrestadorBusca.objects.filter(pk=self.longe.pk).delete()
+        self.assertCountEqual(self._listar(), [self.perto.pk, self.longe.pk])
+
+        # Qualquer save de prestador invalida as buscas em cache
+        self.perto.save()
+        self.assertCountEqual(self._listar(), [self.perto.pk])
+
+    def test_clientes_na_mesma_celula_compartilham_o_cache(self):
+        self._listar(latitude='-23.55028', longitude='-46.63389')
+        # Só a leitura da versão, no cache compartilhado
+        with self.assertNumQueries(1):
+            self._listar(latitude='-23.55030', longitude='-46.63391')
+
+    def test_invalidacao_de_outro_processo(self):
+        self.assertCountEqual(self._listar(), [self.perto.pk, self.longe.pk])
+        PrestadorBusca.objects.filter(pk=self.longe.pk).delete()
+
+        # Worker da fila (ou outro processo do gunicorn), com a própria conexão ao cache
+        outro = caches.create_connection(estado_compartilhado.ALIAS)
+        with patch('accounts.cache_busca.cache', outro):
+            invalidar_busca_prestadores()
+        self.assertCountEqual(self._listar(), [self.perto.pk])
+
+class DistanciaLoteTest(SimpleTestCase):
+    """
+    Testes do cálculo de distância vetorizado
+    """
+
+    def test_lote_igual_ao_calculo_por_linha(self):
+        latitudes = [-23.56, -22.9068, None, -15.7939]
+        longitudes = [-46.64, -43.1729, None, -47.8828]
+        distancias = calcular_distancias_lote(-23.5503, -46.6339, latitudes, longitudes)
+
+        for i, (lat, lon) in enumerate(zip(latitudes, longitudes)):
+            if lat is None:
+                self.assertTrue(np.isnan(distancias[i]))
+            else:
+                self.assertAlmostEqual(distancias[i], calcular_distancia(-23.5503, -46.6339, lat, lon), places=2)
+
+    def test_indices_mais_proximos(self):
+        distancias = np.array([50.0, np.nan, 3.0, 10.0, 1.0])
+        self.assertEqual(indices_mais_proximos(distancias, 2).tolist(), [4, 2])
+        self.assertEqual(indices_mais_proximos(distancias).tolist(), [4, 2, 3, 0, 1])
+
+
+class BuscaTextoTest(PrestadorTestCase):
+    """
+    Testes da busca por nome de prestador e de serviço (?nome e ?nome_servico)
+    """
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        categoria = CategoriaServico.objects.create(nome='Beleza e Bem-estar')
+        self.cabelereiro = Servico.objects.create(nome='Cabelereiro(a)', categoria=categoria)
+        self.manicure = Servico.objects.create(nome='Manicure/Pedicure', categoria=categoria)
+
+        self.joao = self._criar_prestador('joao@test.com', 'João Antônio', servico=self.cabelereiro)
+        self.maria = self._criar_prestador('maria@test.com', 'Maria Silva', servico=self.manicure)
+
+    def _buscar(self, **params):
+        response = self.client.get(reverse('lista-prestadores'), params)
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data['results']]
+
+    def test_normalizar_busca(self):
+        self.assertEqual(normalizar_busca('  João   ANTÔNIO '), 'joao antonio')
+
+    def test_busca_por_servico_sem_acento_e_maiusculas(self):
+        self.assertEqual(self._buscar(nome_servico='cabelereiro'), [self.joao.pk])
+        self.assertEqual(self._buscar(nome_servico='PEDICURE'), [self.maria.pk])
+
+    def test_busca_por_nome_com_e_sem_acento(self):
+        self.assertEqual(self._buscar(nome='antonio'), [self.joao.pk])
+        self.assertEqual(self._buscar(nome='Antônio'), [self.joao.pk])
+        # Termo curto (abaixo do trigram) também funciona
+        self.assertEqual(self._buscar(nome='jo'), [self.joao.pk])
+
+    def test_indice_acompanha_alteracao_de_nome(self):
+        self.maria.user.nome_completo = 'Mariana Souza'
+        self.maria.user.save(update_fields=['nome_completo'])
+
+        self.assertEqual(self._buscar(nome='souza'), [self.maria.pk])
+        self.assertEqual(self._buscar(nome='silva'), [])
+
+
+class PrestadorBuscaTest(PrestadorTestCase):
+    """
+    Testes do documento de busca (PrestadorBusca) mantido pelos signals
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.perfil = self._criar_prestador('pintor@test.com', 'Pedro Pintor')
+        self.user = self.perfil.user
+
+    def test_documento_criado_com_o_prestador(self):
+        documento = PrestadorBusca.objects.get(pk=self.perfil.pk)
+        self.assertEqual(documento.nome, 'Pedro Pintor')
+        self.assertEqual(documento.servico_nome, 'Pintor')
+        self.assertEqual(documento.categoria_id, self.categoria.pk)
+
+    def test_documento_acompanha_servico_e_portfolio(self):
+        self.servico.nome = 'Pintor residencial'
+        self.servico.save()
+        PortfolioItem.objects.create(prestador=self.perfil, imagem='portfolio/parede.jpg')
+
+        documento = PrestadorBusca.objects.get(pk=self.perfil.pk)
+        self.assertEqual(documento.servico_nome, 'Pintor residencial')
+        self.assertEqual(documento.thumbnail, 'portfolio/parede.jpg')
+
+    def test_documento_removido_no_soft_delete(self):
+        self.user.delete()
+        self.assertFalse(PrestadorBusca.objects.filter(pk=self.perfil.pk).exists())
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Saída do EXPLAIN específica do SQLite')
+class IndicesParciaisTest(TestCase):
+    """
+    O planner usa os índices parciais (is_deleted=False) nas consultas do ActiveManager
+    """
+
+    def assertUsaIndice(self, queryset, indice):
+        plano = queryset.explain()
+        self.assertIn(f'USING INDEX {indice}', plano)
+        # Ordenação atendida pelo próprio índice, sem ordenar em memória
+        self.assertNotIn('TEMP B-TREE', plano)
+
+    def test_contatos_do_prestador_e_do_cliente(self):
+        self.assertUsaIndice(
+            SolicitacaoContato.objects.filter(prestador_id=1).order_by('-data_clique'), 'idx_solicitacao_prestador'
+        )
+        self.assertUsaIndice(
+            SolicitacaoContato.objects.filter(cliente_id=1).order_by('-data_clique'), 'idx_solicitacao_cliente'
+        )
+
+    def test_perfis_por_geohash(self):
+        self.assertUsaIndice(PrestadorProfile.objects.filter(geohash='6gyf4bf'), 'idx_prestador_ativo_geohash')
+        self.assertUsaIndice(ClienteProfile.objects.filter(geohash='6gyf4bf'), 'idx_cliente_ativo_geohash')
+
+    def test_portfolio_e_usuarios(self):
+        self.assertUsaIndice(PortfolioItem.objects.filter(prestador_id=1).order_by('created_at'), 'idx_portfolio_ativo_prestador')
+        self.assertUsaIndice(User.objects.filter(tipo_usuario='prestador'), 'idx_user_ativo_tipo')
+
+    def test_consulta_sem_filtro_de_ativos_nao_usa_indice_parcial(self):
+        plano = SolicitacaoContato.all_objects.filter(prestador_id=1).explain()
+        self.assertNotIn('idx_solicitacao_prestador', plano)
+
+
+class CepGeocodeTest(TestCase):
+    """
+    Cache persistente de geocodificação por CEP
+    """
+    dados_sp = {
+        'latitude': Decimal('-23.55028000'), 'longitude': Decimal('-46.63389000'),
+        'cidade': 'São Paulo', 'bairro': 'Sé', 'estado': 'SP',
+    }
+
+    def test_cep_repetido_nao_consulta_de_novo(self):
+        with patch('accounts.models.consultar_cep', return_value=(dict(self.dados_sp), 'brasilapi')) as consulta:
+            self.assertEqual(pegar_dados_endereco('01001-000', 'Praça da Sé', 1)['cidade'], 'São Paulo')
+            dados = pegar_dados_endereco('01001000', 'Praça da Sé', 2)
+
+        self.assertEqual(consulta.call_count, 1)
+        self.assertEqual(dados['latitude'], self.dados_sp['latitude'])
+
+    def test_cep_invalido_tambem_fica_em_cache(self):
+        with patch('accounts.models.consultar_cep', return_value=(None, 'invalido')) as consulta:
+            self.assertIsNone(pegar_dados_endereco('99999999', '', ''))
+            self.assertIsNone(pegar_dados_endereco('99999999', '', ''))
+        self.assertEqual(consulta.call_count, 1)
+
+    def test_falha_de_rede_nao_fica_em_cache(self):
+        with patch('accounts.models.consultar_cep', return_value=(None, None)):
+            pegar_dados_endereco('01001000', '', '')
+        self.assertFalse(CepGeocode.objects.exists())
+
+    def test_entrada_expirada_consulta_de_novo(self):
+        with patch('accounts.models.consultar_cep', return_value=(dict(self.dados_sp), 'brasilapi')) as consulta:
+            pegar_dados_endereco('01001000', '', '')
+            CepGeocode.objects.update(consultado_em=timezone.now() - timedelta(days=91))
+            pegar_dados_endereco('01001000', '', '')
+        self.assertEqual(consulta.call_count, 2)
+
+
+
+class GeocodingClienteTest(TestCase):
+    """
+    Cliente HTTP dos provedores: session reaproveitada e contadores por provedor
+    """
+
+    def setUp(self):
+        estado_compartilhado.cache.clear()
+
+    def _resposta(self, status_code=200, corpo=None):
+        resposta = requests.Response()
+        resposta.status_code = status_code
+        resposta._content = json.dumps(corpo if corpo is not None else {}).encode()
+        return resposta
+
+    def test_session_reaproveitada_por_provedor(self):
+        self.assertIs(geocoding.get_session('viacep'), geocoding.get_session('viacep'))
+        self.assertIsNot(geocoding.get_session('viacep'), geocoding.get_session('brasilapi'))
+
+    def test_contadores_de_chamadas_e_erros(self):
+        session = geocoding.get_session('brasilapi')
+        with patch.object(session, 'get', side_effect=[self._resposta(200), self._resposta(503)]):
+            geocoding.get('brasilapi', '/api/cep/v2/01001000')
+            geocoding.get('brasilapi', '/api/cep/v2/01001000')
+
+        with patch.object(session, 'get', side_effect=requests.ConnectionError('sem rede')):
+            with self.assertRaises(requests.ConnectionError):
+                geocoding.get('brasilapi', '/api/cep/v2/01001000')
+
+        metricas = geocoding.metricas_provedores()
+        self.assertEqual((metricas['brasilapi']['chamadas'], metricas['brasilapi']['erros']), (3, 2))
+        self.assertIsNotNone(metricas['brasilapi']['latencia_media_ms'])
+        self.assertEqual(metricas['viacep']['chamadas'], 0)
+
+    def test_nominatim_retorna_coordenadas(self):
+        resposta = self._resposta(corpo=[{'lat': '-23.5502800', 'lon': '-46.6338900'}])
+        with patch.object(geocoding.get_session('nominatim'), 'get', return_value=resposta) as get:
+            self.assertEqual(geocoding.buscar_nominatim('Praça da Sé, São Paulo'), (-23.55028, -46.63389))
+
+        self.assertEqual(get.call_args.kwargs['params']['countrycodes'], 'br')
+        self.assertEqual(get.call_args.kwargs['timeout'], geocoding.PROVEDORES['nominatim']['timeout'])
+
+    @override_settings(GEOCODIFICACAO_TAXA={'nominatim': 20})
+    def test_nova_tentativa_do_nominatim_pega_outra_vaga(self):
+        # O adapter do Nominatim não repete requisições enviadas por conta própria
+        retry = geocoding.get_session('nominatim').get_adapter('https://nominatim.openstreetmap.org').max_retries
+        self.assertEqual((retry.status, retry.read), (0, 0))
+
+        resposta = self._resposta(corpo=[{'lat': '-23.5502800', 'lon': '-46.6338900'}])
+        with patch.object(geocoding.get_session('nominatim'), 'get', side_effect=[self._resposta(429), resposta]), \
+                patch('accounts.geocoding.aguardar_vaga', wraps=geocoding.aguardar_vaga) as aguardar:
+            self.assertEqual(geocoding.buscar_nominatim('Praça da Sé, São Paulo'), (-23.55028, -46.63389))
+        self.assertEqual(aguardar.call_count, 2)
+
+
+    @override_settings(GEOCODIFICACAO_TAXA={'nominatim': 20})
+    def test_limitador_espaca_as_requisicoes(self):
+        geocoding.aguardar_vaga('nominatim')
+        primeira = time.time()
+        geocoding.aguardar_vaga('nominatim')
+        self.assertGreaterEqual(time.time() - primeira, 0.05 - 0.005)
+
+    @override_settings(GEOCODIFICACAO_TAXA={'nominatim': 20})
+    def test_limitador_sem_vaga_na_espera_maxima(self):
+        # Outro processo já reservou as próximas janelas
+        janela = int(time.time() / 0.05)
+        for proxima in range(janela, janela + 20):
+            estado_compartilhado.cache.add(geocoding.CHAVE_VAGA.format(provedor='nominatim', janela=proxima), 1)
+
+        with self.assertRaises(geocoding.LimiteExcedido):
+            geocoding.aguardar_vaga('nominatim', espera_maxima=0.3)
+
+    def test_cache_compartilhado_nao_pode_ser_local(self):
+        self.assertEqual(estado_compartilhado.verificar_cache_compartilhado(), [])
+        local = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+        with override_settings(CACHES={'default': local, 'compartilhado': local}):
+            erros = estado_compartilhado.verificar_cache_compartilhado()
+        self.assertEqual([erro.id for erro in erros], ['accounts.E001'])
+
+    def test_provedor_sem_limite_nao_espera(self):
+        with patch('accounts.estado_compartilhado.cache.add') as add:
+            geocoding.aguardar_vaga('brasilapi')
+        add.assert_not_called()
+
+    @override_settings(GEOCODIFICACAO_CIRCUITO_FALHAS=2, GEOCODIFICACAO_CIRCUITO_ESPERA=60)
+    def test_circuito_abre_depois_de_falhas_seguidas(self):
+        session = geocoding.get_session('brasilapi')
+        with patch.object(session, 'get', side_effect=[self._resposta(503), self._resposta(200), self._resposta(503), self._resposta(503)]) as get:
+            for _ in range(4):
+                geocoding.get('brasilapi', '/api/cep/v2/01001000')
+            # Aberto: falha na hora, sem chamar o provedor
+            with self.assertRaises(geocoding.CircuitoAberto):
+                geocoding.get('brasilapi', '/api/cep/v2/01001000')
+
+        self.assertEqual(get.call_count, 4)
+        self.assertEqual(geocoding.estado_circuito('brasilapi')['estado'], 'aberto')
+        self.assertEqual(geocoding.estado_circuito('viacep')['estado'], 'fechado')
+
+    @override_settings(GEOCODIFICACAO_CIRCUITO_FALHAS=1)
+    def test_meio_aberto_libera_um_teste_por_vez(self):
+        # Espera já passou
+        estado_compartilhado.cache.set(geocoding.CHAVE_CIRCUITO.format(provedor='viacep', campo='aberto_ate'), time.time() - 1)
+        self.assertEqual(geocoding.estado_circuito('viacep')['estado'], 'meio_aberto')
+
+        geocoding.liberar_circuito('viacep')
+        with self.assertRaises(geocoding.CircuitoAberto):
+            geocoding.liberar_circuito('viacep')
+
+        # Teste falhou: abre de novo; depois um teste que dá certo fecha o circuito
+        geocoding.registrar_resultado_circuito('viacep', erro=True)
+        self.assertEqual(geocoding.estado_circuito('viacep')['estado'], 'aberto')
+        geocoding.registrar_resultado_circuito('viacep', erro=False)
+        self.assertEqual(geocoding.estado_circuito('viacep'), {'estado': 'fechado', 'falhas_seguidas': 0, 'espera_restante_s': None})
+
+    @override_settings(GEOCODIFICACAO_CIRCUITO_FALHAS=1)
+    def test_disjuntor_e_metricas_vistos_por_outro_processo(self):
+        # Outro cliente do mesmo cache, sem nada em comum com este além do armazenamento
+        outro = caches.create_connection(estado_compartilhado.ALIAS)
+        self.assertIsNot(outro, caches[estado_compartilhado.ALIAS])
+
+        geocoding.registrar_metrica('viacep', 120, erro=True)
+        geocoding.registrar_resultado_circuito('viacep', erro=True)
+
+        with patch('accounts.geocoding.cache', outro):
+            metricas = geocoding.metricas_provedores()['viacep']
+        self.assertEqual((metricas['chamadas'], metricas['erros']), (1, 1))
+        self.assertEqual(metricas['circuito']['estado'], 'aberto')
+
+    def test_nominatim_com_circuito_aberto_nao_espera_vaga(self):
+        estado_compartilhado.cache.set(geocoding.CHAVE_CIRCUITO.format(provedor='nominatim', campo='aberto_ate'), time.time() + 60)
+        with patch('accounts.geocoding.aguardar_vaga') as aguardar, self.assertRaises(geocoding.CircuitoAberto):
+            geocoding.buscar_nominatim('Praça da Sé, São Paulo')
+        aguardar.assert_not_called()
+
+class ConsultaParalelaCepTest(SimpleTestCase):
+    """
+    BrasilAPI e ViaCEP em paralelo: a latência é a do mais lento, não a soma
+    """
+    endereco = {'latitude': None, 'longitude': None, 'cidade': 'São Paulo', 'bairro': 'Sé', 'estado': 'SP'}
+
+    def _devagar(self, resultado, segundos=0.4):
+        def consulta(cep):
+            time.sleep(segundos)
+            return resultado
+        return consulta
+
+    def test_brasilapi_com_coordenadas_nao_espera_o_viacep(self):
+        com_coordenadas = dict(self.endereco, latitude=Decimal('-23.55028000'), longitude=Decimal('-46.63389000'))
+        with patch('accounts.models._consultar_brasilapi', self._devagar(com_coordenadas, 0.1)), \
+                patch('accounts.models._consultar_viacep', self._devagar(dict(self.endereco), 2)):
+            inicio = time.perf_counter()
+            dados, fonte = consultar_cep('01001000', '', '')
+
+        self.assertLess(time.perf_counter() - inicio, 1)
+        self.assertEqual((fonte, dados['latitude']), ('brasilapi', com_coordenadas['latitude']))
+
+    def test_fallback_espera_o_mais_lento_e_nao_a_soma(self):
+        with patch('accounts.models._consultar_brasilapi', self._devagar(None)), \
+                patch('accounts.models._consultar_viacep', self._devagar(dict(self.endereco, logradouro='Praça da Sé'))), \
+                patch('accounts.geocoding.buscar_nominatim', return_value=(-23.55028, -46.63389)) as nominatim:
+            inicio = time.perf_counter()
+            dados, fonte = consultar_cep('01001000', '', '1')
+
+        self.assertLess(time.perf_counter() - inicio, 0.75)
+        self.assertEqual((fonte, dados['cidade']), ('nominatim', 'São Paulo'))
+        self.assertNotIn('logradouro', dados)
+        self.assertIn('Praça da Sé, 1', nominatim.call_args.args[0])
+
+    def test_cep_invalido_no_viacep(self):
+        with patch('accounts.models._consultar_brasilapi', return_value=None), \
+                patch('accounts.models._consultar_viacep', return_value='invalido'):
+            self.assertEqual(consultar_cep('99999999', '', ''), (None, 'invalido'))
+
+    def test_thread_do_pool_fecha_conexoes(self):
+        with patch('accounts.geocoding.close_old_connections') as fechar:
+            self.assertEqual(geocoding.em_paralelo(self._devagar('ok', 0), '01001000').result(), 'ok')
+        self.assertEqual(fechar.call_count, 2)
+
+        # Fecha também quando a consulta levanta exceção
+        with patch('accounts.geocoding.close_old_connections') as fechar:
+            with self.assertRaises(requests.ConnectionError):
+                geocoding.em_paralelo(Mock(side_effect=requests.ConnectionError)).result()
+        self.assertEqual(fechar.call_count, 2)
+
+class CadastroGeocodificacaoTest(TestCase):
+    """
+    O cadastro não geocodifica na requisição: enfileira a tarefa
+    """
+
+    def setUp(self):
+        cache.clear()
+        categoria = CategoriaServico.objects.create(nome='Reformas')
+        self.servico = Servico.objects.create(nome='Pintor', categoria=categoria)
+        self.payload = {
+            'email': 'novo@test.com', 'nome_completo': 'Novo Prestador', 'dt_nascimento': '01/01/1990',
+            'genero': 'M', 'cpf': '52998224725', 'password': 'Senha@123', 'password2': 'Senha@123',
+            'telefone_publico': '11999990000', 'cep': '01001000', 'rua': 'Praça da Sé', 'numero_casa': '1',
+            'disponibilidade': True, 'categoria': categoria.pk, 'servico': self.servico.pk,
+        }
+        self.dados = {
+            'latitude': Decimal('-23.55028000'), 'longitude': Decimal('-46.63389000'),
+            'cidade': 'São Paulo', 'bairro': 'Sé', 'estado': 'SP',
+        }
+
+    def test_cadastro_salva_pendente_e_geocodifica_na_fila(self):
+        with patch('accounts.models.pegar_dados_endereco') as na_requisicao, \
+                patch('accounts.tasks.pegar_dados_endereco', return_value=self.dados):
+            response = self.client.post(reverse('registrar-prestador'), self.payload)
+
+            self.assertEqual(response.status_code, 201)
+            perfil = PrestadorProfile.objects.get(user__email='novo@test.com')
+            self.assertEqual(perfil.geocode_status, 'pendente')
+            self.assertIsNone(perfil.latitude)
+            self.assertTrue(Tarefa.objects.filter(nome=geocodificar_perfil.nome_tarefa, status='pendente').exists())
+
+            self.assertEqual(processar_fila(), 1)
+
+        na_requisicao.assert_not_called()
+        perfil.refresh_from_db()
+        self.assertEqual(perfil.geocode_status, 'concluido')
+        self.assertEqual(perfil.cidade, 'São Paulo')
+        self.assertEqual(perfil.geohash, codificar_geohash(perfil.latitude, perfil.longitude))
+        self.assertEqual(PrestadorBusca.objects.get(pk=perfil.pk).latitude, self.dados['latitude'])
+
+    def test_edicao_de_endereco_vai_para_a_fila(self):
+        with patch('accounts.models.pegar_dados_endereco', return_value=self.dados):
+            user = User.objects.create(username='c@test.com', email='c@test.com', nome_completo='C', tipo_usuario='cliente')
+            perfil = ClienteProfile.objects.create(user=user, cep='01001000', rua='Praça da Sé', numero_casa='1')
+
+        cliente = APIClient()
+        cliente.force_authenticate(user)
+        with patch('accounts.models.pegar_dados_endereco') as na_requisicao:
+            response = cliente.patch(reverse('editar-perfil-cliente'), {
+                'telefone_contato': '11999990000', 'cep': '20040020', 'rua': 'Av. Rio Branco', 'numero_casa': '10',
+            })
+
+        self.assertEqual(response.status_code, 200)
+        na_requisicao.assert_not_called()
+        perfil.refresh_from_db()
+        self.assertEqual((perfil.cep, perfil.geocode_status), ('20040020', 'pendente'))
+        self.assertEqual(Tarefa.objects.filter(nome=geocodificar_perfil.nome_tarefa).count(), 1)
+
+    def test_edicao_pelo_admin_vai_para_a_fila(self):
+        with patch('accounts.models.pegar_dados_endereco', return_value=self.dados):
+            user = User.objects.create(username='p@test.com', email='p@test.com', nome_completo='P', tipo_usuario='prestador')
+            perfil = PrestadorProfile.objects.create(
+                user=user, telefone_publico='11999990000', cep='01001000', rua='Praça da Sé', numero_casa='1', servico=self.servico,
+            )
+
+        perfil.cep = '20040020'
+        with patch('accounts.models.pegar_dados_endereco') as na_requisicao:
+            admin.site._registry[PrestadorProfile].save_model(None, perfil, None, change=True)
+
+        na_requisicao.assert_not_called()
+        perfil.refresh_from_db()
+        self.assertEqual((perfil.cep, perfil.geocode_status), ('20040020', 'pendente'))
+        self.assertEqual(Tarefa.objects.filter(nome=geocodificar_perfil.nome_tarefa).count(), 1)
+
+    def test_falha_na_geocodificacao_fica_registrada(self):
+        with patch('accounts.tasks.pegar_dados_endereco', return_value=None):
+            self.client.post(reverse('registrar-prestador'), self.payload)
+            processar_fila()
+
+        self.assertEqual(PrestadorProfile.objects.get(user__email='novo@test.com').geocode_status, 'falhou')
+
+
+class GeocodeBackfillTest(TestCase):
+    """
+    Backfill de geocodificação: agrupa por CEP, usa o cache e retoma pelo checkpoint
+    """
+    dados = {
+        'latitude': Decimal('-23.55028000'), 'longitude': Decimal('-46.63389000'),
+        'cidade': 'São Paulo', 'bairro': 'Sé', 'estado': 'SP',
+    }
+
+    def setUp(self):
+        self.checkpoint = os.path.join(tempfile.mkdtemp(), 'checkpoint.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.checkpoint))
+        with patch('accounts.models.pegar_dados_endereco', return_value=None):
+            self.clientes = [self._criar_cliente(i, '01001000') for i in range(3)]
+            self.clientes.append(self._criar_cliente(3, '20040020'))
+
+    def _criar_cliente(self, i, cep):
+        user = User.objects.create(username=f'c{i}@test.com', email=f'c{i}@test.com', nome_completo=f'C{i}', tipo_usuario='cliente')
+        return ClienteProfile.objects.create(user=user, cep=cep, rua='Rua', numero_casa=str(i))
+
+    def _backfill(self, *args):
+        call_command(
+            'geocode_backfill', '--modelo', 'cliente', '--concorrencia', '1', '--checkpoint', self.checkpoint,
+            *args, stdout=StringIO(),
+        )
+
+    def test_uma_consulta_por_cep(self):
+        CepGeocode.registrar('20040020', dict(self.dados, cidade='Rio de Janeiro'), 'brasilapi')
+        with patch('accounts.management.commands.geocode_backfill.pegar_dados_endereco', return_value=self.dados) as consulta:
+            self._backfill()
+
+        # 01001000 foi consultado uma vez para os três perfis; 20040020 veio do cache
+        consulta.assert_called_once()
+        self.assertEqual(consulta.call_args.args[0], '01001000')
+        self.assertEqual(ClienteProfile.objects.filter(geocode_status='concluido', cidade='São Paulo').count(), 3)
+        self.assertEqual(ClienteProfile.objects.get(cep='20040020').cidade, 'Rio de Janeiro')
+
+    def test_retoma_do_checkpoint(self):
+        with open(self.checkpoint, 'w') as arquivo:
+            json.dump({'cliente': self.clientes[1].pk}, arquivo)
+
+        with patch('accounts.management.commands.geocode_backfill.pegar_dados_endereco', return_value=self.dados):
+            self._backfill()
+
+        self.assertEqual(
+            list(ClienteProfile.objects.filter(geocode_status='concluido').order_by('pk').values_list('pk', flat=True)),
+            [self.clientes[2].pk, self.clientes[3].pk],
+        )
+        # Concluído: o progresso não fica para a próxima execução
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_segunda_execucao_comeca_do_inicio(self):
+        with patch('accounts.management.commands.geocode_backfill.pegar_dados_endereco', return_value=None):
+            self._backfill()
+        self.assertEqual(ClienteProfile.objects.filter(geocode_status='falhou').count(), 4)
+
+        # Provedor voltou: os perfis que falharam são tentados de novo, sem --reiniciar
+        with patch('accounts.management.commands.geocode_backfill.pegar_dados_endereco', return_value=self.dados):
+            self._backfill()
+        self.assertEqual(ClienteProfile.objects.filter(geocode_status='concluido').count(), 4)
+
+    def test_endereco_editado_durante_o_lote_nao_e_sobrescrito(self):
+        def consultar_e_editar(cep, rua, numero):
+            # O cliente troca de endereço enquanto o CEP antigo é consultado
+            ClienteProfile.objects.filter(pk=self.clientes[0].pk).update(cep='30130000', rua='Av. Afonso Pena', geocode_status='pendente')
+            return self.dados
+
+        with patch('accounts.management.commands.geocode_backfill.pegar_dados_endereco', side_effect=consultar_e_editar):
+            self._backfill()
+
+        editado = ClienteProfile.objects.get(pk=self.clientes[0].pk)
+        self.assertEqual((editado.cep, editado.cidade, editado.geocode_status), ('30130000', '', 'pendente'))
+        self.assertEqual(
+            set(ClienteProfile.objects.filter(geocode_status='concluido').values_list('pk', flat=True)),
+            {cliente.pk for cliente in self.clientes[1:]},
+        )
+
+    def test_falha_marcada_e_sem_nova_tentativa_na_mesma_execucao(self):
+        with patch('accounts.management.commands.geocode_backfill.pegar_dados_endereco', return_value=None) as consulta:
+            self._backfill('--lote', '2')
+
+        self.assertEqual(consulta.call_count, 2)
+        self.assertEqual(ClienteProfile.objects.filter(geocode_status='falhou').count(), 4)
+
+
+class CentroidesCepTest(TestCase):
+    """
+    Geocodificador local por setor de CEP (arquivo gerado a partir do cache de CEPs)
+    """
+
+    def setUp(self):
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta)
+        self.arquivo = os.path.join(pasta, 'centroides.npy')
+
+        for cep, lat, lon in (('01001000', '-23.55', '-46.63'), ('01001001', '-23.56', '-46.64'), ('20040020', '-22.90', '-43.17')):
+            cidade, estado = ('São Paulo', 'SP') if cep.startswith('01') else ('Rio de Janeiro', 'RJ')
+            CepGeocode.registrar(cep, {
+                'latitude': Decimal(lat), 'longitude': Decimal(lon), 'cidade': cidade, 'bairro': '', 'estado': estado,
+            }, 'brasilapi')
+        CepGeocode.registrar('99999999', None, 'invalido')
+
+        call_command('gerar_centroides_cep', '--saida', self.arquivo, stdout=StringIO())
+        CepGeocode.objects.all().delete()
+
+    def test_centroide_e_a_media_do_setor(self):
+        with self.settings(CENTROIDES_CEP_ARQUIVO=self.arquivo):
+            dados = buscar_centroide('01001-999')
+            self.assertIsNone(buscar_centroide('30130000'))
+
+        self.assertAlmostEqual(float(dados['latitude']), -23.555, places=4)
+        self.assertAlmostEqual(float(dados['longitude']), -46.635, places=4)
+        self.assertEqual((dados['cidade'], dados['estado']), ('São Paulo', 'SP'))
+
+    def test_sem_arquivo_nao_geocodifica(self):
+        with self.settings(CENTROIDES_CEP_ARQUIVO=self.arquivo + '.inexistente'):
+            self.assertIsNone(buscar_centroide('01001000'))
+
+    def test_fallback_quando_provedores_falham(self):
+        with self.settings(CENTROIDES_CEP_ARQUIVO=self.arquivo, CENTROIDES_CEP_MODO='fallback'), \
+                patch('accounts.models.consultar_cep', return_value=(None, None)):
+            dados = pegar_dados_endereco('20040020', '', '')
+        self.assertEqual(dados['cidade'], 'Rio de Janeiro')
+        # Centroide não vai para o cache de CEP: os provedores são consultados de novo depois
+        self.assertFalse(CepGeocode.objects.exists())
+
+    def test_modo_primeiro_nao_chama_provedores(self):
+        with self.settings(CENTROIDES_CEP_ARQUIVO=self.arquivo, CENTROIDES_CEP_MODO='primeiro'), \
+                patch('accounts.models.consultar_cep') as consulta:
+            self.assertEqual(pegar_dados_endereco('01001000', '', '')['estado'], 'SP')
+        consulta.assert_not_called()
+
+
+class EnderecoSnapshotTest(PrestadorTestCase):
+    """
+    O save() do perfil decide a geocodificação pelo endereço carregado do banco, sem SELECT extra
+    """
+    dados = {
+        'latitude': Decimal('-23.55028000'), 'longitude': Decimal('-46.63389000'),
+        'cidade': 'São Paulo', 'bairro': 'Sé', 'estado': 'SP',
+    }
+
+    def setUp(self):
+        super().setUp()
+        with patch('accounts.models.pegar_dados_endereco', return_value=self.dados):
+            self.perfil = self._criar_prestador()
+
+    def test_save_sem_mudar_endereco_nao_consulta_perfil_antigo(self):
+        perfil = PrestadorProfile.objects.get(pk=self.perfil.pk)
+        perfil.biografia = 'Nova biografia'
+        with patch('accounts.models.pegar_dados_endereco') as geocodificacao, \
+                CaptureQueriesContext(connection) as consultas:
+            perfil.save()
+
+        geocodificacao.assert_not_called()
+        # Antes do UPDATE só as checagens do full_clean (SELECT 1 ...), nenhum get() do perfil antigo
+        sqls = [q['sql'] for q in consultas.captured_queries]
+        antes_do_update = sqls[:next(i for i, sql in enumerate(sqls) if sql.startswith('UPDATE'))]
+        self.assertTrue(all(sql.startswith('SELECT 1 AS "a"') for sql in antes_do_update), antes_do_update)
+
+    def test_save_parcial_sem_endereco_nao_geocodifica(self):
+        PrestadorProfile.objects.filter(pk=self.perfil.pk).update(latitude=None, cidade='')
+        perfil = PrestadorProfile.objects.get(pk=self.perfil.pk)
+        perfil.nota_media_cache = Decimal('4.50')
+        with patch('accounts.models.pegar_dados_endereco') as geocodificacao:
+            perfil.save(update_fields=['nota_media_cache'])
+
+        geocodificacao.assert_not_called()
+        self.assertEqual(PrestadorProfile.objects.get(pk=perfil.pk).nota_media_cache, Decimal('4.50'))
+
+    def test_mudanca_de_endereco_geocodifica_e_grava_coordenadas(self):
+        perfil = PrestadorProfile.objects.get(pk=self.perfil.pk)
+        perfil.cep = '20040020'
+        novos = dict(self.dados, cidade='Rio de Janeiro', estado='RJ')
+        with patch('accounts.models.pegar_dados_endereco', return_value=novos) as geocodificacao:
+            perfil.save(update_fields=['cep'])
+            perfil.save()
+
+        # Depois do save o snapshot é o endereço novo: o segundo save não geocodifica de novo
+        geocodificacao.assert_called_once()
+        salvo = PrestadorProfile.objects.get(pk=perfil.pk)
+        self.assertEqual((salvo.cep, salvo.cidade, salvo.estado), ('20040020', 'Rio de Janeiro', 'RJ'))
+        self.assertEqual(salvo.geohash, codificar_geohash(salvo.latitude, salvo.longitude))
+
+
+class ContadoresPrestadorTest(PrestadorTestCase):
+    """
+    Contadores do prestador gravados com um UPDATE só, sem passar pelo save()
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.perfil = self._criar_prestador()
+        self.prestador = self.perfil.user
+
+    def test_incremento_e_um_update(self):
+        with patch('accounts.models.pegar_dados_endereco') as geocodificacao, self.assertNumQueries(1):
+            PrestadorProfile.incrementar_contadores(self.perfil.pk, acessos_perfil=1, servicos_nao_realizados_cache=2)
+        PrestadorProfile.incrementar_contadores(self.perfil.pk, acessos_perfil=1)
+
+        geocodificacao.assert_not_called()
+        self.perfil.refresh_from_db()
+        self.assertEqual((self.perfil.acessos_perfil, self.perfil.servicos_nao_realizados_cache), (2, 2))
+
+    def test_campo_que_nao_e_contador(self):
+        with self.assertRaises(ValueError):
+            PrestadorProfile.incrementar_contadores(self.perfil.pk, cep=1)
+
+    def test_incremento_por_filtro_sem_select(self):
+        with self.assertNumQueries(1):
+            PrestadorProfile.incrementar_contadores({'user_id': self.prestador.pk}, servicos_nao_realizados_cache=1)
+        self.assertEqual(PrestadorProfile.incrementar_contadores({'user_id': self.cliente.pk}, acessos_perfil=1), 0)
+        with self.assertRaises(ValueError):
+            PrestadorProfile.incrementar_contadores(None, acessos_perfil=1)
+
+        self.perfil.refresh_from_db()
+        self.assertEqual((self.perfil.servicos_nao_realizados_cache, self.perfil.acessos_perfil), (1, 0))
+
+    def test_save_do_perfil_nao_sobrescreve_contadores(self):
+        perfil = PrestadorProfile.objects.get(pk=self.perfil.pk)
+        # Deltas gravados depois de o perfil ser carregado pela requisição
+        PrestadorProfile.incrementar_contadores(self.perfil.pk, acessos_perfil=1)
+        self._avaliar(self.perfil, 4)
+
+        perfil.biografia = 'Nova biografia'
+        salvar_perfil(perfil)
+
+        perfil.refresh_from_db()
+        self.assertEqual(perfil.biografia, 'Nova biografia')
+        self.assertEqual((perfil.acessos_perfil, perfil.total_avaliacoes_cache, perfil.estrelas_4), (1, 1, 1))
+        self.assertEqual(perfil.nota_media_cache, Decimal('4.00'))
+
+    def test_admin_nao_edita_contadores(self):
+        admin_perfil = admin.site._registry[PrestadorProfile]
+        self.assertLessEqual(set(PrestadorProfile.CONTADORES), set(admin_perfil.readonly_fields))
+
+    def test_avaliacao_atualiza_perfil_e_documento_de_busca(self):
+        with patch('accounts.models.pegar_dados_endereco') as geocodificacao:
+            self._avaliar(self.perfil, 3, comentario='Ok')
+
+        geocodificacao.assert_not_called()
+        self.perfil.refresh_from_db()
+        self.assertEqual((self.perfil.nota_media_cache, self.perfil.total_avaliacoes_cache), (Decimal('3.00'), 1))
+        documento = PrestadorBusca.objects.get(pk=self.perfil.pk)
+        self.assertEqual((documento.nota_media, documento.total_avaliacoes), (Decimal('3.00'), 1))
+
+    def test_nao_realizar_servico_incrementa_contador(self):
+        solicitacao = SolicitacaoContato.objects.create(cliente=self.cliente, prestador=self.prestador, servico=self.servico)
+        client = APIClient()
+        client.force_authenticate(self.prestador)
+
+        response = client.post(reverse('nao-realizar-servico', args=[solicitacao.pk]))
+
+        self.assertEqual(response.status_code, 200)
+        self.perfil.refresh_from_db()
+        self.assertEqual(self.perfil.servicos_nao_realizados_cache, 1)
+
+
+class SaudeGeocodificacaoTest(TestCase):
+    """
+    Endpoint de saúde dos provedores de geocodificação (só admin)
+    """
+
+    def setUp(self):
+        estado_compartilhado.cache.clear()
+        self.client = APIClient()
+
+    def test_somente_admin(self):
+        user = User.objects.create(username='u@test.com', email='u@test.com', nome_completo='U', tipo_usuario='cliente')
+        self.client.force_authenticate(user)
+        self.assertEqual(self.client.get(reverse('saude-geocodificacao')).status_code, 403)
+
+    def test_mostra_circuito_aberto(self):
+        admin = User.objects.create(username='a@test.com', email='a@test.com', nome_completo='Admin', is_staff=True)
+        estado_compartilhado.cache.set(geocoding.CHAVE_CIRCUITO.format(provedor='brasilapi', campo='aberto_ate'), time.time() + 60)
+        self.client.force_authenticate(admin)
+
+        response = self.client.get(reverse('saude-geocodificacao'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'degradado')
+        self.assertEqual(response.data['provedores']['brasilapi']['circuito']['estado'], 'aberto')
+        self.assertEqual(response.data['provedores']['viacep']['circuito']['estado'], 'fechado')
+
+
+@override_settings(GEOCODER_BACKEND='accounts.geocodificadores.GeocodificadorLocal', GEOCODER_OPCOES={}, CENTROIDES_CEP_MODO='desligado')
+class GeocodificadorLocalTest(TestCase):
+    """
+    Backend de geocodificação configurável e o stub local (sem rede)
+    """
+
+    def test_coordenadas_deterministicas_e_setor_proximo(self):
+        with patch('accounts.geocoding.get', side_effect=AssertionError('sem rede')):
+            dados = pegar_dados_endereco('01001-000', '', '')
+            self.assertEqual(pegar_dados_endereco('01001000', '', ''), dados)
+            vizinho = pegar_dados_endereco('01001999', '', '')
+
+        self.assertEqual(dados['estado'], 'SP')
+        self.assertLess(abs(dados['latitude'] - vizinho['latitude']), Decimal('0.011'))
+        # Nada do stub no cache de CEP: ao voltar para os provedores ele não seria servido
+        self.assertFalse(CepGeocode.objects.exists())
+
+    def test_cadastro_de_perfil_sem_rede(self):
+        user = User.objects.create(username='c@test.com', email='c@test.com', nome_completo='Cliente', tipo_usuario='cliente')
+        with patch('accounts.geocoding.get', side_effect=AssertionError('sem rede')):
+            perfil = ClienteProfile.objects.create(user=user, cep='20040020', rua='Rua', numero_casa='1')
+
+        self.assertEqual(perfil.geocode_status, 'concluido')
+        self.assertEqual(perfil.estado, 'RJ')
+        self.assertEqual(perfil.geohash, codificar_geohash(perfil.latitude, perfil.longitude))
+
+    def test_latencia_e_falhas_configuraveis(self):
+        with self.settings(GEOCODER_OPCOES={'latencia': 0.05, 'taxa_falhas': 1}):
+            inicio = time.perf_counter()
+            self.assertIsNone(pegar_dados_endereco('01001000', '', ''))
+            self.assertGreaterEqual(time.perf_counter() - inicio, 0.05)
+
+        # Falha não vai para o cache de CEP
+        self.assertFalse(CepGeocode.objects.exists())
+        with self.settings(GEOCODER_OPCOES={'taxa_falhas': 0.5}):
+            geocodificador = geocodificadores.obter_geocodificador()
+            falhas = sum(geocodificador.falha(f'{i:05d}000') for i in range(1000))
+        self.assertTrue(400 < falhas < 600)
+
+    def test_padrao_usa_provedores_externos(self):
+        with self.settings(GEOCODER_BACKEND=geocodificadores.PADRAO), \
+                patch('accounts.models.consultar_cep', return_value=(None, None)) as consulta:
+            pegar_dados_endereco('01001000', 'Rua', '1')
+        consulta.assert_called_once_with('01001000', 'Rua', '1')
+
+
+class AgregadosAvaliacaoTest(PrestadorTestCase):
+    """
+    Soma/total/média das avaliações mantidos por diferença, com reconciliação
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.perfil = self._criar_prestador()
+        self.prestador = self.perfil.user
+
+    def _agregados(self):
+        self.perfil.refresh_from_db()
+        return self.perfil.soma_notas_cache, self.perfil.total_avaliacoes_cache, self.perfil.nota_media_cache
+
+    def _estrelas(self):
+        self.perfil.refresh_from_db()
+        return [getattr(self.perfil, f'estrelas_{nota}') for nota in range(1, 6)]
+
+    def test_distribuicao_do_perfil_sem_consulta(self):
+        for nota in (5, 5, 4, 1):
+            self._avaliar(self.perfil, nota)
+        perfil = PrestadorProfile.objects.get(pk=self.perfil.pk)
+
+        with self.assertNumQueries(0):
+            estatisticas = PrestadorPublicoSerializer().get_estatisticas(perfil)
+
+        self.assertEqual(estatisticas['distribuicao']['estrelas_5'], {'quantidade': 2, 'porcentagem': 50.0})
+        self.assertEqual(estatisticas['distribuicao']['estrelas_3'], {'quantidade': 0, 'porcentagem': 0.0})
+
+    def test_lista_de_avaliacoes_usa_o_perfil(self):
+        for nota in (5, 4, 4):
+            self._avaliar(self.perfil, nota)
+        url = reverse('listar-avaliacoes')
+
+        with CaptureQueriesContext(connection) as consultas:
+            rapida = self.client.get(url, {'prestador': self.prestador.pk}).data['estatisticas']
+        self.assertFalse([q['sql'] for q in consultas.captured_queries if 'AVG(' in q['sql']])
+
+        # nota_minima força a agregação sobre as avaliações: o resultado tem que ser o mesmo
+        agregada = self.client.get(url, {'prestador': self.prestador.pk, 'nota_minima': 1}).data['estatisticas']
+        self.assertEqual(rapida, agregada)
+        self.assertEqual(rapida['media_geral'], 4.33)
+
+    def test_criar_alterar_e_remover_sem_recontar(self):
+        with CaptureQueriesContext(connection) as consultas:
+            avaliacoes = [self._avaliar(self.perfil, nota) for nota in (4, 4, 5)]
+        recontagens = [
+            q['sql'] for q in consultas.captured_queries
+            if ('AVG(' in q['sql'] or 'COUNT(' in q['sql']) and Avaliacao._meta.db_table in q['sql']
+        ]
+        self.assertFalse(recontagens)
+        self.assertEqual(self._agregados(), (13, 3, Decimal('4.33')))
+        self.assertEqual(self._estrelas(), [0, 0, 0, 2, 1])
+
+        avaliacao = Avaliacao.objects.get(pk=avaliacoes[2].pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            avaliacao.nota = 1
+            avaliacao.save()
+            avaliacao.comentario = 'Só o comentário'
+            avaliacao.save()
+        avaliacoes[2] = avaliacao
+        self.assertEqual(self._agregados(), (9, 3, Decimal('3.00')))
+        self.assertEqual(self._estrelas(), [1, 0, 0, 2, 0])
+        self.assertEqual(PrestadorBusca.objects.get(pk=self.perfil.pk).nota_media, Decimal('3.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            for avaliacao in avaliacoes:
+                avaliacao.delete()
+        self.assertEqual(self._agregados(), (0, 0, Decimal('5.00')))
+        self.assertEqual(self._estrelas(), [0, 0, 0, 0, 0])
+
+    def test_reconciliacao_corrige_divergencia(self):
+        self._avaliar(self.perfil, 5)
+        self._avaliar(self.perfil, 3)
+        # update() não dispara signals: os agregados ficam desatualizados
+        Avaliacao.objects.update(nota=1)
+        self.assertEqual(self._agregados(), (8, 2, Decimal('4.00')))
+
+        saida = StringIO()
+        call_command('reconciliar_avaliacoes', stdout=saida)
+        self.assertIn('1 divergência', saida.getvalue())
+        self.assertEqual(self._agregados()[0], 8)
+
+        call_command('reconciliar_avaliacoes', '--corrigir', stdout=StringIO())
+        self.assertEqual(self._agregados(), (2, 2, Decimal('1.00')))
+        self.assertEqual(self._estrelas(), [2, 0, 0, 0, 0])
+        self.assertEqual(reconciliar_avaliacoes(), [])
+
+    def test_correcao_nao_sobrescreve_delta_gravado_durante_a_reconciliacao(self):
+        self._avaliar(self.perfil, 5)
+        PrestadorProfile.definir_contadores(self.perfil.pk, soma_notas_cache=0)
+        contar = reconciliacao.contar_avaliacoes
+
+        def contar_e_avaliar(*args):
+            contagem = contar(*args)
+            if args == ():
+                # Outra requisição avalia entre a contagem geral e a correção
+                self._avaliar(self.perfil, 3)
+            return contagem
+
+        with patch('accounts.reconciliacao.contar_avaliacoes', side_effect=contar_e_avaliar):
+            reconciliar_avaliacoes(corrigir=True)
+
+        self.assertEqual(self._agregados(), (8, 2, Decimal('4.00')))
+        self.assertEqual(reconciliar_avaliacoes(), [])
+
+    def test_reconciliacao_periodica_agendada_uma_vez(self):
+        call_command('reconciliar_avaliacoes', '--agendar', stdout=StringIO())
+        call_command('reconciliar_avaliacoes', '--agendar', stdout=StringIO())
+        self.assertEqual(Tarefa.objects.filter(nome=reconciliar_avaliacoes_periodicamente.nome_tarefa).count(), 1)
+
+        self.assertEqual(processar_fila(), 1)
+        # A própria tarefa agenda a próxima rodada
+        proxima = Tarefa.objects.get(nome=reconciliar_avaliacoes_periodicamente.nome_tarefa, status='pendente')
+        self.assertGreater(proxima.executar_em, timezone.now())
+
+    def test_importacao_em_lote_grava_uma_vez_por_prestador(self):
+        solicitacoes = [
+            SolicitacaoContato.objects.create(cliente=self.cliente, prestador=self.prestador, servico=self.servico)
+            for _ in range(20)
+        ]
+        with CaptureQueriesContext(connection) as consultas, self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                for i, solicitacao in enumerate(solicitacoes):
+                    Avaliacao.objects.create(solicitacao_contato=solicitacao, nota=i % 5 + 1)
+
+        self.assertEqual(len(callbacks), 1)
+        updates = [q['sql'] for q in consultas.captured_queries if q['sql'].startswith('UPDATE "accounts_prestadorprofile"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self._agregados(), (60, 20, Decimal('3.00')))
+        self.assertEqual(self._estrelas(), [4, 4, 4, 4, 4])
+
+    def test_transacao_desfeita_nao_altera_agregados(self):
+        solicitacao = SolicitacaoContato.objects.create(cliente=self.cliente, prestador=self.prestador, servico=self.servico)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    Avaliacao.objects.create(solicitacao_contato=solicitacao, nota=1)
+                    raise ValueError
+            except ValueError:
+                pass
+
+        self.assertEqual(callbacks, [])
+        self.assertEqual(self._agregados(), (0, 0, Decimal('5.00')))
+
+        # As pendências descartadas não ficam presas: a próxima transação grava normalmente
+        outra = SolicitacaoContato.objects.create(cliente=self.cliente, prestador=self.prestador, servico=self.servico)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                Avaliacao.objects.create(solicitacao_contato=outra, nota=4)
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self._agregados(), (4, 1, Decimal('4.00')))
+
+    def test_erro_na_gravacao_e_contado(self):
+        agregados_avaliacao.zerar_erros_agregados()
+        with patch.object(PrestadorProfile, 'aplicar_deltas_avaliacoes', side_effect=RuntimeError('banco fora')), \
+                patch('builtins.print'), patch('traceback.print_exc'):
+            self._avaliar(self.perfil, 4)
+        # O delta falhou: o prestador foi recontado na hora
+        self.assertEqual(self._agregados(), (4, 1, Decimal('4.00')))
+
+        # O contador fica no cache compartilhado: o comando roda em outro processo
+        outro = caches.create_connection(estado_compartilhado.ALIAS)
+        with patch('accounts.agregados_avaliacao.cache', outro):
+            saida = StringIO()
+            call_command('reconciliar_avaliacoes', '--corrigir', stdout=saida)
+        self.assertIn('1 erro(s)', saida.getvalue())
+        self.assertEqual(agregados_avaliacao.erros_agregados(), 0)
+
+
+@override_settings(RANKING_NOTA_PRIORI=3.5, RANKING_PESO_PRIORI=10, PRESTADORES_CACHE_TIMEOUT=0)
+class RankingMelhorAvaliadoTest(PrestadorTestCase):
+    """
+    ?melhor_avaliado=true ordena pela média bayesiana guardada no perfil e no documento de busca
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.novo, self.veterano, self.um_cinco = [
+            self._criar_prestador(f'{nome}@test.com', nome) for nome in ('Novo', 'Veterano', 'Um Cinco')
+        ]
+
+    def test_pontuacao_atualizada_pelas_avaliacoes(self):
+        self.assertEqual(self.novo.pontuacao_ranking, Decimal('3.5000'))
+
+        self._avaliar(self.um_cinco, 5)
+        self.um_cinco.refresh_from_db()
+        # (3,5 x 10 + 5) / (10 + 1)
+        self.assertEqual(self.um_cinco.pontuacao_ranking, Decimal('3.6364'))
+        self.assertEqual(PrestadorBusca.objects.get(pk=self.um_cinco.pk).pontuacao_ranking, Decimal('3.6364'))
+        self.assertEqual(reconciliar_avaliacoes(), [])
+
+    def test_poucas_avaliacoes_nao_passam_quem_tem_historico(self):
+        self._avaliar(self.um_cinco, 5)
+        for nota in (5, 5, 5, 4, 5, 5, 4, 5, 5, 5):
+            self._avaliar(self.veterano, nota)
+
+        response = self.client.get(reverse('lista-prestadores'), {'melhor_avaliado': 'true', 'servico': self.servico.pk})
+
+        ids = [item['id'] for item in response.data['results']]
+        self.assertEqual(ids, [self.veterano.pk, self.um_cinco.pk, self.novo.pk])
+
+    @skipUnless(connection.vendor == 'sqlite', 'Saída do EXPLAIN específica do SQLite')
+    def test_melhor_da_categoria_na_ordem_do_indice(self):
+        for filtro, indice in (
+            ({'servico_id': 1}, 'idx_busca_servico_ranking'),
+            ({'categoria_id': 1}, 'idx_busca_categoria_ranking'),
+            ({}, 'idx_busca_ranking'),
+        ):
+            plano = PrestadorBusca.objects.filter(**filtro).order_by('-pontuacao_ranking', 'pk')[:20].explain()
+            self.assertIn(indice, plano)
+            self.assertNotIn('TEMP B-TREE', plano)
@@ -7,7 +7,8 @@ from .views import (
     ClienteProfileEditView, 
     PrestadorDetailView,
     UserProfileView,
-    FavoritoManageView
+    FavoritoManageView,
+    SaudeGeocodificacaoView,
 )
 
 urlpatterns = [
@@ -28,4 +29,7 @@ urlpatterns = [
 
     # Favoritos
     path('favoritos/', FavoritoManageView.as_view(), name='gerenciar-favoritos'),
+
+    # Monitoramento (admin)
+    path('saude/geocodificacao/', SaudeGeocodificacaoView.as_view(), name='saude-geocodificacao'),
 ]
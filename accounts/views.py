@@ -1,6 +1,6 @@
 from rest_framework import generics, status
 from rest_framework.views import APIView
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from .serializers import (
@@ -12,10 +12,22 @@ from .serializers import (
 )
 from rest_framework_simplejwt.views import TokenObtainPairView
 from .serializers import CustomTokenObtainPairSerializer, UserProfileSerializer
-from .models import PrestadorProfile, User
+from .models import PrestadorBusca, PrestadorProfile, User
+from .geohash import celulas_na_area
+from .geocoding import metricas_provedores
+from .busca import filtrar_por_texto
+from servicos.models import Servico
+from .pagination import PaginacaoCursorMixin
+from .cache_busca import (
+    ajustar_links, cache_busca_ativo, cache_busca_timeout, chave_busca, dados_cacheaveis, quantizar_coordenadas
+)
+from django.core.cache import cache
 from .serializers import PrestadorPublicoSerializer
 from drf_spectacular.utils import extend_schema
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import ASin, Cast, Cos, Least, Power, Radians, Round, Sin, Sqrt
 import math
+import numpy as np
 
 class ClienteRegistrationView(generics.CreateAPIView):
     #Endpoint da API Cliente. Aceita apenas requisições POST.
@@ -96,13 +108,89 @@ def calcular_distancia(lat1, lon1, lat2, lon2):
     distance = R * c
     return round(distance, 2)
 
+# Versão vetorizada de calcular_distancia para quando o ranking ainda precisa ser feito
+# em Python (favoritos, ferramentas administrativas): uma passada NumPy para o lote inteiro.
+# Posições sem coordenadas ficam como NaN.
+def calcular_distancias_lote(lat, lon, latitudes, longitudes):
+    R = 6371.0
+
+    lat1_rad = math.radians(float(lat))
+    lon1_rad = math.radians(float(lon))
+    lat2_rad = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon2_rad = np.radians(np.asarray(longitudes, dtype=np.float64))
+
+    dlat = lat2_rad - lat1_rad
+    dlon = lon2_rad - lon1_rad
+
+    a = np.sin(dlat / 2)**2 + math.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(dlon / 2)**2
+    c = 2 * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+    return np.round(R * c, 2)
+
+# Índices dos k menores valores, em ordem crescente. Usa argpartition (O(n)) e só
+# ordena os k escolhidos, em vez de ordenar a lista inteira. NaN vai para o final.
+def indices_mais_proximos(distancias, k=None):
+    distancias = np.where(np.isnan(distancias), np.inf, distancias)
+    total = len(distancias)
+
+    if k is None or k >= total:
+        return np.argsort(distancias, kind='stable')
+
+    if k <= 0:
+        return np.array([], dtype=np.intp)
+
+    candidatos = np.argpartition(distancias, k - 1)[:k]
+    return candidatos[np.argsort(distancias[candidatos], kind='stable')]
+
+# Retângulo (lat/lon mínimos e máximos) que contém o círculo de raio_km em volta do ponto.
+# Serve de pré-filtro no banco (usa o índice idx_geo) antes do cálculo exato da distância.
+def calcular_bounding_box(lat, lon, raio_km):
+    lat = float(lat)
+    lon = float(lon)
+    R = 6371.0
+
+    delta_lat = math.degrees(raio_km / R)
+
+    # Perto dos polos o círculo cobre todas as longitudes
+    cos_lat = math.cos(math.radians(lat))
+    if cos_lat < 1e-6:
+        delta_lon = 180.0
+    else:
+        delta_lon = min(math.degrees(raio_km / (R * cos_lat)), 180.0)
+
+    return (
+        max(lat - delta_lat, -90.0),
+        min(lat + delta_lat, 90.0),
+        max(lon - delta_lon, -180.0),
+        min(lon + delta_lon, 180.0),
+    )
+
+# Mesma fórmula de calcular_distancia, mas como expressão SQL anotada no queryset
+# (funciona no PostgreSQL e no SQLite). Prestadores sem coordenadas ficam com distância nula.
+def anotar_distancia(queryset, lat, lon, nome='distancia'):
+    R = 6371.0
+    lat_rad = math.radians(float(lat))
+    lon_rad = math.radians(float(lon))
+
+    prestador_lat = Radians(Cast('latitude', FloatField()))
+    prestador_lon = Radians(Cast('longitude', FloatField()))
+
+    a = (
+        Power(Sin((prestador_lat - Value(lat_rad)) / 2), 2)
+        + Value(math.cos(lat_rad)) * Cos(prestador_lat) * Power(Sin((prestador_lon - Value(lon_rad)) / 2), 2)
+    )
+    # Least evita erro de domínio no ASIN por arredondamento (a ligeiramente > 1)
+    distancia = Value(2 * R) * ASin(Least(Sqrt(a), Value(1.0)))
+
+    return queryset.annotate(**{nome: Round(distancia, 2, output_field=FloatField())})
+
 class PrestadorDetailView(generics.RetrieveAPIView):
     queryset = PrestadorProfile.objects.all()
     serializer_class = PrestadorPublicoSerializer
     permission_classes = [AllowAny]
     lookup_field = 'pk' # Busca pelo ID do PrestadorProfile, não do User
 
-class PrestadorListView(generics.ListAPIView):
+class PrestadorListView(PaginacaoCursorMixin, generics.ListAPIView):
     """
     
     /api/accounts/prestadores/numero_do_id_do_prestador/
@@ -119,17 +207,18 @@ class PrestadorListView(generics.ListAPIView):
     ?nome_servico=nome_servico
     
     ?ordenar_por_distancia=true (latitude/longitude do cliente logado ou na URL)
+    ?raio_km=10 (apenas prestadores até 10 km do cliente)
+
+    ?paginacao=cursor (paginação por cursor: siga o link `next`)
 
     """
     serializer_class = PrestadorListSerializer # Serializer otimizado
     permission_classes = [AllowAny]
 
     def get_queryset(self):
-        queryset = PrestadorProfile.objects.all().select_related(
-            'user', 'servico', 'servico__categoria'
-        ).prefetch_related(
-            'portfolioitem_set'
-        )
+        # A busca roda no documento achatado (PrestadorBusca): filtros, distância,
+        # ordenação e paginação numa única tabela indexada, sem joins.
+        queryset = PrestadorBusca.objects.all()
 
         servico_id = self.request.query_params.get('servico')
         categoria_id = self.request.query_params.get('categoria')
@@ -139,17 +228,18 @@ class PrestadorListView(generics.ListAPIView):
         nome = self.request.query_params.get('nome')
         nome_servico = self.request.query_params.get('nome_servico')
 
+        # Busca sem acento e sem diferenciar maiúsculas, atendida pelo índice de busca
         if nome:
-            queryset = queryset.filter(user__nome_completo__icontains=nome)
+            queryset = queryset.filter(user_id__in=filtrar_por_texto(User, nome))
 
         if nome_servico:
-            queryset = queryset.filter(servico__nome__icontains=nome_servico)
+            queryset = queryset.filter(servico_id__in=filtrar_por_texto(Servico, nome_servico))
 
         if servico_id:
-            queryset = queryset.filter(servico__id=servico_id)
+            queryset = queryset.filter(servico_id=servico_id)
 
         if categoria_id:
-            queryset = queryset.filter(servico__categoria__id=categoria_id)
+            queryset = queryset.filter(categoria_id=categoria_id)
 
         if tem_material is not None:
             valor = tem_material.lower() == 'true'
@@ -167,54 +257,133 @@ class PrestadorListView(generics.ListAPIView):
         if nota_minima:
              try:
                  nota = float(nota_minima)
-                 queryset = queryset.filter(nota_media_cache__gte=nota)
+                 queryset = queryset.filter(nota_media__gte=nota)
              except ValueError:
                  pass
-             
+
+        # Distância calculada no banco: ordenação e paginação acontecem no SQL,
+        # só a página atual é carregada e serializada.
+        coordenadas = self.get_coordenadas_cliente()
+        raio_km = self.get_raio_km()
+        ordenacao = []
+
+        if coordenadas:
+            cliente_lat, cliente_lon = coordenadas
+
+            if raio_km:
+                lat_min, lat_max, lon_min, lon_max = calcular_bounding_box(cliente_lat, cliente_lon, raio_km)
+                queryset = queryset.filter(
+                    latitude__range=(lat_min, lat_max),
+                    longitude__range=(lon_min, lon_max),
+                )
+
+                # Raios pequenos: busca indexada pelas células geohash vizinhas
+                celulas = celulas_na_area(lat_min, lat_max, lon_min, lon_max)
+                if celulas:
+                    queryset = queryset.filter(geohash__in=celulas)
+
+            queryset = anotar_distancia(queryset, cliente_lat, cliente_lon)
+
+            # O retângulo é maior que o círculo: os cantos saem no cálculo exato
+            if raio_km:
+                queryset = queryset.filter(distancia__lte=raio_km)
+
+            if self.request.query_params.get('ordenar_por_distancia') == 'true':
+                ordenacao.append(F('distancia').asc(nulls_last=True))
+        else:
+            queryset = queryset.annotate(distancia=Value(None, output_field=FloatField()))
+
         melhor_avaliado = self.request.query_params.get('melhor_avaliado')
         if melhor_avaliado and melhor_avaliado.lower() == 'true':
-            queryset = queryset.order_by('-nota_media_cache')
+            # Média bayesiana: poucas avaliações não bastam para ficar no topo
+            ordenacao.append('-pontuacao_ranking')
+
+        return queryset.order_by(*ordenacao, 'pk')
 
-        return queryset.distinct()
-    
     def list(self, request, *args, **kwargs):
+        # Busca pública muito repetida: resposta em cache por parâmetros canônicos
+        if not cache_busca_ativo():
+            return self.listar(request)
 
-        queryset = self.get_queryset()
-        
-        cliente_lat = request.query_params.get('latitude')
-        cliente_lon = request.query_params.get('longitude')
+        variante = 'cliente' if request.user.is_authenticated and request.user.tipo_usuario == 'cliente' else 'publico'
+        chave = chave_busca(request.query_params, self.get_coordenadas_cliente(), variante)
 
-        if not cliente_lat and request.user.is_authenticated and hasattr(request.user, 'perfil_cliente'):
-             cliente_lat = request.user.perfil_cliente.latitude
-             cliente_lon = request.user.perfil_cliente.longitude
+        dados = cache.get(chave)
+        if dados is not None:
+            return Response(ajustar_links(dados, request.query_params))
 
-        prestadores_lista = []
-        
-        for prestador in queryset:
-            dist = None
-            
-            if cliente_lat and cliente_lon and prestador.latitude and prestador.longitude:
-                dist = calcular_distancia(
-                    cliente_lat, cliente_lon, 
-                    prestador.latitude, prestador.longitude
-                )
-            
-            prestador.distancia = dist 
-            prestadores_lista.append(prestador)
+        response = self.listar(request)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(chave, dados_cacheaveis(response.data), cache_busca_timeout())
+        return response
 
-        ordenar = request.query_params.get('ordenar_por_distancia')
+    def listar(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
 
-        if ordenar == 'true' and cliente_lat and cliente_lon:
-            prestadores_lista.sort(key=lambda x: x.distancia if x.distancia is not None else float('inf'))
+        page = self.paginate_queryset(queryset)
+        documentos = page if page is not None else list(queryset)
+        prestadores = self.carregar_prestadores(documentos)
 
-        page = self.paginate_queryset(prestadores_lista)
+        serializer = self.get_serializer(prestadores, many=True)
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
-
-        serializer = self.get_serializer(prestadores_lista, many=True)
         return Response(serializer.data)
 
+    def carregar_prestadores(self, documentos):
+        # Só os perfis da página são carregados para montar a resposta completa
+        perfis = PrestadorProfile.objects.select_related(
+            'user', 'servico', 'servico__categoria'
+        ).prefetch_related(
+            'portfolioitem_set'
+        ).in_bulk([documento.pk for documento in documentos])
+
+        prestadores = []
+        for documento in documentos:
+            perfil = perfis.get(documento.pk)
+            if perfil is None:
+                continue
+            perfil.distancia = documento.distancia
+            prestadores.append(perfil)
+        return prestadores
+
+    def get_coordenadas_cliente(self):
+        if hasattr(self, '_coordenadas_cliente'):
+            return self._coordenadas_cliente
+        self._coordenadas_cliente = self._resolver_coordenadas_cliente()
+        return self._coordenadas_cliente
+
+    def _resolver_coordenadas_cliente(self):
+        cliente_lat = self.request.query_params.get('latitude')
+        cliente_lon = self.request.query_params.get('longitude')
+
+        user = self.request.user
+        if not cliente_lat and user.is_authenticated and hasattr(user, 'perfil_cliente'):
+             cliente_lat = user.perfil_cliente.latitude
+             cliente_lon = user.perfil_cliente.longitude
+
+        if not cliente_lat or not cliente_lon:
+            return None
+
+        try:
+            coordenadas = float(cliente_lat), float(cliente_lon)
+        except ValueError:
+            return None
+
+        # Com cache, clientes da mesma célula usam o mesmo ponto (e a mesma entrada)
+        if cache_busca_ativo():
+            return quantizar_coordenadas(*coordenadas)
+        return coordenadas
+
+    def get_raio_km(self):
+        raio_km = self.request.query_params.get('raio_km')
+        if not raio_km:
+            return None
+        try:
+            raio = float(raio_km)
+        except ValueError:
+            return None
+        return raio if raio > 0 else None
+
 class PrestadorProfileEditView(generics.RetrieveUpdateAPIView):
     serializer_class = PrestadorProfileEditSerializer
     permission_classes = [IsAuthenticated]
@@ -244,7 +413,19 @@ class FavoritoManageView(APIView):
         if not hasattr(request.user, 'perfil_cliente'):
              return Response({"detail": "Apenas clientes podem ter favoritos."}, status=status.HTTP_403_FORBIDDEN)
         
-        favoritos = request.user.perfil_cliente.favoritos.all()
+        perfil_cliente = request.user.perfil_cliente
+        favoritos = list(perfil_cliente.favoritos.all())
+
+        # ?ordenar_por_distancia=true: mais próximos do endereço do cliente primeiro
+        ordenar = request.query_params.get('ordenar_por_distancia')
+        if ordenar == 'true' and perfil_cliente.latitude and perfil_cliente.longitude and favoritos:
+            distancias = calcular_distancias_lote(
+                perfil_cliente.latitude, perfil_cliente.longitude,
+                [p.latitude if p.latitude is not None else np.nan for p in favoritos],
+                [p.longitude if p.longitude is not None else np.nan for p in favoritos],
+            )
+            favoritos = [favoritos[i] for i in indices_mais_proximos(distancias)]
+
         serializer = PrestadorPublicoSerializer(favoritos, many=True)
         return Response(serializer.data)
 
@@ -270,3 +451,17 @@ class FavoritoManageView(APIView):
         else:
             cliente_profile.favoritos.add(prestador)
             return Response({"detail": "Prestador adicionado aos favoritos.", "favoritado": True}, status=status.HTTP_201_CREATED)
+
+
+class SaudeGeocodificacaoView(APIView):
+    """Chamadas, erros, latência e estado do disjuntor de cada provedor de geocodificação."""
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(responses={200: dict})
+    def get(self, request):
+        provedores = metricas_provedores()
+        degradado = any(metricas['circuito']['estado'] != 'fechado' for metricas in provedores.values())
+        return Response({
+            'status': 'degradado' if degradado else 'ok',
+            'provedores': provedores,
+        })
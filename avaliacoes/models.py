@@ -23,6 +23,17 @@ class Avaliacao(models.Model):
     class Meta:
         unique_together = ('solicitacao_contato',)
         ordering = ['-data_criacao']
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Como veio do banco: o signal aplica só a diferença na média do prestador
+        instance._original = (instance.__dict__.get('solicitacao_contato_id'), instance.__dict__.get('nota'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._original = (self.solicitacao_contato_id, self.nota)
     
     def __str__(self):
         try:
@@ -1,6 +1,8 @@
 from rest_framework import generics, permissions
 from rest_framework.response import Response
 from django.db.models import Avg, Count
+from accounts.models import PrestadorProfile
+from accounts.pagination import PaginacaoCursorMixin
 from .models import Avaliacao
 from .serializers import CriarAvaliacaoSerializer, AvaliacaoSerializer
 
@@ -13,10 +15,11 @@ class CriarAvaliacaoView(generics.CreateAPIView):
     serializer_class = CriarAvaliacaoSerializer
     permission_classes = [permissions.IsAuthenticated]
 
-class AvaliacaoListView(generics.ListAPIView):
+class AvaliacaoListView(PaginacaoCursorMixin, generics.ListAPIView):
     """
     Lista avaliações. Permite filtrar por prestador (user ID).
     Retorna também estatísticas das avaliações.
+    ?paginacao=cursor para paginação por cursor.
     """
     serializer_class = AvaliacaoSerializer
     permission_classes = [permissions.AllowAny]
@@ -51,9 +54,55 @@ class AvaliacaoListView(generics.ListAPIView):
             
         return queryset
 
+    def estatisticas_do_perfil(self):
+        """
+        Só ?prestador=<id>, sem outros filtros: as estatísticas são as do perfil, que
+        já guarda total, média e estrelas. None se não der para usar o perfil.
+        """
+        params = self.request.query_params
+        prestador_id = params.get('prestador')
+        minhas = params.get('minhas') == 'true' and self.request.user.is_authenticated
+        if not prestador_id or not prestador_id.isdigit() or minhas or params.get('nota_minima'):
+            return None
+
+        perfil = PrestadorProfile.all_objects.filter(user_id=prestador_id).only(
+            'total_avaliacoes_cache', 'nota_media_cache', *(f'estrelas_{nota}' for nota in PrestadorProfile.NOTAS),
+        ).first()
+        if perfil is None:
+            return None
+
+        total = perfil.total_avaliacoes_cache
+        return {
+            "media_geral": float(perfil.nota_media_cache) if total else 0,
+            "total_avaliacoes": total,
+            "distribuicao": perfil.distribuicao_estrelas()
+        }
+
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
+
+        estatisticas_data = self.estatisticas_do_perfil()
+        if estatisticas_data is None:
+            estatisticas_data = self.calcular_estatisticas(queryset)
+
+        # Paginação
+        page = self.paginate_queryset(queryset)
+
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            response = self.get_paginated_response(serializer.data)
+            # Injeta estatísticas na resposta paginada
+            response.data['estatisticas'] = estatisticas_data
+            return response
+
+        serializer = self.get_serializer(queryset, many=True)
         
+        return Response({
+            "estatisticas": estatisticas_data,
+            "results": serializer.data
+        })
+
+    def calcular_estatisticas(self, queryset):
         # Estatísticas
         stats = queryset.aggregate(
             media=Avg('nota'),
@@ -77,29 +126,12 @@ class AvaliacaoListView(generics.ListAPIView):
                 "porcentagem": round((count / total * 100), 2) if total > 0 else 0
             }
 
-        # Paginação
-        page = self.paginate_queryset(queryset)
-        
-        estatisticas_data = {
+        return {
             "media_geral": round(stats['media'], 2) if stats['media'] else 0,
             "total_avaliacoes": total,
             "distribuicao": stats_distribuicao
         }
 
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            response = self.get_paginated_response(serializer.data)
-            # Injeta estatísticas na resposta paginada
-            response.data['estatisticas'] = estatisticas_data
-            return response
-
-        serializer = self.get_serializer(queryset, many=True)
-        
-        return Response({
-            "estatisticas": estatisticas_data,
-            "results": serializer.data
-        })
-
 class AvaliacaoDetailView(generics.RetrieveAPIView):
     """
     Recupera uma avaliação específica pelo ID.
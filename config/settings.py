@@ -68,6 +68,7 @@ INSTALLED_APPS = [
     'avaliacoes',
     'portfolio',
     'contratacoes',
+    'tarefas',
 
 
 
@@ -160,6 +161,79 @@ print(f"DEBUG: Active DB Engine: {DATABASES['default']['ENGINE']}", file=sys.std
 print(f"DEBUG: Active DB Name: {DATABASES['default']['NAME']}", file=sys.stderr)
 
 
+# Cache
+# Em produção aponte CACHE_BACKEND/CACHE_LOCATION para um cache compartilhado
+# (ex: django.core.cache.backends.redis.RedisCache + redis://...), senão cada
+# worker do gunicorn tem o seu próprio cache em memória.
+#
+# 'compartilhado' guarda o estado que tem que valer para todos os processos juntos
+# (limitador de requisições da geocodificação etc.): por padrão uma tabela do banco,
+# criada com `python manage.py createcachetable`. Não pode ser LocMemCache.
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'servicosja'),
+    },
+    'compartilhado': {
+        'BACKEND': os.environ.get('CACHE_COMPARTILHADO_BACKEND', 'django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': os.environ.get('CACHE_COMPARTILHADO_LOCATION', 'cache_compartilhado'),
+        # As vagas do limitador são uma chave por segundo: evita que a limpeza apague o resto
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
+# Cache da busca de prestadores (segundos; 0 desliga)
+PRESTADORES_CACHE_TIMEOUT = int(os.environ.get('PRESTADORES_CACHE_TIMEOUT', 300))
+# Precisão do geohash usada para agrupar clientes próximos (6 ≈ 1,2 km x 0,6 km)
+PRESTADORES_CACHE_PRECISAO_GEOHASH = 6
+
+# Cache persistente de geocodificação por CEP (tabela accounts_cepgeocode)
+CEP_GEOCODE_TTL = timedelta(days=int(os.environ.get('CEP_GEOCODE_TTL_DIAS', 90)))
+# CEPs inexistentes ficam menos tempo, caso os Correios passem a reconhecê-los
+CEP_GEOCODE_TTL_INVALIDO = timedelta(days=1)
+# Consulta BrasilAPI e ViaCEP ao mesmo tempo (False: ViaCEP só depois que a BrasilAPI falhar)
+GEOCODIFICACAO_PARALELA = True
+# Requisições por segundo dos provedores com limite de uso (somando todos os processos,
+# via CACHES['compartilhado'])
+GEOCODIFICACAO_TAXA = {'nominatim': 1}
+# Quanto uma consulta espera por vaga no limitador antes de desistir (segundos)
+GEOCODIFICACAO_ESPERA_MAXIMA = 30
+# Disjuntor por provedor: erros seguidos até abrir e segundos fora antes de testar de novo
+GEOCODIFICACAO_CIRCUITO_FALHAS = 5
+GEOCODIFICACAO_CIRCUITO_ESPERA = 60
+
+# Backend de geocodificação (accounts/geocodificadores.py). Para testes de carga e
+# benchmarks sem rede: GEOCODER_BACKEND=accounts.geocodificadores.GeocodificadorLocal
+GEOCODER_BACKEND = os.environ.get('GEOCODER_BACKEND', 'accounts.geocodificadores.ProvedoresExternos')
+# Opções do construtor do backend (o stub aceita latencia em segundos e taxa_falhas de 0 a 1)
+GEOCODER_OPCOES = {
+    'latencia': float(os.environ.get('GEOCODER_LATENCIA', 0)),
+    'taxa_falhas': float(os.environ.get('GEOCODER_TAXA_FALHAS', 0)),
+}
+
+# Geocodificador local por setor de CEP (gerado com manage.py gerar_centroides_cep).
+# Modo: 'fallback' (só quando os provedores não trazem coordenadas), 'primeiro'
+# (antes de qualquer chamada externa, precisão de setor) ou 'desligado'
+CENTROIDES_CEP_ARQUIVO = BASE_DIR / 'accounts' / 'dados' / 'centroides_cep.npy'
+CENTROIDES_CEP_MODO = os.environ.get('CENTROIDES_CEP_MODO', 'fallback')
+
+# Ranking de "melhor avaliado" (média bayesiana): nota assumida para quem tem poucas
+# avaliações e quantas avaliações essa nota vale. Mudou? Rode reconciliar_avaliacoes --corrigir
+RANKING_NOTA_PRIORI = 3.5
+RANKING_PESO_PRIORI = 10
+
+# Intervalo da reconciliação periódica dos agregados de avaliação (segundos)
+AVALIACOES_RECONCILIACAO_INTERVALO = int(os.environ.get('AVALIACOES_RECONCILIACAO_INTERVALO', 24 * 60 * 60))
+
+# Fila de tarefas em segundo plano (app tarefas, workers: manage.py run_workers)
+TAREFAS_BACKOFF_SEGUNDOS = 10
+# Tarefa "executando" há mais tempo que isso é considerada de um worker que morreu
+TAREFAS_TIMEOUT_SEGUNDOS = 600
+# Concluídas e falhas ficam na tabela por esse tempo (estatísticas, investigação) e depois são apagadas
+TAREFAS_RETENCAO_DIAS = int(os.environ.get('TAREFAS_RETENCAO_DIAS', 7))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contratacoes', '0004_solicitacaocontato_deleted_at_and_more'),
+        ('servicos', '0004_remove_prestadorservicos_idx_servicos_deleted_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='solicitacaocontato',
+            name='idx_solicitacao_deleted',
+        ),
+        migrations.AddIndex(
+            model_name='solicitacaocontato',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['prestador', '-data_clique'], name='idx_solicitacao_prestador'),
+        ),
+        migrations.AddIndex(
+            model_name='solicitacaocontato',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['cliente', '-data_clique'], name='idx_solicitacao_cliente'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from django.contrib.auth import get_user_model
 from servicos.models import Servico
 from accounts.models import ActiveManager
@@ -22,7 +23,9 @@ class SolicitacaoContato(models.Model):
 
     class Meta:
         indexes = [
-            models.Index(fields=['is_deleted'], name='idx_solicitacao_deleted'),
+            # Parciais: "meus contatos" (como prestador ou cliente), só linhas ativas
+            models.Index(fields=['prestador', '-data_clique'], condition=Q(is_deleted=False), name='idx_solicitacao_prestador'),
+            models.Index(fields=['cliente', '-data_clique'], condition=Q(is_deleted=False), name='idx_solicitacao_cliente'),
         ]
 
     @property
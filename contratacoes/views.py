@@ -4,6 +4,8 @@ from rest_framework.views import APIView
 from urllib.parse import quote
 from django.utils import timezone
 from drf_spectacular.utils import extend_schema
+from accounts.models import PrestadorProfile
+from accounts.pagination import PaginacaoCursorMixin
 from .models import SolicitacaoContato
 from .serializers import ContatoSerializer, SolicitacaoContatoDetailSerializer
 
@@ -57,9 +59,10 @@ class IniciarContatoWhatsAppView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class SolicitacaoPrestadorListView(generics.ListAPIView):
+class SolicitacaoPrestadorListView(PaginacaoCursorMixin, generics.ListAPIView):
     """
     Lista as solicitações recebidas pelo prestador logado.
+    ?paginacao=cursor para paginação por cursor.
     """
     serializer_class = SolicitacaoContatoDetailSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -68,7 +71,11 @@ class SolicitacaoPrestadorListView(generics.ListAPIView):
         return SolicitacaoContato.objects.filter(prestador=self.request.user).order_by('-data_clique')
 
 
-class SolicitacaoClienteListView(generics.ListAPIView):
+class SolicitacaoClienteListView(PaginacaoCursorMixin, generics.ListAPIView):
+    """
+    Lista as solicitações feitas pelo cliente logado.
+    ?paginacao=cursor para paginação por cursor.
+    """
     serializer_class = SolicitacaoContatoDetailSerializer
     permission_classes = [permissions.IsAuthenticated]
 
@@ -138,12 +145,7 @@ class NaoRealizarServicoView(APIView):
         solicitacao.data_conclusao = timezone.now()
         solicitacao.save()
         
-        try:
-            perfil = request.user.perfil_prestador
-            perfil.servicos_nao_realizados_cache += 1
-            perfil.save()
-        except Exception:
-            pass
+        PrestadorProfile.incrementar_contadores({'user_id': request.user.pk}, servicos_nao_realizados_cache=1)
 
         return Response({
             "sucesso": True,
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0018_remove_clienteprofile_idx_cliente_deleted_and_more'),
+        ('portfolio', '0003_portfolioitem_deleted_at_portfolioitem_is_deleted_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='portfolioitem',
+            name='idx_portfolio_deleted',
+        ),
+        migrations.AddIndex(
+            model_name='portfolioitem',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['prestador', 'created_at'], name='idx_portfolio_ativo_prestador'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Q
 from accounts.models import PrestadorProfile, ActiveManager
 from django.utils import timezone
 
@@ -21,7 +22,7 @@ class PortfolioItem(models.Model):
     
     class Meta:
         indexes = [
-            models.Index(fields=['is_deleted'], name='idx_portfolio_deleted'),
+            models.Index(fields=['prestador', 'created_at'], condition=Q(is_deleted=False), name='idx_portfolio_ativo_prestador'),
         ]
 
     def __str__(self):
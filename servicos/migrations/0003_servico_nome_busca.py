@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:03
+
+from django.db import migrations, models
+
+from accounts.busca import criar_indice_busca, normalizar_busca, remover_indice_busca
+
+
+def preencher_nome_busca(apps, schema_editor):
+    Servico = apps.get_model('servicos', 'Servico')
+    for obj in Servico._base_manager.only('pk', 'nome').iterator():
+        Servico._base_manager.filter(pk=obj.pk).update(nome_busca=normalizar_busca(obj.nome))
+
+
+def criar_indice(apps, schema_editor):
+    criar_indice_busca(schema_editor.connection, 'servicos_servico', 'nome_busca')
+
+
+def remover_indice(apps, schema_editor):
+    remover_indice_busca(schema_editor.connection, 'servicos_servico', 'nome_busca')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('servicos', '0002_prestadorservicos_deleted_at_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='servico',
+            name='nome_busca',
+            field=models.CharField(blank=True, default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(preencher_nome_busca, migrations.RunPython.noop),
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0018_remove_clienteprofile_idx_cliente_deleted_and_more'),
+        ('servicos', '0003_servico_nome_busca'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='prestadorservicos',
+            name='idx_servicos_deleted',
+        ),
+        migrations.AddIndex(
+            model_name='prestadorservicos',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['servico'], name='idx_servicos_ativo_servico'),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
+from accounts.busca import normalizar_busca
 
 class CategoriaServico(models.Model):
     nome = models.CharField(max_length=100, unique=True)
@@ -14,6 +16,7 @@ class CategoriaServico(models.Model):
 
 class Servico(models.Model):
     nome = models.CharField(max_length=100, unique=True)
+    nome_busca = models.CharField(max_length=100, blank=True, default='', editable=False)
     categoria = models.ForeignKey(CategoriaServico, on_delete=models.CASCADE, related_name='servicos')
     descricao = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -24,6 +27,15 @@ class Servico(models.Model):
             models.Index(fields=['categoria'], name='idx_categoria'),
         ]
 
+    def save(self, *args, **kwargs):
+        self.nome_busca = normalizar_busca(self.nome)
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'nome' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'nome_busca'}
+
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.nome
 
@@ -41,5 +53,6 @@ class PrestadorServicos(models.Model):
         verbose_name = 'Serviço do prestador'
         verbose_name_plural = "Prestador - Serviços"
         indexes = [
-            models.Index(fields=['is_deleted'], name='idx_servicos_deleted'),
+            # (prestador_profile, servico) já é coberto pelo unique_together
+            models.Index(fields=['servico'], condition=Q(is_deleted=False), name='idx_servicos_ativo_servico'),
         ]
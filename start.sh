@@ -11,6 +11,8 @@ fi
 
 echo "Running migrations..."
 python manage.py migrate --noinput --verbosity 2
+# Tabela do cache compartilhado entre os processos (limitador da geocodificação etc.)
+python manage.py createcachetable
 
 echo "Creating superuser..."
 python create_superuser.py
@@ -18,5 +20,11 @@ python create_superuser.py
 echo "Creating initial services..."
 python manage.py shell < criar_services.py
 
+echo "Scheduling rating reconciliation..."
+python manage.py reconciliar_avaliacoes --agendar
+
+echo "Starting task workers..."
+python manage.py run_workers --threads 2 &
+
 echo "Starting Gunicorn..."
 gunicorn config.wsgi:application --bind 0.0.0.0:8000
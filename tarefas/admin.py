@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import Tarefa
+
+@admin.register(Tarefa)
+class TarefaAdmin(admin.ModelAdmin):
+    list_display = ('id', 'nome', 'status', 'tentativas', 'executar_em', 'duracao_ms', 'worker')
+    list_filter = ('status', 'nome')
+    search_fields = ('nome',)
+    readonly_fields = ('criada_em', 'iniciada_em', 'concluida_em', 'duracao_ms', 'worker', 'erro')
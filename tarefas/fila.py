@@ -0,0 +1,178 @@
+import random
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Avg, Count, F, Max
+from django.utils import timezone
+
+from .models import Tarefa
+
+# Fila de tarefas em segundo plano guardada no próprio banco (sem broker externo).
+#
+# Uso:
+#     @tarefa()
+#     def geocodificar_perfil(tipo, pk): ...
+#
+#     geocodificar_perfil.enfileirar('prestador', perfil.pk)
+#
+# A linha da tarefa é criada na transação de quem enfileira: se a requisição
+# der rollback a tarefa some junto, e o worker só a enxerga depois do commit.
+
+_registro = {}
+
+# Quantas pendentes o fallback sem SKIP LOCKED tenta reivindicar por rodada
+LOTE_REIVINDICACAO = 10
+
+
+def tarefa(nome=None, max_tentativas=3):
+    """Registra a função como tarefa e adiciona funcao.enfileirar(*args, **kwargs)."""
+    def decorador(funcao):
+        nome_tarefa = nome or f'{funcao.__module__}.{funcao.__name__}'
+        _registro[nome_tarefa] = funcao
+
+        def enfileirar_funcao(*args, **kwargs):
+            kwargs.setdefault('max_tentativas', max_tentativas)
+            return enfileirar(nome_tarefa, *args, **kwargs)
+
+        funcao.nome_tarefa = nome_tarefa
+        funcao.enfileirar = enfileirar_funcao
+        return funcao
+    return decorador
+
+
+def tarefas_registradas():
+    return dict(_registro)
+
+
+def enfileirar(nome, *args, atraso=None, max_tentativas=3, **kwargs):
+    """
+    Cria a tarefa `nome` com os argumentos informados (precisam ser serializáveis em JSON).
+    `atraso` (segundos ou timedelta) adia a execução.
+    """
+    if nome not in _registro:
+        raise ValueError(f'Tarefa não registrada: {nome}')
+
+    executar_em = timezone.now()
+    if atraso:
+        executar_em += atraso if isinstance(atraso, timedelta) else timedelta(seconds=atraso)
+
+    return Tarefa.objects.create(
+        nome=nome,
+        argumentos={'args': list(args), 'kwargs': kwargs},
+        max_tentativas=max_tentativas,
+        executar_em=executar_em,
+    )
+
+
+def reivindicar(worker):
+    """Marca a próxima tarefa pendente como executando para este worker e a retorna (ou None)."""
+    agora = timezone.now()
+    fila = Tarefa.objects.filter(status=Tarefa.PENDENTE, executar_em__lte=agora).order_by('executar_em', 'pk')
+    marcar = {
+        'status': Tarefa.EXECUTANDO,
+        'worker': worker,
+        'iniciada_em': agora,
+        'tentativas': F('tentativas') + 1,
+    }
+
+    connection = connections[router.db_for_write(Tarefa)]
+    if connection.features.has_select_for_update_skip_locked:
+        # PostgreSQL: cada worker pula as linhas já travadas pelos outros
+        with transaction.atomic():
+            pk = fila.select_for_update(skip_locked=True).values_list('pk', flat=True).first()
+            if pk is None:
+                return None
+            Tarefa.objects.filter(pk=pk).update(**marcar)
+        return Tarefa.objects.get(pk=pk)
+
+    # SQLite: sem SKIP LOCKED; reivindica com update condicional (só um worker consegue)
+    for pk in fila.values_list('pk', flat=True)[:LOTE_REIVINDICACAO]:
+        if Tarefa.objects.filter(pk=pk, status=Tarefa.PENDENTE).update(**marcar):
+            return Tarefa.objects.get(pk=pk)
+    return None
+
+
+def calcular_backoff(tentativas):
+    """Espera exponencial com jitter antes de tentar de novo."""
+    base = getattr(settings, 'TAREFAS_BACKOFF_SEGUNDOS', 10)
+    return timedelta(seconds=base * (2 ** (tentativas - 1)) * random.uniform(0.5, 1.5))
+
+
+def executar(tarefa):
+    """Roda a tarefa já reivindicada e grava o resultado (concluída, nova tentativa ou falha)."""
+    funcao = _registro.get(tarefa.nome)
+    inicio = time.perf_counter()
+    erro = ''
+
+    try:
+        if funcao is None:
+            raise LookupError(f'Tarefa não registrada: {tarefa.nome}')
+        funcao(*tarefa.argumentos.get('args', []), **tarefa.argumentos.get('kwargs', {}))
+    except Exception:
+        erro = traceback.format_exc()
+
+    agora = timezone.now()
+    valores = {
+        'duracao_ms': int((time.perf_counter() - inicio) * 1000),
+        'concluida_em': agora,
+        'erro': erro,
+        'status': Tarefa.CONCLUIDA,
+    }
+    if erro and tarefa.tentativas < tarefa.max_tentativas:
+        valores.update(status=Tarefa.PENDENTE, concluida_em=None, executar_em=agora + calcular_backoff(tarefa.tentativas))
+    elif erro:
+        valores['status'] = Tarefa.FALHOU
+        print(f"Tarefa {tarefa} falhou após {tarefa.tentativas} tentativa(s)")
+
+    Tarefa.objects.filter(pk=tarefa.pk).update(**valores)
+    return valores['status']
+
+
+def recuperar_travadas():
+    """Devolve para a fila tarefas de workers que morreram no meio da execução."""
+    limite = timezone.now() - timedelta(seconds=getattr(settings, 'TAREFAS_TIMEOUT_SEGUNDOS', 600))
+    travadas = Tarefa.objects.filter(status=Tarefa.EXECUTANDO, iniciada_em__lt=limite)
+
+    esgotadas = travadas.filter(tentativas__gte=F('max_tentativas')).update(
+        status=Tarefa.FALHOU, erro='Tempo limite excedido.', concluida_em=timezone.now(),
+    )
+    devolvidas = travadas.update(status=Tarefa.PENDENTE, executar_em=timezone.now())
+    return esgotadas + devolvidas
+
+
+def limpar_finalizadas(lote=1000):
+    """Apaga as concluídas e as que falharam há mais de TAREFAS_RETENCAO_DIAS. Retorna quantas apagou."""
+    limite = timezone.now() - timedelta(days=getattr(settings, 'TAREFAS_RETENCAO_DIAS', 7))
+    finalizadas = Tarefa.objects.filter(status__in=(Tarefa.CONCLUIDA, Tarefa.FALHOU), concluida_em__lt=limite)
+
+    # Em lotes: um DELETE só travaria a tabela da fila por muito tempo
+    apagadas = 0
+    while True:
+        pks = list(finalizadas.values_list('pk', flat=True)[:lote])
+        if not pks:
+            return apagadas
+        apagadas += Tarefa.objects.filter(pk__in=pks).delete()[0]
+
+
+def processar_fila(worker='local', limite=None):
+    """Executa as pendentes até esvaziar a fila (ou até `limite`). Retorna quantas rodou."""
+    executadas = 0
+    while limite is None or executadas < limite:
+        tarefa = reivindicar(worker)
+        if tarefa is None:
+            break
+        executar(tarefa)
+        executadas += 1
+    return executadas
+
+
+def estatisticas():
+    """Quantidade e duração (ms) por tarefa e status."""
+    return list(
+        Tarefa.objects.values('nome', 'status')
+        .annotate(total=Count('pk'), media_ms=Avg('duracao_ms'), max_ms=Max('duracao_ms'))
+        .order_by('nome', 'status')
+    )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from tarefas.fila import estatisticas
+
+
+class Command(BaseCommand):
+    help = 'Mostra quantidade e duração das tarefas por nome e status.'
+
+    def handle(self, *args, **options):
+        linhas = estatisticas()
+        if not linhas:
+            self.stdout.write('Nenhuma tarefa registrada.')
+            return
+
+        self.stdout.write(f"{'tarefa':<50} {'status':<11} {'total':>7} {'média ms':>10} {'máx ms':>8}")
+        for linha in linhas:
+            media = f"{linha['media_ms']:.0f}" if linha['media_ms'] is not None else '-'
+            maximo = linha['max_ms'] if linha['max_ms'] is not None else '-'
+            self.stdout.write(
+                f"{linha['nome']:<50} {linha['status']:<11} {linha['total']:>7} {media:>10} {maximo:>8}"
+            )
@@ -0,0 +1,106 @@
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, close_old_connections, connections
+
+from tarefas.fila import executar, limpar_finalizadas, reivindicar, recuperar_travadas, tarefas_registradas
+
+
+class Command(BaseCommand):
+    help = 'Executa os workers da fila de tarefas em segundo plano (sem broker externo).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threads', type=int, default=2,
+            help='Quantidade de workers neste processo (0 roda um worker na thread principal).',
+        )
+        parser.add_argument('--intervalo', type=float, default=1.0, help='Segundos de espera quando a fila está vazia.')
+        parser.add_argument('--burst', action='store_true', help='Processa o que houver na fila e encerra.')
+        parser.add_argument(
+            '--manutencao', type=float, default=60.0,
+            help='Segundos entre as rodadas de manutenção (tarefas travadas e limpeza das finalizadas).',
+        )
+
+    def handle(self, *args, **options):
+        self.parar = threading.Event()
+        self.intervalo = options['intervalo']
+        self.burst = options['burst']
+        self.intervalo_manutencao = options['manutencao']
+        self.proxima_manutencao = 0
+        self.trava_manutencao = threading.Lock()
+
+        # Encerra depois da tarefa atual (deploy/restart não deixa tarefa pela metade)
+        anteriores = {sinal: signal.signal(sinal, lambda *_: self.parar.set()) for sinal in (signal.SIGINT, signal.SIGTERM)}
+        try:
+            self.iniciar(options)
+        finally:
+            for sinal, tratador in anteriores.items():
+                signal.signal(sinal, tratador)
+
+    def iniciar(self, options):
+        self.manutencao()
+        self.stdout.write(f"Tarefas registradas: {', '.join(sorted(tarefas_registradas())) or 'nenhuma'}")
+
+        prefixo = f'{socket.gethostname()}:{os.getpid()}'
+        if options['threads'] == 0:
+            self.rodar(f'{prefixo}:0')
+            self.stdout.write('Worker encerrado.')
+            return
+
+        workers = [
+            threading.Thread(target=self.rodar, args=(f'{prefixo}:{i}',), name=f'worker-{i}')
+            for i in range(options['threads'])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(self.style.SUCCESS(f'{len(workers)} worker(s) rodando.'))
+
+        # join com timeout para o processo principal continuar recebendo sinais
+        while any(worker.is_alive() for worker in workers):
+            for worker in workers:
+                worker.join(timeout=0.5)
+
+        self.stdout.write('Workers encerrados.')
+
+    def rodar(self, nome):
+        try:
+            while not self.parar.is_set():
+                close_old_connections()
+                try:
+                    self.manutencao()
+                    tarefa = reivindicar(nome)
+                except OperationalError as e:
+                    # SQLite com vários workers: banco travado por outra escrita
+                    self.stderr.write(f'{nome}: {e}')
+                    self.parar.wait(self.intervalo)
+                    continue
+
+                if tarefa is None:
+                    if self.burst:
+                        break
+                    self.parar.wait(self.intervalo)
+                    continue
+
+                status = executar(tarefa)
+                self.stdout.write(f'{nome}: {tarefa.nome} #{tarefa.pk} -> {status}')
+        finally:
+            connections.close_all()
+
+    def manutencao(self):
+        # Um worker por vez, a cada --manutencao segundos: o worker que morreu no meio de
+        # uma tarefa pode ser de outro processo, então a checagem não é só na partida
+        with self.trava_manutencao:
+            if time.monotonic() < self.proxima_manutencao:
+                return
+            self.proxima_manutencao = time.monotonic() + self.intervalo_manutencao
+
+        recuperadas = recuperar_travadas()
+        if recuperadas:
+            self.stdout.write(f'{recuperadas} tarefa(s) travada(s) devolvida(s) para a fila.')
+        apagadas = limpar_finalizadas()
+        if apagadas:
+            self.stdout.write(f'{apagadas} tarefa(s) finalizada(s) apagada(s).')
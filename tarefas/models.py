@@ -0,0 +1,45 @@
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+
+class Tarefa(models.Model):
+    """
+    Tarefa em segundo plano. A fila é a própria tabela: os workers
+    (manage.py run_workers) reivindicam as pendentes em ordem de executar_em.
+    """
+    PENDENTE = 'pendente'
+    EXECUTANDO = 'executando'
+    CONCLUIDA = 'concluida'
+    FALHOU = 'falhou'
+    STATUS_ESCOLHA = [
+        (PENDENTE, 'Pendente'),
+        (EXECUTANDO, 'Executando'),
+        (CONCLUIDA, 'Concluída'),
+        (FALHOU, 'Falhou'),
+    ]
+
+    nome = models.CharField(max_length=150)
+    argumentos = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_ESCOLHA, default=PENDENTE)
+
+    tentativas = models.PositiveIntegerField(default=0)
+    max_tentativas = models.PositiveIntegerField(default=3)
+    erro = models.TextField(blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+
+    executar_em = models.DateTimeField(default=timezone.now)
+    criada_em = models.DateTimeField(auto_now_add=True)
+    iniciada_em = models.DateTimeField(null=True, blank=True)
+    concluida_em = models.DateTimeField(null=True, blank=True)
+    duracao_ms = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Parcial: só a fila de pendentes, que é o que o worker consulta
+            models.Index(fields=['executar_em'], condition=Q(status='pendente'), name='idx_tarefa_pendente'),
+            models.Index(fields=['nome', 'status'], name='idx_tarefa_nome_status'),
+        ]
+
+    def __str__(self):
+        return f"{self.nome} #{self.pk} ({self.status})"
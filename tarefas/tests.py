@@ -0,0 +1,128 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from tarefas.fila import (
+    enfileirar, estatisticas, limpar_finalizadas, processar_fila, reivindicar, recuperar_travadas, tarefa,
+)
+from tarefas.models import Tarefa
+
+executadas = []
+
+
+@tarefa(nome='teste.registrar')
+def registrar(valor, multiplicador=1):
+    executadas.append(valor * multiplicador)
+
+
+@tarefa(nome='teste.quebrar', max_tentativas=2)
+def quebrar():
+    raise ValueError('falhou de propósito')
+
+
+@tarefa(nome='teste.travar')
+def travar():
+    # Simula um worker de outro processo que morreu no meio de uma tarefa
+    Tarefa.objects.create(
+        nome='teste.registrar', argumentos={'args': [9], 'kwargs': {}}, status=Tarefa.EXECUTANDO,
+        tentativas=1, iniciada_em=timezone.now() - timedelta(hours=1),
+    )
+
+
+class FilaTarefasTest(TestCase):
+    """
+    Fila de tarefas no banco: enfileirar, reivindicar, tentar de novo e estatísticas
+    """
+
+    def setUp(self):
+        executadas.clear()
+
+    def test_enfileirar_e_processar(self):
+        registrar.enfileirar(2, multiplicador=3)
+        registrar.enfileirar(5)
+
+        self.assertEqual(processar_fila(), 2)
+        self.assertEqual(executadas, [6, 5])
+
+        tarefa = Tarefa.objects.first()
+        self.assertEqual(tarefa.status, Tarefa.CONCLUIDA)
+        self.assertEqual(tarefa.tentativas, 1)
+        self.assertIsNotNone(tarefa.duracao_ms)
+
+    def test_tarefa_nao_registrada(self):
+        with self.assertRaises(ValueError):
+            enfileirar('teste.inexistente')
+
+    def test_atraso_adia_execucao(self):
+        registrar.enfileirar(1, atraso=60)
+        self.assertEqual(processar_fila(), 0)
+
+    def test_tarefa_reivindicada_uma_vez_so(self):
+        registrar.enfileirar(1)
+        self.assertIsNotNone(reivindicar('worker-1'))
+        self.assertIsNone(reivindicar('worker-2'))
+
+    def test_erro_tenta_de_novo_com_backoff_e_depois_falha(self):
+        quebrar.enfileirar()
+        processar_fila()
+
+        tarefa = Tarefa.objects.get()
+        self.assertEqual(tarefa.status, Tarefa.PENDENTE)
+        self.assertGreater(tarefa.executar_em, timezone.now())
+        self.assertIn('falhou de propósito', tarefa.erro)
+
+        Tarefa.objects.update(executar_em=timezone.now())
+        processar_fila()
+        tarefa.refresh_from_db()
+        self.assertEqual(tarefa.status, Tarefa.FALHOU)
+        self.assertEqual(tarefa.tentativas, 2)
+
+    def test_recupera_tarefa_de_worker_morto(self):
+        registrar.enfileirar(1)
+        reivindicar('worker-morto')
+        Tarefa.objects.update(iniciada_em=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(recuperar_travadas(), 1)
+        self.assertEqual(processar_fila(), 1)
+        self.assertEqual(executadas, [1])
+
+    def test_limpa_finalizadas_fora_da_retencao(self):
+        registrar.enfileirar(1)
+        registrar.enfileirar(2)
+        quebrar.enfileirar(atraso=60)
+        processar_fila()
+        antiga = Tarefa.objects.filter(nome='teste.registrar').first()
+        Tarefa.objects.filter(pk=antiga.pk).update(concluida_em=timezone.now() - timedelta(days=8))
+
+        with self.settings(TAREFAS_RETENCAO_DIAS=7):
+            self.assertEqual(limpar_finalizadas(lote=1), 1)
+        # A concluída recente e a pendente ficam
+        self.assertFalse(Tarefa.objects.filter(pk=antiga.pk).exists())
+        self.assertEqual(Tarefa.objects.count(), 2)
+
+    def test_run_workers_recupera_travadas_durante_a_execucao(self):
+        travar.enfileirar()
+        with patch('tarefas.management.commands.run_workers.connections.close_all'), \
+                patch('tarefas.management.commands.run_workers.close_old_connections'):
+            call_command('run_workers', '--burst', '--threads', '0', '--manutencao', '0', stdout=StringIO())
+        self.assertEqual(executadas, [9])
+
+    def test_estatisticas_por_nome_e_status(self):
+        registrar.enfileirar(1)
+        registrar.enfileirar(2)
+        processar_fila()
+
+        linha, = [l for l in estatisticas() if l['nome'] == 'teste.registrar']
+        self.assertEqual((linha['status'], linha['total']), (Tarefa.CONCLUIDA, 2))
+
+    def test_run_workers_burst(self):
+        registrar.enfileirar(7)
+        # Worker na thread principal: a conexão é a da transação do teste e não pode ser fechada
+        with patch('tarefas.management.commands.run_workers.connections.close_all'), \
+                patch('tarefas.management.commands.run_workers.close_old_connections'):
+            call_command('run_workers', '--burst', '--threads', '0', stdout=StringIO())
+        self.assertEqual(executadas, [7])